@@ -0,0 +1,128 @@
+"""This module measures how many requests per second the JSON server
+can answer. It fills a temporary ledger with random expenses and income,
+starts the server on a free port and has several clients poll it at
+once, half of them sending back the ETag they were last given as
+dashboards do.
+
+Run it from the programme folder with
+
+    python -m api.load_test [seconds] [clients] [number of expenses]
+"""
+
+import http.client
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from api import server
+from database import database_commands as dc, query_audit
+
+DEFAULT_SECONDS = 5
+DEFAULT_CLIENTS = 8
+DEFAULT_ROWS = 20000
+PATHS = (
+    "/expenses?limit=50",
+    "/income?limit=50",
+    "/budgets",
+    "/goals",
+    "/progress?term=monthly",
+)
+
+
+def run_client(port, seconds, conditional, results):
+    """This function sends requests over one connection until the time
+    is up.
+
+    :param port: port of server
+    :param seconds: how long to send requests for
+    :param conditional: True to send back the last ETag for each path
+    :param results: list to add (status, seconds taken) of each request
+    :return: None
+    """
+    connection = http.client.HTTPConnection(server.HOST, port)
+    etags = {}
+    timings = []
+    end = time.perf_counter() + seconds
+    i = 0
+
+    while time.perf_counter() < end:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        headers = {}
+        if conditional and path in etags:
+            headers["If-None-Match"] = etags[path]
+
+        start = time.perf_counter()
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        timings.append((response.status, time.perf_counter() - start))
+        etags[path] = response.getheader("ETag")
+
+    connection.close()
+    results.extend(timings)
+
+
+def load_test(seconds, clients, rows):
+    """This function runs the server against a generated ledger and
+    prints requests per second and response times.
+
+    :param seconds: how long to send requests for
+    :param clients: number of clients sending requests at once
+    :param rows: number of expenses in the ledger
+    :return: requests per second
+    :rtype: float
+    """
+    database = dc.DATABASE
+
+    with tempfile.TemporaryDirectory() as folder:
+        dc.DATABASE = os.path.join(folder, "load_test.db")
+        try:
+            query_audit.fill_database(rows)
+            httpd = server.make_server(0)
+            thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+            thread.start()
+
+            results = []
+            threads = [
+                threading.Thread(
+                    target=run_client,
+                    args=(httpd.server_port, seconds, i % 2 == 0, results),
+                )
+                for i in range(clients)
+            ]
+            for client in threads:
+                client.start()
+            for client in threads:
+                client.join()
+
+            httpd.shutdown()
+            httpd.server_close()
+        finally:
+            dc.set_connection_pool(None)
+            dc.DATABASE = database
+
+    rate = len(results) / seconds
+    times = sorted(taken * 1000 for _, taken in results)
+    not_modified = sum(1 for status, _ in results if status == 304)
+    errors = sum(1 for status, _ in results if status >= 400)
+
+    print(f"{len(results)} requests from {clients} clients in {seconds}s")
+    print(f"{rate:.0f} requests per second")
+    print(f"{not_modified} not modified, {errors} errors")
+    if times:
+        p99 = times[int(len(times) * 0.99) - 1] if len(times) > 1 else times[0]
+        print(
+            f"median {statistics.median(times):.2f} ms, "
+            f"99th percentile {p99:.2f} ms"
+        )
+
+    return rate
+
+
+if __name__ == "__main__":
+    values = [int(arg) for arg in sys.argv[1:4]]
+    defaults = [DEFAULT_SECONDS, DEFAULT_CLIENTS, DEFAULT_ROWS]
+    load_test(*(values + defaults[len(values):]))
@@ -0,0 +1,452 @@
+"""This module serves the ledger as JSON over HTTP so that dashboards and
+other programmes can read it. It has endpoints for expenses, income,
+budgets, goals and progress, all read with database_commands.
+
+Every response carries an ETag made from the database's data version
+and today's date. A client which sends it back in If-None-Match gets an
+empty 304 response until something is written to the database, and the
+body of each response is kept until then, so polling is cheap.
+
+Run it from the programme folder with
+
+    python -m api.server [--port 8000] [--ledger id]
+"""
+
+import argparse
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+from database import database_commands as dc, ledgers
+from functions import date_functions as df
+from maths import calculations as calc
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+TERMS = ("weekly", "monthly", "annual")
+# Rows returned by /expenses and /income when no limit is given
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def get_param(params, name, default=None):
+    """This function gets one query parameter.
+
+    :param params: query parameters from parse_qs
+    :param name: parameter name
+    :param default: value if the parameter is missing (default = None)
+    :return: parameter value or default
+    :rtype: str
+    """
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def get_date_param(params, name):
+    """This function gets a query parameter which must be a date.
+
+    :param params: query parameters from parse_qs
+    :param name: parameter name
+    :return: date as YYYY-MM-DD or None if missing
+    :rtype: str or None
+    """
+    value = get_param(params, name)
+    if value is None:
+        return None
+
+    return datetime.date.fromisoformat(value).strftime("%Y-%m-%d")
+
+
+def get_int_param(params, name, default=None):
+    """This function gets a query parameter which must be a whole number
+    not less than 0.
+
+    :param params: query parameters from parse_qs
+    :param name: parameter name
+    :param default: value if the parameter is missing (default = None)
+    :return: parameter value or default
+    :rtype: int
+    """
+    value = get_param(params, name)
+    if value is None:
+        return default
+    if not value.isdigit():
+        raise ValueError(f"{name} must be a whole number")
+
+    return int(value)
+
+
+def query_rows(table, params, category_param):
+    """This function gets a page of expenses or income filtered by date
+    and category or source.
+
+    :param table: 'expenses' or 'income'
+    :param params: query parameters from parse_qs
+    :param category_param: name of the category or source parameter
+    :return: joined rows, newest first
+    :rtype: list of tuples
+    """
+    query = dc.Query(table).between(
+        get_date_param(params, "first_day"), get_date_param(params, "last_day")
+    )
+
+    category_id = get_int_param(params, category_param)
+    if category_id is not None:
+        if table == "expenses":
+            query.in_categories(dc.get_descendants(category_id))
+        else:
+            query.in_categories([category_id])
+
+    limit = min(get_int_param(params, "limit", DEFAULT_LIMIT), MAX_LIMIT)
+    query.limit(limit, get_int_param(params, "offset", 0))
+
+    return query.fetch()
+
+
+def get_expenses(params):
+    """This function gets expenses for the /expenses endpoint. A split
+    expense has one item for its share in each category.
+
+    :param params: query parameters first_day, last_day, category,
+        limit and offset
+    :return: expenses
+    :rtype: list of dicts
+    """
+    return [
+        {
+            "id": row[0],
+            "date": str(row[1])[:10],
+            "description": row[2],
+            "amount": row[3],
+            "category_id": row[4],
+            "category": row[-2],
+        }
+        for row in query_rows("expenses", params, "category")
+    ]
+
+
+def get_income(params):
+    """This function gets income for the /income endpoint.
+
+    :param params: query parameters first_day, last_day, source, limit
+        and offset
+    :return: income
+    :rtype: list of dicts
+    """
+    return [
+        {
+            "id": row[0],
+            "date": str(row[1])[:10],
+            "source_id": row[2],
+            "amount": row[3],
+            "source": row[-1],
+        }
+        for row in query_rows("income", params, "source")
+    ]
+
+
+def get_budgets(params):
+    """This function gets every budget for the /budgets endpoint.
+
+    :param params: query parameters (none are used)
+    :return: budgets by category and overall budgets
+    :rtype: dict
+    """
+    categories = [
+        {
+            "category_id": row[0],
+            "category": row[1],
+            "amount": float(row[4]),
+            "term": row[5],
+        }
+        for row in dc.get_joined_rows("categories")
+    ]
+    overall = {term: dc.get_goal("budget", term) for term in TERMS}
+
+    return {"categories": categories, "overall": overall}
+
+
+def get_goals(params):
+    """This function gets every financial goal for the /goals endpoint.
+
+    :param params: query parameters (none are used)
+    :return: goals
+    :rtype: list of dicts
+    """
+    return [
+        {"goal": row[1], "amount": row[2], "term": row[3]}
+        for row in dc.get_row_list("goals")
+    ]
+
+
+def get_progress(params):
+    """This function gets progress in the budgets of one term and in
+    the annual goals for the /progress endpoint.
+
+    :param params: query parameter term, 'weekly', 'monthly' or 'annual'
+        (default = 'monthly')
+    :return: spending against each budget and income and spending this
+        year against annual goals
+    :rtype: dict
+    """
+    term = get_param(params, "term", "monthly")
+    if term not in TERMS:
+        raise ValueError("term must be weekly, monthly or annual")
+
+    first_day = df.get_term_start(term)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    totals = dc.get_rollup_totals(first_day, today)
+    categories = []
+
+    for row in dc.get_joined_rows("categories"):
+        if row[5] == term:
+            amount = float(row[4])
+            spent = totals.get(row[0], 0)
+            categories.append(
+                {
+                    "category_id": row[0],
+                    "category": row[1],
+                    "budget": amount,
+                    "spent": spent,
+                    "remaining": calc.difference(spent, amount),
+                }
+            )
+
+    overall = None
+    budget = dc.get_goal("budget", term)
+    if budget:
+        spent = dc.get_total_spending(first_day, today)
+        overall = {
+            "budget": budget,
+            "spent": spent,
+            "remaining": calc.difference(spent, budget),
+        }
+
+    return {
+        "term": term,
+        "first_day": first_day,
+        "categories": categories,
+        "overall": overall,
+        "annual": get_annual_progress(today),
+    }
+
+
+def get_annual_progress(today):
+    """This function gets income, spending and net income so far this
+    year with the annual goal for each.
+
+    :param today: date as YYYY-MM-DD
+    :return: amount so far and goal with goal descriptions as keys
+    :rtype: dict
+    """
+    first_day = df.get_term_start("annual")
+    income = calc.total_spending(
+        [row[1] for row in dc.get_amounts_between("income", first_day, today)]
+    )
+    spent = dc.get_total_spending(first_day, today)
+    amounts = {
+        "gross income": income,
+        "budget": spent,
+        "net income": calc.difference(spent, income),
+    }
+
+    return {
+        goal: {"so_far": amount, "goal": dc.get_goal(goal, "annual")}
+        for goal, amount in amounts.items()
+    }
+
+
+ROUTES = {
+    "/expenses": get_expenses,
+    "/income": get_income,
+    "/budgets": get_budgets,
+    "/goals": get_goals,
+    "/progress": get_progress,
+}
+
+
+class ResponseCache:
+    """This class represents the bodies of responses already sent for
+    the current ETag. Every body is dropped when the ETag changes.
+
+    Attributes
+    ----------
+    etag : str or None
+        ETag the bodies were made for
+    bodies : dict
+        response bodies with URL as keys
+    lock : Lock
+        held while the cache is read or changed
+
+    Methods
+    ----------
+    get:
+        returns the body for a URL or None
+    put:
+        keeps the body for a URL
+    """
+
+    def __init__(self):
+        """Constructs an empty cache."""
+        self.etag = None
+        self.bodies = {}
+        self.lock = threading.Lock()
+
+    def get(self, etag, url):
+        """This method gets the body already sent for a URL.
+
+        :param self: ResponseCache object
+        :param etag: current ETag
+        :param url: path and query of request
+        :return: response body or None
+        :rtype: bytes or None
+        """
+        with self.lock:
+            if etag != self.etag:
+                self.etag = etag
+                self.bodies = {}
+            return self.bodies.get(url)
+
+    def put(self, etag, url, body):
+        """This method keeps the body sent for a URL.
+
+        :param self: ResponseCache object
+        :param etag: ETag the body was made for
+        :param url: path and query of request
+        :param body: response body
+        :return: None
+        """
+        with self.lock:
+            if etag == self.etag:
+                self.bodies[url] = body
+
+
+_cache = ResponseCache()
+
+
+def get_etag():
+    """This function gets the ETag for every response, which changes
+    when the database changes or a new day starts.
+
+    :return: ETag
+    :rtype: str
+    """
+    version, ledger_version = dc.get_data_version()
+    return f'"{version}-{ledger_version}-{datetime.date.today()}"'
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """This class handles each request to the server.
+
+    Methods
+    ----------
+    do_GET:
+        sends the JSON for an endpoint
+    send_body:
+        sends a response
+    """
+
+    # Keep connections open so that pollers don't reconnect every time
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so send each straight away
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        """This method sends the JSON for an endpoint, or 304 if the
+        client already has it.
+
+        :param self: RequestHandler object
+        :return: None
+        """
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path.rstrip("/"))
+        if route is None:
+            self.send_body(404, {"error": "Not found"})
+            return
+
+        etag = get_etag()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_body(304, None, etag)
+            return
+
+        body = _cache.get(etag, self.path)
+        if body is None:
+            try:
+                data = route(parse_qs(url.query))
+            except ValueError as e:
+                self.send_body(400, {"error": str(e)})
+                return
+            body = json.dumps(data).encode()
+            _cache.put(etag, self.path, body)
+
+        self.send_body(200, body, etag)
+
+    def send_body(self, status, body, etag=None):
+        """This method sends a response.
+
+        :param self: RequestHandler object
+        :param status: HTTP status code
+        :param body: JSON bytes, data to convert to JSON, or None
+        :param etag: ETag of response (default = None)
+        :return: None
+        """
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        else:
+            self.send_header("Content-Length", "0")
+        self.end_headers()
+
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """This method stops a line being printed for every request."""
+
+
+def make_server(port=DEFAULT_PORT, ledger_id=None):
+    """This function creates the server, with connections to the
+    database kept open in a pool.
+
+    :param port: port to listen on, or 0 for any free port
+    :param ledger_id: id of ledger to serve or None for finances.db
+    :return: server
+    :rtype: obj
+    """
+    if ledger_id:
+        ledgers.open_ledger(ledger_id)
+    else:
+        dc.set_connection_pool(ledgers.ConnectionPool())
+
+    dc.create_tables()
+    return ThreadingHTTPServer((HOST, port), RequestHandler)
+
+
+def main():
+    """This function runs the server until it is stopped.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ledger", help="id of user or ledger to serve")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.ledger)
+    print(f"Serving on http://{HOST}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
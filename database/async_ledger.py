@@ -0,0 +1,345 @@
+"""This module lets programmes using asyncio, such as a server or a
+terminal interface, read and write the ledger without blocking their
+event loop. Reads run on a pool of reader threads, each with its own
+connection, and every write runs in turn on one writer thread with a
+single connection. The database is put in write-ahead log mode so that
+reads carry on while a write is being committed, and a write never has
+to wait for another write from the same programme.
+
+    async with AsyncLedger() as ledger:
+        rows = await ledger.expenses_between("2024-01-01", "2024-01-31")
+        await ledger.add_expense("2024-01-31", "Bread", 1.2, 2)
+
+The SQL is the same as in database_commands.py, and each write is
+recorded there afterwards so that the ledger index and caches follow.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import threading
+from database import database_commands as dc
+
+# Reader threads, and so reads run at the same time
+DEFAULT_READERS = 4
+# Milliseconds to wait for another programme to finish writing
+BUSY_TIMEOUT = 5000
+WAL_MODE = """PRAGMA journal_mode=WAL"""
+SET_BUSY_TIMEOUT = f"""PRAGMA busy_timeout = {BUSY_TIMEOUT}"""
+QUERY_ONLY = """PRAGMA query_only = ON"""
+
+
+class AsyncLedger:
+    """This class represents a ledger read and written from asyncio.
+
+    Attributes
+    ----------
+    path : str
+        path to database file
+    reader_executor : ThreadPoolExecutor
+        threads which run reads
+    writer_executor : ThreadPoolExecutor
+        single thread which runs every write in turn
+    local : threading.local
+        connection of each thread
+    connections : list
+        every connection opened, closed with the ledger
+
+    Methods
+    ----------
+    expenses_between:
+        returns expenses between two dates
+    income_between:
+        returns income between two dates
+    category_totals:
+        returns total spent in each category between two dates
+    total_spending:
+        returns total spent between two dates
+    balance:
+        returns balance of an account
+    add_expense:
+        enters a new expense
+    add_income:
+        enters a new income
+    add_transfer:
+        moves money between accounts
+    write_many:
+        runs several commands in one transaction
+    close:
+        waits for writes to finish and closes every connection
+    """
+
+    def __init__(self, path=None, readers=DEFAULT_READERS):
+        """Constructs a ledger for a database file, by default the one
+        used by database_commands."""
+        self.path = path or dc.get_database()
+        self.reader_executor = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="ledger-reader"
+        )
+        self.writer_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ledger-writer"
+        )
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+        # Write-ahead logging is kept by the file once it is set
+        db = sqlite3.connect(self.path)
+        db.execute(WAL_MODE)
+        db.close()
+
+    async def __aenter__(self):
+        """Returns the ledger for use in an async with block."""
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Closes the ledger at the end of an async with block."""
+        await self.close()
+
+    def get_connection(self, read_only):
+        """This method gets the connection of the current thread,
+        opening it the first time.
+
+        :param self: AsyncLedger object
+        :param read_only: True for a reader thread
+        :return: connection
+        :rtype: obj
+        """
+        db = getattr(self.local, "db", None)
+
+        if db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute(SET_BUSY_TIMEOUT)
+            if read_only:
+                db.execute(QUERY_ONLY)
+            self.local.db = db
+            with self.lock:
+                self.connections.append(db)
+
+        return db
+
+    def fetch(self, string, args):
+        """This method runs a query on a reader thread.
+
+        :param self: AsyncLedger object
+        :param string: SQLite command
+        :param args: arguments for command
+        :return: rows
+        :rtype: list of tuples
+        """
+        return self.get_connection(True).execute(string, args).fetchall()
+
+    def execute(self, commands):
+        """This method runs commands in one transaction on the writer
+        thread.
+
+        :param self: AsyncLedger object
+        :param commands: list of (str, args, True if args is a list of
+            rows)
+        :return: id of the last inserted row
+        :rtype: int
+        """
+        db = self.get_connection(False)
+        row_id = None
+
+        try:
+            for string, args, many in commands:
+                if many:
+                    db.executemany(string, args)
+                else:
+                    row_id = db.execute(string, args).lastrowid
+            db.commit()
+        except sqlite3.Error:
+            db.rollback()
+            raise
+
+        return row_id
+
+    async def read(self, string, args=()):
+        """This method runs a query without blocking the event loop.
+
+        :param self: AsyncLedger object
+        :param string: SQLite command
+        :param args: arguments for command (default = ())
+        :return: rows
+        :rtype: list of tuples
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.reader_executor, self.fetch, string, args
+        )
+
+    async def write(self, string, args):
+        """This method runs one command on the writer thread.
+
+        :param self: AsyncLedger object
+        :param string: SQLite command
+        :param args: arguments for command
+        :return: id of the inserted row
+        :rtype: int
+        """
+        loop = asyncio.get_running_loop()
+        row_id = await loop.run_in_executor(
+            self.writer_executor, self.execute, [(string, args, False)]
+        )
+        dc.record_write(string, args, row_id)
+
+        return row_id
+
+    async def write_many(self, commands):
+        """This method runs several commands, each with a list of
+        arguments, in one transaction on the writer thread.
+
+        :param self: AsyncLedger object
+        :param commands: list of (str, list) tuples
+        :return: None
+        """
+        commands = [command for command in commands if command[1]]
+        if not commands:
+            return
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.writer_executor,
+            self.execute,
+            [(string, rows, True) for string, rows in commands],
+        )
+        for string, rows in commands:
+            dc.record_write(string, rows, None)
+
+    async def expenses_between(self, first_day, last_day, category_ids=None):
+        """This method gets the expenses between two dates.
+
+        :param self: AsyncLedger object
+        :param first_day: first date as YYYY-MM-DD
+        :param last_day: last date as YYYY-MM-DD
+        :param category_ids: category ids to include or None for all
+        :return: rows from expenses joined with categories, newest first
+        :rtype: list of tuples
+        """
+        query = dc.Query("expenses").between(first_day, last_day)
+        if category_ids is not None:
+            query.in_categories(category_ids)
+
+        return await self.read(*query.get_sql())
+
+    async def income_between(self, first_day, last_day, source_ids=None):
+        """This method gets the income between two dates.
+
+        :param self: AsyncLedger object
+        :param first_day: first date as YYYY-MM-DD
+        :param last_day: last date as YYYY-MM-DD
+        :param source_ids: source ids to include or None for all
+        :return: rows from income joined with sources, newest first
+        :rtype: list of tuples
+        """
+        query = dc.Query("income").between(first_day, last_day)
+        if source_ids is not None:
+            query.in_categories(source_ids)
+
+        return await self.read(*query.get_sql())
+
+    async def category_totals(self, first_day, last_day):
+        """This method gets the total spent in each category between two
+        dates.
+
+        :param self: AsyncLedger object
+        :param first_day: first date as YYYY-MM-DD
+        :param last_day: last date as YYYY-MM-DD
+        :return: total spent with category id as keys
+        :rtype: dict
+        """
+        rows = await self.read(dc.SELECT_CAT_TOTALS, (first_day, last_day))
+        return {category_id: round(total, 2) for category_id, total in rows}
+
+    async def total_spending(self, first_day, last_day):
+        """This method gets the total spent between two dates.
+
+        :param self: AsyncLedger object
+        :param first_day: first date as YYYY-MM-DD
+        :param last_day: last date as YYYY-MM-DD
+        :return: total spent
+        :rtype: float
+        """
+        rows = await self.read(dc.SELECT_EXPS_TOTAL, (first_day, last_day))
+        return round(rows[0][0] or 0, 2)
+
+    async def balance(self, account_id=dc.DEFAULT_ACCOUNT):
+        """This method gets the balance of an account.
+
+        :param self: AsyncLedger object
+        :param account_id: primary key in accounts table
+            (default = DEFAULT_ACCOUNT)
+        :return: balance or None if there is no such account
+        :rtype: float or None
+        """
+        rows = await self.read(dc.SELECT_BALANCE, (account_id,))
+        return rows[0][0] if rows else None
+
+    async def add_expense(
+        self,
+        date,
+        description,
+        amount,
+        category_id,
+        account_id=dc.DEFAULT_ACCOUNT,
+    ):
+        """This method enters a new expense.
+
+        :param self: AsyncLedger object
+        :param date: date as YYYY-MM-DD
+        :param description: expense description
+        :param amount: amount of expense
+        :param category_id: primary key in categories table
+        :param account_id: account paid from (default = DEFAULT_ACCOUNT)
+        :return: id of the new expense
+        :rtype: int
+        """
+        args = (date, description, float(amount), category_id, account_id)
+        return await self.write(dc.INSERT_EXPENSE_ACCOUNT, args)
+
+    async def add_income(
+        self, date, source_id, amount, account_id=dc.DEFAULT_ACCOUNT
+    ):
+        """This method enters a new income.
+
+        :param self: AsyncLedger object
+        :param date: date as YYYY-MM-DD
+        :param source_id: primary key in sources table
+        :param amount: amount of income
+        :param account_id: account paid into (default = DEFAULT_ACCOUNT)
+        :return: id of the new income
+        :rtype: int
+        """
+        args = (date, source_id, float(amount), account_id)
+        return await self.write(dc.INSERT_INCOME_ACCOUNT, args)
+
+    async def add_transfer(self, date, from_id, to_id, amount):
+        """This method moves money from one account to another.
+
+        :param self: AsyncLedger object
+        :param date: date as YYYY-MM-DD
+        :param from_id: primary key of account paid from
+        :param to_id: primary key of account paid into
+        :param amount: amount moved
+        :return: id of the new transfer
+        :rtype: int
+        """
+        args = (date, from_id, to_id, float(amount))
+        return await self.write(dc.INSERT_TRANSFER, args)
+
+    async def close(self):
+        """This method waits for every read and write already started
+        to finish and closes every connection.
+
+        :param self: AsyncLedger object
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.writer_executor.shutdown)
+        await loop.run_in_executor(None, self.reader_executor.shutdown)
+
+        with self.lock:
+            for db in self.connections:
+                db.close()
+            self.connections = []
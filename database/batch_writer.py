@@ -0,0 +1,266 @@
+"""This module enters rows into the database from a background thread,
+grouping commands sent close together into one transaction. A
+transaction is committed once MAX_ROWS rows are waiting or MAX_WAIT
+seconds after the first of them was sent, so an import, recurring
+payments and the user writing at the same time share one commit rather
+than taking turns to lock the database for each row.
+
+    writer = batch_writer.get_writer()
+    future = writer.submit(dc.INSERT_EXPENSE_ACCOUNT, args)
+    expense_id = future.result()
+
+Each command gets a Future which gives the id of the inserted row, or
+raises the error from the database. If a transaction fails, its
+commands are run again one at a time so that only the command which
+caused the error fails. Every command still waiting is committed when
+the writer is closed, which happens when the programme exits.
+
+Write listeners, such as the ledger index, are told about each command
+on the writer thread before its Future is resolved, so a caller reading
+straight after the result sees its own row. An error from a listener is
+logged by database_commands and can't stop the writer.
+"""
+
+import atexit
+from concurrent.futures import Future
+import queue
+import sqlite3
+import threading
+import time
+from database import database_commands as dc
+
+# Rows committed in one transaction at most
+MAX_ROWS = 500
+# Seconds a command waits for others to join its transaction
+MAX_WAIT = 0.05
+# Put on the queue to stop the writer thread
+STOP = None
+
+
+class BatchWriter:
+    """This class represents a thread which commits commands from a
+    queue in transactions of several commands.
+
+    Attributes
+    ----------
+    max_rows : int
+        most rows committed in one transaction
+    max_wait : float
+        seconds a command waits for others to join its transaction
+    commands : Queue
+        (database path, command, args, True if args is a list of rows,
+        Future) waiting to be committed
+    thread : Thread
+        thread which commits commands
+    closed : bool
+        True once no more commands are accepted
+
+    Methods
+    ----------
+    submit:
+        queues a command with one row of arguments
+    submit_many:
+        queues a command with a list of rows of arguments
+    flush:
+        waits for every queued command to be committed
+    close:
+        commits every queued command and stops the thread
+    """
+
+    def __init__(self, max_rows=MAX_ROWS, max_wait=MAX_WAIT):
+        """Constructs a writer and starts its thread."""
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.commands = queue.Queue()
+        self.closed = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.run, name="batch-writer", daemon=True
+        )
+        self.thread.start()
+
+    def put(self, string, args, many):
+        """This method queues a command for the database used by the
+        current thread or task.
+
+        :param self: BatchWriter object
+        :param string: SQLite command
+        :param args: arguments for command
+        :param many: True if args is a list of rows
+        :return: Future for the command
+        :rtype: Future
+        """
+        future = Future()
+
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("Batch writer has been closed")
+            self.commands.put(
+                (dc.get_database(), string, args, many, future)
+            )
+
+        return future
+
+    def submit(self, string, args):
+        """This method queues a command with one row of arguments.
+
+        :param self: BatchWriter object
+        :param string: SQLite command
+        :param args: tuple with arguments for command
+        :return: Future giving the id of the inserted row
+        :rtype: Future
+        """
+        return self.put(string, args, False)
+
+    def submit_many(self, string, rows):
+        """This method queues a command with a list of rows of
+        arguments.
+
+        :param self: BatchWriter object
+        :param string: SQLite command
+        :param rows: list of tuples with arguments for command
+        :return: Future giving None once the rows are committed
+        :rtype: Future
+        """
+        return self.put(string, rows, True)
+
+    def flush(self):
+        """This method waits until every command queued so far has been
+        committed.
+
+        :param self: BatchWriter object
+        :return: None
+        """
+        # Nothing is run for an empty list, but the batch is committed
+        self.submit_many(None, []).result()
+
+    def close(self):
+        """This method commits every queued command and stops the
+        thread. Commands can't be queued afterwards.
+
+        :param self: BatchWriter object
+        :return: None
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.commands.put(STOP)
+
+        self.thread.join()
+
+    def run(self):
+        """This method takes commands from the queue and commits them
+        in batches until the writer is closed.
+
+        :param self: BatchWriter object
+        :return: None
+        """
+        stopping = False
+
+        while not stopping:
+            batch = [self.commands.get()]
+            if batch[0] is STOP:
+                break
+            rows = count_rows(batch[0])
+            deadline = time.monotonic() + self.max_wait
+
+            while rows < self.max_rows:
+                try:
+                    command = self.commands.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if command is STOP:
+                    stopping = True
+                    break
+                batch.append(command)
+                rows += count_rows(command)
+
+            # A transaction can only write to one database file
+            paths = {}
+            for command in batch:
+                paths.setdefault(command[0], []).append(command)
+            for path, commands in paths.items():
+                with dc.use_database(path):
+                    try:
+                        commit_batch(commands)
+                    except Exception as e:
+                        # Commands not yet answered fail rather than
+                        # wait for a thread which has stopped
+                        for command in commands:
+                            if not command[4].done():
+                                command[4].set_exception(e)
+
+
+def count_rows(command):
+    """This function gets the number of rows a queued command writes.
+
+    :param command: queued command
+    :return: number of rows
+    :rtype: int
+    """
+    return len(command[2]) if command[3] else 1
+
+
+def execute(cursor, command):
+    """This function runs one queued command.
+
+    :param cursor: cursor
+    :param command: queued command
+    :return: id of the inserted row, or None for a list of rows
+    :rtype: int or None
+    """
+    _, string, args, many, _ = command
+    if many:
+        if args:
+            cursor.executemany(string, args)
+        return None
+
+    cursor.execute(string, args)
+    return cursor.lastrowid
+
+
+def commit_batch(commands):
+    """This function commits queued commands in one transaction. If it
+    fails each command is committed on its own, so that only commands
+    which cause errors fail.
+
+    :param commands: queued commands for the same database
+    :return: None
+    """
+    try:
+        with dc.get_cursor(True) as cursor:
+            results = [execute(cursor, command) for command in commands]
+    except (sqlite3.Error, ValueError) as e:
+        if len(commands) == 1:
+            commands[0][4].set_exception(e)
+        else:
+            for command in commands:
+                commit_batch([command])
+        return
+
+    for command, row_id in zip(commands, results):
+        if command[1] is not None:
+            dc.record_write(command[1], command[2], row_id)
+        command[4].set_result(row_id)
+
+
+_writer = {"writer": None}
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """This function gets the writer shared by the whole programme,
+    starting it the first time. It is closed when the programme exits.
+
+    :return: batch writer
+    :rtype: BatchWriter
+    """
+    with _writer_lock:
+        if _writer["writer"] is None or _writer["writer"].closed:
+            _writer["writer"] = BatchWriter()
+            atexit.register(_writer["writer"].close)
+
+        return _writer["writer"]
@@ -1,13 +1,34 @@
 """This module contains all functions with logic to interact with the
 database finances.db. This is the only module which accesses the
 database. There are six tables; expenses, income, categories, sources,
-budget and goals.
+budget and goals. Subcategories are held in the closure table
+category_tree, which pairs every category with each of its ancestors.
+Previous budgets and goals are kept with the dates
+they were in force in budget_history and goals_history. Expenses and
+income which repeat on a schedule are held in recurring. An expense
+split across several categories has no category of its own and its
+share in each category is held in expense_splits. The view
+expense_lines lists every expense, or every share of a split expense,
+with its category, and is used for totals by category. Each expense
+and income is paid from or into one of the accounts, and money moved
+between accounts is held in transfers. The balance of each account is
+kept up to date by triggers so it never has to be added up again.
+Results of read functions marked cached are kept until anything is
+committed to the database.
 """
 
+from collections import OrderedDict
 from contextlib import contextmanager
+import contextvars
+import copy
+import datetime
+import functools
+import logging
 import sqlite3
+import threading
 from database import populate_finances_db as pf
 
+DATABASE = "finances.db"
 
 CREATE_EXPENSES_TABLE = """CREATE TABLE IF NOT EXISTS expenses
 (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, expense TEXT,
@@ -25,6 +46,30 @@ CREATE_GOALS_TABLE = """CREATE TABLE IF NOT EXISTS goals
 (id INTEGER PRIMARY KEY AUTOINCREMENT, goal TEXT, amount FLOAT, term TEXT)"""
 CREATE_SOURCES_TABLE = """CREATE TABLE IF NOT EXISTS sources
 (id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT)"""
+CREATE_BUDGET_HISTORY_TABLE = """CREATE TABLE IF NOT EXISTS budget_history
+(id INTEGER PRIMARY KEY AUTOINCREMENT, categoryID INTEGER, amount FLOAT,
+term TEXT, effective_from TEXT, effective_to TEXT, FOREIGN KEY(categoryID)
+REFERENCES categories(id))"""
+CREATE_GOALS_HISTORY_TABLE = """CREATE TABLE IF NOT EXISTS goals_history
+(id INTEGER PRIMARY KEY AUTOINCREMENT, goal TEXT, amount FLOAT, term TEXT,
+effective_from TEXT, effective_to TEXT)"""
+CREATE_BUDGET_HISTORY_INDEX = """CREATE INDEX IF NOT EXISTS
+budget_history_as_of ON budget_history(categoryID, effective_from)"""
+CREATE_GOALS_HISTORY_INDEX = """CREATE INDEX IF NOT EXISTS
+goals_history_as_of ON goals_history(goal, term, effective_from)"""
+CREATE_CATEGORY_TREE_TABLE = """CREATE TABLE IF NOT EXISTS category_tree
+(ancestorID INTEGER, descendantID INTEGER, depth INTEGER,
+PRIMARY KEY(ancestorID, descendantID))"""
+CREATE_CATEGORY_TREE_INDEX = """CREATE INDEX IF NOT EXISTS
+category_tree_descendant ON category_tree(descendantID, depth)"""
+CREATE_EXPENSES_CATEGORY_INDEX = """CREATE INDEX IF NOT EXISTS
+expenses_category ON expenses(categoryID, date)"""
+CREATE_INCOME_SOURCE_INDEX = """CREATE INDEX IF NOT EXISTS
+income_source ON income(sourceID, date)"""
+CREATE_RULES_TABLE = """CREATE TABLE IF NOT EXISTS category_rules
+(id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, pattern TEXT,
+categoryID INTEGER, min_amount FLOAT, max_amount FLOAT,
+FOREIGN KEY(categoryID) REFERENCES categories(id))"""
 MAX_BUDGET_ID = """SELECT MAX(id) FROM budget"""
 INSERT_EXPENSE = """INSERT INTO expenses(date, expense, amount, categoryID)
 VALUES(?,?,?,?)"""
@@ -37,17 +82,14 @@ UPDATE_CATEGORY = """UPDATE categories SET budgetID = ? WHERE id = ?"""
 LAST_INSERTED_ID = """SELECT last_insert_rowid()"""
 SELECT_CATEGORIES = """SELECT * FROM categories INNER JOIN budget ON
 categories.budgetID=budget.id"""
-SELECT_EXPENSES = """SELECT * FROM expenses INNER JOIN categories ON
-expenses.categoryID=categories.id ORDER BY id DESC"""
-SELECT_INCOME = """SELECT * FROM income INNER JOIN sources ON
-income.sourceID=sources.id ORDER BY id DESC"""
 CAT_UPDATE = """UPDATE categories SET category = ? WHERE id = ?"""
 DELETE_BUDGET = """DELETE FROM budget WHERE id = ?"""
 DEL_GOAL = """DELETE FROM goals WHERE id = ?"""
 DELETE_GOAL = """DELETE FROM goals WHERE goal = ? AND term = ?"""
 MAX_BUDGET_ID = """SELECT MAX(id) FROM budget"""
 SEL_CAT_FROM_BUDG = """SELECT category FROM categories WHERE budgetID = ?"""
-SELECT_DATE_AMOUNT = """SELECT date, amount FROM expenses WHERE catID = ?"""
+SELECT_DATE_AMOUNT = """SELECT date, amount FROM expense_lines WHERE
+categoryID = ?"""
 SELECT_GOAL = """SELECT * FROM goals WHERE goal = ? AND term = ?"""
 SELECT_ROWS = """SELECT * FROM {}"""
 SELECT_EXPS_BY_DATE = """SELECT * FROM expenses WHERE date = ?"""
@@ -58,6 +100,462 @@ SRC_UPDATE = """UPDATE sources SET source = ? WHERE id = ?"""
 TABLE_EXISTS = """SELECT name FROM sqlite_master WHERE type='table'"""
 UPDATE_CAT_BUDGET = """UPDATE categories SET budgetID = ? WHERE id = ?"""
 SELECT_FIRST_EXPENSE = """SELECT * FROM expenses WHERE id = 1"""
+SELECT_EXPS_BETWEEN = """SELECT date, amount FROM expenses WHERE date
+BETWEEN ? AND ?"""
+SELECT_INC_BETWEEN = """SELECT date, amount FROM income WHERE date
+BETWEEN ? AND ?"""
+CREATE_EXPENSES_DATE_INDEX = """CREATE INDEX IF NOT EXISTS expenses_date
+ON expenses(date)"""
+SELECT_CAT_TOTALS = """SELECT categoryID, SUM(amount) FROM expense_lines
+WHERE date BETWEEN ? AND ? GROUP BY categoryID"""
+SELECT_EXPS_TOTAL = """SELECT SUM(amount) FROM expenses WHERE date BETWEEN
+? AND ?"""
+INSERT_BUDGET_HISTORY = """INSERT INTO budget_history(categoryID, amount,
+term, effective_from) VALUES(?,?,?,?)"""
+INSERT_GOAL_HISTORY = """INSERT INTO goals_history(goal, amount, term,
+effective_from) VALUES(?,?,?,?)"""
+END_BUDGET_HISTORY = """UPDATE budget_history SET effective_to = ? WHERE
+categoryID = ? AND effective_to IS NULL"""
+END_GOAL_HISTORY = """UPDATE goals_history SET effective_to = ? WHERE
+goal = ? AND effective_to IS NULL"""
+END_GOAL_TERM_HISTORY = """UPDATE goals_history SET effective_to = ? WHERE
+goal = ? AND term = ? AND effective_to IS NULL"""
+SELECT_BUDGET_AS_OF = """SELECT amount, term, effective_to FROM
+budget_history WHERE categoryID = ? AND effective_from <= ?
+ORDER BY effective_from DESC, id DESC LIMIT 1"""
+SELECT_GOAL_AS_OF = """SELECT amount, effective_to FROM goals_history
+WHERE goal = ? AND term = ? AND effective_from <= ?
+ORDER BY effective_from DESC, id DESC LIMIT 1"""
+SEED_BUDGET_HISTORY = """INSERT INTO budget_history(categoryID, amount,
+term, effective_from) SELECT categories.id, budget.amount, budget.term, ?
+FROM categories INNER JOIN budget ON categories.budgetID=budget.id
+WHERE NOT EXISTS (SELECT 1 FROM budget_history)"""
+SEED_GOALS_HISTORY = """INSERT INTO goals_history(goal, amount, term,
+effective_from) SELECT goal, amount, term, ? FROM goals
+WHERE NOT EXISTS (SELECT 1 FROM goals_history)"""
+INSERT_CATEGORY_PATHS = """INSERT INTO category_tree(ancestorID,
+descendantID, depth) SELECT ancestorID, ?, depth + 1 FROM category_tree
+WHERE descendantID = ? UNION ALL SELECT ?, ?, 0"""
+SEED_CATEGORY_TREE = """INSERT INTO category_tree(ancestorID, descendantID,
+depth) SELECT id, id, 0 FROM categories WHERE id NOT IN
+(SELECT descendantID FROM category_tree)"""
+SELECT_CATEGORY_PARENTS = """SELECT descendantID, ancestorID FROM
+category_tree WHERE depth = 1"""
+SELECT_CATEGORY_PATHS = """SELECT ancestorID, descendantID FROM
+category_tree"""
+SELECT_DESCENDANTS = """SELECT descendantID FROM category_tree WHERE
+ancestorID = ?"""
+SELECT_ANCESTORS = """SELECT ancestorID FROM category_tree WHERE
+descendantID = ?"""
+# Totals by category are found before rolling them up, as joining the
+# expense_lines view would copy every line in the range first
+SELECT_ROLLUP_TOTALS = """SELECT category_tree.ancestorID,
+SUM(totals.amount) FROM (SELECT categoryID, SUM(amount) AS amount
+FROM expense_lines WHERE date BETWEEN ? AND ? GROUP BY categoryID) AS totals
+INNER JOIN category_tree ON totals.categoryID=category_tree.descendantID
+GROUP BY category_tree.ancestorID"""
+# Period each expense falls in, as the Monday of its week, its month
+# as YYYY-MM or its year
+PIVOT_PERIODS = {
+    "weekly": "date(date, '-6 days', 'weekday 1')",
+    "monthly": "strftime('%Y-%m', date)",
+    "annual": "strftime('%Y', date)",
+}
+SELECT_PIVOT = {
+    "expenses": """SELECT categoryID, {} AS period, SUM(amount) FROM
+expense_lines WHERE date BETWEEN ? AND ? GROUP BY categoryID, period""",
+    "income": """SELECT sourceID, {} AS period, SUM(amount) FROM income
+WHERE date BETWEEN ? AND ? GROUP BY sourceID, period""",
+}
+INSERT_RULE = """INSERT INTO category_rules(kind, pattern, categoryID,
+min_amount, max_amount) VALUES(?,?,?,?,?)"""
+SELECT_RULES = """SELECT * FROM category_rules ORDER BY id"""
+DELETE_RULE = """DELETE FROM category_rules WHERE id = ?"""
+SELECT_MERCHANTS = """SELECT expense, categoryID, COUNT(*) FROM expenses
+GROUP BY expense, categoryID"""
+TABLE_COLUMNS = """PRAGMA table_info({})"""
+QUICK_CHECK = """PRAGMA quick_check"""
+DATA_VERSION = """PRAGMA data_version"""
+ADD_COLUMN = """ALTER TABLE {} ADD COLUMN {} {}"""
+CREATE_EXPENSES_FINGERPRINT_INDEX = """CREATE INDEX IF NOT EXISTS
+expenses_fingerprint ON expenses(fingerprint)"""
+CREATE_INCOME_FINGERPRINT_INDEX = """CREATE INDEX IF NOT EXISTS
+income_fingerprint ON income(fingerprint)"""
+INSERT_EXPENSE_FINGERPRINT = """INSERT INTO expenses(date, expense, amount,
+categoryID, fingerprint) VALUES(?,?,?,?,?)"""
+INSERT_INCOME_FINGERPRINT = """INSERT INTO income(date, sourceID, amount,
+fingerprint) VALUES(?,?,?,?)"""
+SELECT_EXPS_NO_FINGERPRINT = """SELECT id, date, expense, amount,
+categoryID FROM expenses WHERE fingerprint IS NULL"""
+SELECT_INC_NO_FINGERPRINT = """SELECT id, date, '', amount, sourceID FROM
+income WHERE fingerprint IS NULL"""
+UPDATE_FINGERPRINT = """UPDATE {} SET fingerprint = ? WHERE id = ?"""
+COUNT_FINGERPRINTS = """SELECT fingerprint, COUNT(*) FROM {} WHERE
+fingerprint IN ({}) GROUP BY fingerprint"""
+SELECT_DUPLICATES = """SELECT fingerprint, COUNT(*) FROM {} WHERE
+fingerprint IS NOT NULL GROUP BY fingerprint HAVING COUNT(*) > 1"""
+SELECT_BY_FINGERPRINT = """SELECT * FROM {} WHERE fingerprint = ?
+ORDER BY id"""
+DELETE_DUPLICATES = """DELETE FROM {0} WHERE fingerprint IS NOT NULL AND
+id > (SELECT MIN(id) FROM {0} AS earlier WHERE
+earlier.fingerprint = {0}.fingerprint)"""
+SELECT_EXPS_TO_RECONCILE = """SELECT id, date, expense, amount FROM expenses
+WHERE date BETWEEN ? AND ? ORDER BY date, id"""
+SELECT_INC_TO_RECONCILE = """SELECT income.id, date, source, amount FROM
+income INNER JOIN sources ON income.sourceID=sources.id WHERE date
+BETWEEN ? AND ? ORDER BY date, income.id"""
+# Rows added after a snapshot was taken, and rows the snapshot holds
+SELECT_SNAPSHOT = {
+    "expenses": """SELECT id, date, expense, amount, categoryID, accountID
+FROM expense_lines WHERE id > ?""",
+    "income": """SELECT id, date, sourceID, amount, accountID FROM income
+WHERE id > ?""",
+}
+COUNT_SNAPSHOT = {
+    "expenses": """SELECT COUNT(*) FROM expense_lines WHERE id <= ?""",
+    "income": """SELECT COUNT(*) FROM income WHERE id <= ?""",
+}
+CREATE_ANOMALY_STATS_TABLE = """CREATE TABLE IF NOT EXISTS anomaly_stats
+(categoryID INTEGER PRIMARY KEY, count INTEGER, mean FLOAT, m2 FLOAT,
+quantiles TEXT, FOREIGN KEY(categoryID) REFERENCES categories(id))"""
+# One row, holding the last expense added to anomaly_stats and the
+# number of deletions when it was saved
+CREATE_ANOMALY_SCAN_TABLE = """CREATE TABLE IF NOT EXISTS anomaly_scan
+(id INTEGER PRIMARY KEY, lastID INTEGER, deleted INTEGER)"""
+CREATE_ANOMALIES_TABLE = """CREATE TABLE IF NOT EXISTS anomalies
+(expenseID INTEGER, categoryID INTEGER, amount FLOAT, usual FLOAT,
+PRIMARY KEY(expenseID, categoryID))"""
+SELECT_ANOMALY_STATS = """SELECT categoryID, count, mean, m2, quantiles
+FROM anomaly_stats"""
+SELECT_ANOMALY_SCAN = """SELECT lastID, deleted FROM anomaly_scan
+WHERE id = 1"""
+SAVE_ANOMALY_STATS = """INSERT OR REPLACE INTO anomaly_stats(categoryID,
+count, mean, m2, quantiles) VALUES(?,?,?,?,?)"""
+SAVE_ANOMALY_SCAN = """INSERT OR REPLACE INTO anomaly_scan(id, lastID,
+deleted) VALUES(1,?,?)"""
+INSERT_ANOMALY = """INSERT OR REPLACE INTO anomalies(expenseID, categoryID,
+amount, usual) VALUES(?,?,?,?)"""
+CLEAR_ANOMALY_STATS = """DELETE FROM anomaly_stats"""
+CLEAR_ANOMALIES = """DELETE FROM anomalies"""
+# One row, counting the rows ever deleted from expenses and expense_splits,
+# so summaries kept up to date one expense at a time can tell when an
+# expense they include has gone without counting the expenses left
+CREATE_DELETIONS_TABLE = """CREATE TABLE IF NOT EXISTS expense_deletions
+(id INTEGER PRIMARY KEY, count INTEGER)"""
+SEED_DELETIONS = """INSERT OR IGNORE INTO expense_deletions(id, count)
+VALUES(1, 0)"""
+CREATE_DELETIONS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS expenses_deletions
+AFTER DELETE ON expenses BEGIN
+UPDATE expense_deletions SET count = count + 1 WHERE id = 1; END""",
+    """CREATE TRIGGER IF NOT EXISTS expense_splits_deletions
+AFTER DELETE ON expense_splits BEGIN
+UPDATE expense_deletions SET count = count + 1 WHERE id = 1; END""",
+]
+SELECT_DELETIONS = """SELECT count FROM expense_deletions WHERE id = 1"""
+# Spending in each category and month, as a t-digest saved as JSON
+CREATE_SKETCHES_TABLE = """CREATE TABLE IF NOT EXISTS spending_sketches
+(month TEXT, categoryID INTEGER, sketch TEXT,
+PRIMARY KEY(month, categoryID))"""
+# One row, holding the last expense added to spending_sketches and the
+# number of deletions when it was saved
+CREATE_SKETCH_SCAN_TABLE = """CREATE TABLE IF NOT EXISTS sketch_scan
+(id INTEGER PRIMARY KEY, lastID INTEGER, deleted INTEGER)"""
+SELECT_SKETCH_SCAN = """SELECT lastID, deleted FROM sketch_scan
+WHERE id = 1"""
+SELECT_SKETCHES = """SELECT month, categoryID, sketch FROM spending_sketches
+WHERE month BETWEEN ? AND ?"""
+SAVE_SKETCH = """INSERT OR REPLACE INTO spending_sketches(month, categoryID,
+sketch) VALUES(?,?,?)"""
+SAVE_SKETCH_SCAN = """INSERT OR REPLACE INTO sketch_scan(id, lastID,
+deleted) VALUES(1,?,?)"""
+CLEAR_SKETCHES = """DELETE FROM spending_sketches"""
+# CROSS JOIN keeps SQLite from reading expenses in date order to sort
+SELECT_ANOMALIES = """SELECT expenses.date, expenses.expense,
+anomalies.amount, categories.category, anomalies.usual FROM anomalies
+CROSS JOIN expenses ON expenses.id=anomalies.expenseID
+INNER JOIN categories ON categories.id=anomalies.categoryID
+ORDER BY expenses.date DESC, expenses.id DESC LIMIT ?"""
+CREATE_EXPENSES_FTS = """CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts
+USING fts5(expense, content='expenses', content_rowid='id',
+tokenize='unicode61 remove_diacritics 2')"""
+CREATE_FTS_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS
+expenses_fts_insert AFTER INSERT ON expenses BEGIN
+INSERT INTO expenses_fts(rowid, expense) VALUES(new.id, new.expense); END"""
+CREATE_FTS_DELETE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS
+expenses_fts_delete AFTER DELETE ON expenses BEGIN
+INSERT INTO expenses_fts(expenses_fts, rowid, expense)
+VALUES('delete', old.id, old.expense); END"""
+CREATE_FTS_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS
+expenses_fts_update AFTER UPDATE OF expense ON expenses BEGIN
+INSERT INTO expenses_fts(expenses_fts, rowid, expense)
+VALUES('delete', old.id, old.expense);
+INSERT INTO expenses_fts(rowid, expense) VALUES(new.id, new.expense); END"""
+REBUILD_EXPENSES_FTS = """INSERT INTO expenses_fts(expenses_fts)
+VALUES('rebuild')"""
+# Matches are split into lines here as joining the expense_lines view to
+# the full text index would read the whole view
+SEARCH_EXPENSES_FTS = """SELECT expenses.id, expenses.date, expenses.expense,
+expenses.amount, expenses.categoryID, expenses.fingerprint, categories.*
+FROM (SELECT expenses.id, expenses.date, expenses.expense,
+COALESCE(expense_splits.amount, expenses.amount) AS amount,
+COALESCE(expense_splits.categoryID, expenses.categoryID) AS categoryID,
+expenses.fingerprint, expenses_fts.rank, expenses_fts.rowid AS fts_rowid
+FROM expenses_fts
+INNER JOIN expenses ON expenses.id=expenses_fts.rowid
+LEFT JOIN expense_splits ON expense_splits.expenseID=expenses.id
+WHERE expenses_fts MATCH ?) AS expenses
+INNER JOIN categories ON expenses.categoryID=categories.id
+WHERE 1{} ORDER BY {} LIMIT ? OFFSET ?"""
+COUNT_FTS_MATCHES = """SELECT COUNT(*) FROM (SELECT 1 FROM expenses_fts
+WHERE expenses_fts MATCH ? LIMIT ?)"""
+BY_RANK = "expenses.rank, expenses.date DESC"
+BY_NEWEST = "expenses.fts_rowid DESC"
+SEARCH_EXPENSES_LIKE = """SELECT expenses.*, categories.* FROM
+expense_lines AS expenses
+INNER JOIN categories ON expenses.categoryID=categories.id
+WHERE 1{} ORDER BY expenses.date DESC, expenses.id DESC LIMIT ? OFFSET ?"""
+SEARCH_FILTERS = {
+    "first_day": " AND expenses.date >= ?",
+    "last_day": " AND expenses.date <= ?",
+    "min_amount": " AND expenses.amount >= ?",
+    "max_amount": " AND expenses.amount <= ?",
+    "category_id": """ AND expenses.categoryID IN
+(SELECT descendantID FROM category_tree WHERE ancestorID = ?)""",
+}
+SEARCH_LIKE = " AND expenses.expense LIKE ?"
+# Searches matching more expenses than this are sorted newest first, as
+# ranking every match would be slow
+MAX_RANKED = 5000
+CREATE_SPLITS_TABLE = """CREATE TABLE IF NOT EXISTS expense_splits
+(id INTEGER PRIMARY KEY AUTOINCREMENT, expenseID INTEGER, categoryID INTEGER,
+amount FLOAT, FOREIGN KEY(expenseID) REFERENCES expenses(id),
+FOREIGN KEY(categoryID) REFERENCES categories(id))"""
+CREATE_SPLITS_EXPENSE_INDEX = """CREATE INDEX IF NOT EXISTS
+expense_splits_expense ON expense_splits(expenseID)"""
+CREATE_SPLITS_CATEGORY_INDEX = """CREATE INDEX IF NOT EXISTS
+expense_splits_category ON expense_splits(categoryID)"""
+CREATE_SPLITS_DELETE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS
+expense_splits_delete AFTER DELETE ON expenses BEGIN
+DELETE FROM expense_splits WHERE expenseID = old.id; END"""
+# The view is made again on start-up in case its columns have changed
+DROP_EXPENSE_LINES_VIEW = """DROP VIEW IF EXISTS expense_lines"""
+CREATE_EXPENSE_LINES_VIEW = """CREATE VIEW expense_lines AS SELECT id, date,
+expense, amount, categoryID, fingerprint, accountID FROM expenses
+WHERE categoryID IS NOT NULL UNION ALL
+SELECT expenses.id, expenses.date, expenses.expense, expense_splits.amount,
+expense_splits.categoryID, expenses.fingerprint, expenses.accountID
+FROM expenses
+INNER JOIN expense_splits ON expense_splits.expenseID=expenses.id
+WHERE expenses.categoryID IS NULL"""
+INSERT_SPLIT = """INSERT INTO expense_splits(expenseID, categoryID, amount)
+VALUES(?,?,?)"""
+# Account given to expenses and income entered before accounts existed
+DEFAULT_ACCOUNT = 1
+CREATE_ACCOUNTS_TABLE = """CREATE TABLE IF NOT EXISTS accounts
+(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, kind TEXT, balance FLOAT)"""
+CREATE_TRANSFERS_TABLE = """CREATE TABLE IF NOT EXISTS transfers
+(id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, fromID INTEGER,
+toID INTEGER, amount FLOAT, FOREIGN KEY(fromID) REFERENCES accounts(id),
+FOREIGN KEY(toID) REFERENCES accounts(id))"""
+CREATE_TRANSFERS_FROM_INDEX = """CREATE INDEX IF NOT EXISTS
+transfers_from ON transfers(fromID, date)"""
+CREATE_TRANSFERS_TO_INDEX = """CREATE INDEX IF NOT EXISTS
+transfers_to ON transfers(toID, date)"""
+CREATE_EXPENSES_ACCOUNT_INDEX = """CREATE INDEX IF NOT EXISTS
+expenses_account ON expenses(accountID, date)"""
+CREATE_INCOME_ACCOUNT_INDEX = """CREATE INDEX IF NOT EXISTS
+income_account ON income(accountID, date)"""
+# The first account starts with everything entered before accounts
+SEED_ACCOUNT = """INSERT INTO accounts(name, kind, balance)
+SELECT 'Current account', 'current',
+ROUND((SELECT COALESCE(SUM(amount), 0) FROM income)
+- (SELECT COALESCE(SUM(amount), 0) FROM expenses), 2)
+WHERE NOT EXISTS (SELECT 1 FROM accounts)"""
+CREATE_BALANCE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS expenses_balance_insert
+AFTER INSERT ON expenses BEGIN
+UPDATE accounts SET balance = ROUND(balance - new.amount, 2)
+WHERE id = new.accountID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS expenses_balance_delete
+AFTER DELETE ON expenses BEGIN
+UPDATE accounts SET balance = ROUND(balance + old.amount, 2)
+WHERE id = old.accountID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS expenses_balance_update
+AFTER UPDATE OF amount, accountID ON expenses BEGIN
+UPDATE accounts SET balance = ROUND(balance + old.amount, 2)
+WHERE id = old.accountID;
+UPDATE accounts SET balance = ROUND(balance - new.amount, 2)
+WHERE id = new.accountID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS income_balance_insert
+AFTER INSERT ON income BEGIN
+UPDATE accounts SET balance = ROUND(balance + new.amount, 2)
+WHERE id = new.accountID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS income_balance_delete
+AFTER DELETE ON income BEGIN
+UPDATE accounts SET balance = ROUND(balance - old.amount, 2)
+WHERE id = old.accountID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS income_balance_update
+AFTER UPDATE OF amount, accountID ON income BEGIN
+UPDATE accounts SET balance = ROUND(balance - old.amount, 2)
+WHERE id = old.accountID;
+UPDATE accounts SET balance = ROUND(balance + new.amount, 2)
+WHERE id = new.accountID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS transfers_balance_insert
+AFTER INSERT ON transfers BEGIN
+UPDATE accounts SET balance = ROUND(balance - new.amount, 2)
+WHERE id = new.fromID;
+UPDATE accounts SET balance = ROUND(balance + new.amount, 2)
+WHERE id = new.toID;
+END""",
+    """CREATE TRIGGER IF NOT EXISTS transfers_balance_delete
+AFTER DELETE ON transfers BEGIN
+UPDATE accounts SET balance = ROUND(balance + old.amount, 2)
+WHERE id = old.fromID;
+UPDATE accounts SET balance = ROUND(balance - old.amount, 2)
+WHERE id = old.toID;
+END""",
+]
+INSERT_ACCOUNT = """INSERT INTO accounts(name, kind, balance) VALUES(?,?,?)"""
+SELECT_ACCOUNTS = """SELECT * FROM accounts ORDER BY id"""
+SELECT_BALANCE = """SELECT balance FROM accounts WHERE id = ?"""
+INSERT_TRANSFER = """INSERT INTO transfers(date, fromID, toID, amount)
+VALUES(?,?,?,?)"""
+INSERT_EXPENSE_ACCOUNT = """INSERT INTO expenses(date, expense, amount,
+categoryID, accountID) VALUES(?,?,?,?,?)"""
+INSERT_INCOME_ACCOUNT = """INSERT INTO income(date, sourceID, amount,
+accountID) VALUES(?,?,?,?)"""
+# Each row's balance is the current balance less everything after it.
+# The rows shown are the newest of each kind, so only those are read.
+SELECT_ACCOUNT_HISTORY = """SELECT history.date, history.description,
+history.amount, accounts.balance - COALESCE(SUM(history.amount) OVER
+(ORDER BY history.date DESC, history.kind DESC, history.id DESC
+ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) FROM
+(SELECT * FROM (SELECT id, date, expense AS description,
+-amount AS amount, 1 AS kind FROM expenses WHERE accountID = ?
+ORDER BY date DESC, id DESC LIMIT ?) UNION ALL
+SELECT * FROM (SELECT income.id, income.date, sources.source, income.amount,
+2 FROM income LEFT JOIN sources ON income.sourceID=sources.id
+WHERE income.accountID = ? ORDER BY income.date DESC, income.id DESC
+LIMIT ?) UNION ALL
+SELECT * FROM (SELECT transfers.id, transfers.date,
+'Transfer to ' || accounts.name, -transfers.amount, 3 FROM transfers
+INNER JOIN accounts ON transfers.toID=accounts.id WHERE transfers.fromID = ?
+ORDER BY transfers.date DESC, transfers.id DESC LIMIT ?) UNION ALL
+SELECT * FROM (SELECT transfers.id, transfers.date,
+'Transfer from ' || accounts.name, transfers.amount, 4 FROM transfers
+INNER JOIN accounts ON transfers.fromID=accounts.id WHERE transfers.toID = ?
+ORDER BY transfers.date DESC, transfers.id DESC LIMIT ?)) AS history
+INNER JOIN accounts ON accounts.id = ?
+ORDER BY history.date DESC, history.kind DESC, history.id DESC LIMIT ?"""
+CREATE_RECURRING_TABLE = """CREATE TABLE IF NOT EXISTS recurring
+(id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, description TEXT,
+amount FLOAT, categoryID INTEGER, frequency TEXT, interval INTEGER,
+start_date TEXT, end_date TEXT, occurrences INTEGER, next_date TEXT)"""
+CREATE_RECURRING_INDEX = """CREATE INDEX IF NOT EXISTS recurring_next
+ON recurring(next_date)"""
+INSERT_RECURRING = """INSERT INTO recurring(kind, description, amount,
+categoryID, frequency, interval, start_date, end_date, occurrences,
+next_date) VALUES(?,?,?,?,?,?,?,?,0,?)"""
+SELECT_RECURRING = """SELECT * FROM recurring ORDER BY next_date, id"""
+SELECT_DUE_RECURRING = """SELECT * FROM recurring WHERE next_date <= ?
+AND (end_date IS NULL OR next_date <= end_date)"""
+UPDATE_RECURRING = """UPDATE recurring SET occurrences = ?, next_date = ?
+WHERE id = ? AND occurrences = ?"""
+DELETE_RECURRING = """DELETE FROM recurring WHERE id = ?"""
+SELECT_JOINED = {
+    "expenses": """SELECT * FROM expense_lines AS expenses INNER JOIN
+categories ON expenses.categoryID=categories.id""",
+    "income": """SELECT * FROM income INNER JOIN sources ON
+income.sourceID=sources.id""",
+}
+# Columns filtered on by Query for each table
+QUERY_COLUMNS = {
+    "expenses": {
+        "category": "expenses.categoryID",
+        "description": "expenses.expense",
+    },
+    "income": {"category": "income.sourceID", "description": "sources.source"},
+}
+ORDER_COLUMNS = ("date", "amount", "id")
+# Most arguments SQLite accepts in one command
+MAX_ARGS = 900
+# Rows read from the database at a time when streaming a query
+FETCH_SIZE = 1000
+# Most results kept by the result cache, and most rows across them
+MAX_CACHED = 128
+MAX_CACHED_ROWS = 200000
+# Start date given to budgets and goals set before history was kept
+FIRST_DATE = "0001-01-01"
+CREATE_INCOME_DATE_INDEX = """CREATE INDEX IF NOT EXISTS income_date
+ON income(date)"""
+
+_log = logging.getLogger(__name__)
+# Incremented on every write so that results derived from the ledger
+# can tell when they are out of date.
+_ledger_version = 0
+# Functions called after every write with (command, args, row id)
+_write_listeners = []
+# Database file used instead of DATABASE in the current thread or task
+_database = contextvars.ContextVar("database", default=None)
+# Pool which keeps connections open between commands, or None
+_pool = {"pool": None}
+# Connection to each database kept only to read its data version
+_version_connections = {}
+_version_lock = threading.Lock()
+# Returned by ResultCache.get when a result isn't cached
+MISSING = object()
+
+
+def get_database():
+    """This function gets the database file used by the current thread
+    or task.
+
+    :return: path to database file
+    :rtype: str
+    """
+    return _database.get() or DATABASE
+
+
+@contextmanager
+def use_database(path):
+    """This function makes every command in the current thread or task
+    use another database file until the block ends.
+
+    :param path: path to database file
+    :return: None
+    """
+    token = _database.set(path)
+    try:
+        yield
+    finally:
+        _database.reset(token)
+
+
+def set_connection_pool(pool):
+    """This function sets a pool to borrow connections from rather than
+    opening a new connection for each command.
+
+    :param pool: object with take(path) and give(path, db) methods, or
+        None to open a new connection each time
+    :return: None
+    """
+    _pool["pool"] = pool
+
+
+def get_connection_pool():
+    """This function gets the pool connections are borrowed from.
+
+    :return: pool, or None if a new connection is opened each time
+    :rtype: obj or None
+    """
+    return _pool["pool"]
 
 
 @contextmanager
@@ -69,8 +567,11 @@ def get_cursor(commit_changes=False):
     :return: cursor
     :rtype: cursor
     """
+    path = get_database()
+    pool = _pool["pool"]
+    db = pool.take(path) if pool else sqlite3.connect(path)
+
     try:
-        db = sqlite3.connect("finances.db")
         cursor = db.cursor()
         yield cursor
     except sqlite3.Error as e:
@@ -80,7 +581,13 @@ def get_cursor(commit_changes=False):
         if commit_changes:
             db.commit()
     finally:
-        db.close()
+        if pool:
+            # Changes not committed are lost, as if the connection closed
+            if db.in_transaction:
+                db.rollback()
+            pool.give(path, db)
+        else:
+            db.close()
 
 
 def insert_data(string, args):
@@ -88,10 +595,16 @@ def insert_data(string, args):
 
     :param string: SQLite command
     :param args: tuple with arguments for command
-    :return: None
+    :return: id of the last inserted row
+    :rtype: int
     """
     with get_cursor(True) as cursor:
         cursor.execute(string, args)
+        row_id = cursor.lastrowid
+
+    record_write(string, args, row_id)
+
+    return row_id
 
 
 def insert_many(command):
@@ -100,9 +613,285 @@ def insert_many(command):
     :param command: tuple containing (str, list)
     :return: None
     """
+    global _ledger_version
+
     with get_cursor(True) as cursor:
         cursor.executemany(*command)
 
+    _ledger_version += 1
+    notify_write(command[0], command[1], None)
+
+
+def insert_split_expense(expense, splits, account_id=DEFAULT_ACCOUNT):
+    """This function enters an expense split across several categories
+    in one transaction. The expense is entered without a category and
+    each category's share is entered into the expense_splits table.
+
+    :param expense: (date, description, amount)
+    :param splits: list of (category id, amount)
+    :param account_id: account paid from (default = DEFAULT_ACCOUNT)
+    :return: id of the new expense
+    :rtype: int
+    """
+    global _ledger_version
+
+    args = (*expense, None, account_id)
+    with get_cursor(True) as cursor:
+        cursor.execute(INSERT_EXPENSE_ACCOUNT, args)
+        expense_id = cursor.lastrowid
+        split_rows = [
+            (expense_id, category_id, amount) for category_id, amount in splits
+        ]
+        cursor.executemany(INSERT_SPLIT, split_rows)
+
+    _ledger_version += 1
+    notify_write(INSERT_EXPENSE_ACCOUNT, args, expense_id)
+    notify_write(INSERT_SPLIT, split_rows, None)
+
+    return expense_id
+
+
+def insert_batch(commands):
+    """This function runs several commands, each with a list of
+    arguments, in one transaction so that either all or none of them
+    are saved.
+
+    :param commands: list of (str, list) tuples
+    :return: None
+    """
+    global _ledger_version
+
+    commands = [command for command in commands if command[1]]
+    if not commands:
+        return
+
+    with get_cursor(True) as cursor:
+        for command in commands:
+            cursor.executemany(*command)
+
+    _ledger_version += 1
+    for command in commands:
+        notify_write(command[0], command[1], None)
+
+
+def add_write_listener(listener):
+    """This function registers a function to be called after every
+    write to the database.
+
+    :param listener: function taking (command, args, row id). For a
+        write of many rows args is a list and row id is None.
+    :return: None
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def record_write(string, args, row_id):
+    """This function changes the ledger version and tells every write
+    listener that a command has been committed.
+
+    :param string: SQLite command that was committed
+    :param args: arguments for command
+    :param row_id: id of the inserted row or None
+    :return: None
+    """
+    global _ledger_version
+
+    _ledger_version += 1
+    notify_write(string, args, row_id)
+
+
+def notify_write(string, args, row_id):
+    """This function calls every registered write listener. An error
+    from one listener is logged, and the others are still called, as
+    the write has already been committed.
+
+    :param string: SQLite command that was committed
+    :param args: arguments for command
+    :param row_id: id of the inserted row or None
+    :return: None
+    """
+    for listener in _write_listeners:
+        try:
+            listener(string, args, row_id)
+        except Exception:
+            _log.exception("Write listener %s failed", listener.__name__)
+
+
+def get_ledger_version():
+    """This function gets a number which changes every time data is
+    written to the database.
+
+    :return: ledger version
+    :rtype: int
+    """
+    return _ledger_version
+
+
+def get_data_version():
+    """This function gets a value which changes whenever anything is
+    committed to the database, by this or any other programme. SQLite's
+    data version changes when another connection commits, so it is read
+    from a connection which never writes, and is paired with the ledger
+    version for writes from this programme.
+
+    :return: data version and ledger version
+    :rtype: tuple of int
+    """
+    path = get_database()
+
+    with _version_lock:
+        db = _version_connections.get(path)
+        if db is None:
+            db = sqlite3.connect(path, check_same_thread=False)
+            _version_connections[path] = db
+        version = db.execute(DATA_VERSION).fetchone()[0]
+
+    return version, _ledger_version
+
+
+class ResultCache:
+    """This class represents the results of read functions kept while
+    the database they were read from is unchanged. The least recently
+    used result is dropped when too many results or rows are kept.
+
+    Attributes
+    ----------
+    max_entries : int
+        most results kept
+    max_rows : int
+        most rows kept across all results
+    entries : OrderedDict
+        (number of rows, result) with (database path, function,
+        arguments) as keys, least recently used first
+    versions : dict
+        data version the results were read at with database path as keys
+    rows : int
+        number of rows kept
+    lock : Lock
+        held while the cache is read or changed
+
+    Methods
+    ----------
+    get:
+        returns a result or MISSING
+    put:
+        keeps a result
+    clear:
+        drops every result
+    """
+
+    def __init__(self, max_entries=MAX_CACHED, max_rows=MAX_CACHED_ROWS):
+        """Constructs an empty cache."""
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        """This method gets a result kept at the current data version,
+        dropping every result for the database if it has changed.
+
+        :param self: ResultCache object
+        :param key: (database path, function, arguments)
+        :param version: data version of database
+        :return: result or MISSING
+        :rtype: obj
+        """
+        with self.lock:
+            if self.versions.get(key[0]) != version:
+                self.versions[key[0]] = version
+                for old_key in [k for k in self.entries if k[0] == key[0]]:
+                    self.rows -= self.entries.pop(old_key)[0]
+                return MISSING
+
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, result):
+        """This method keeps a result read at a data version, unless
+        the database has changed since.
+
+        :param self: ResultCache object
+        :param key: (database path, function, arguments)
+        :param version: data version when the result was read
+        :param result: result of function
+        :return: None
+        """
+        size = len(result) if hasattr(result, "__len__") else 1
+        if size > self.max_rows:
+            return
+
+        with self.lock:
+            if self.versions.get(key[0]) != version:
+                return
+            if key in self.entries:
+                self.rows -= self.entries.pop(key)[0]
+            self.entries[key] = (size, result)
+            self.rows += size
+
+            while (
+                len(self.entries) > self.max_entries
+                or self.rows > self.max_rows
+            ):
+                self.rows -= self.entries.popitem(last=False)[1][0]
+
+    def clear(self):
+        """This method drops every result.
+
+        :param self: ResultCache object
+        :return: None
+        """
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+            self.rows = 0
+
+
+_result_cache = ResultCache()
+
+
+def cached(function):
+    """This function makes a read function keep its results until the
+    database changes, whether it is written to by this programme or any
+    other. Results are copied before they are returned so that callers
+    can change them.
+
+    :param function: function which only reads the database
+    :return: function which returns kept results
+    :rtype: function
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        key = (
+            get_database(),
+            function.__module__,
+            function.__qualname__,
+            *(tuple(arg) if isinstance(arg, list) else arg for arg in args),
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return function(*args)
+
+        version = get_data_version()
+        result = _result_cache.get(key, version)
+        if result is MISSING:
+            result = function(*args)
+            _result_cache.put(key, version, result)
+
+        if isinstance(result, (list, dict, set)):
+            return copy.copy(result)
+        return result
+
+    return wrapper
+
 
 def fetch_one(command):
     """This function fetches data from one row in the database.
@@ -151,6 +940,23 @@ def fetch_all(command):
     return data
 
 
+def stream_rows(string, args):
+    """This function fetches the rows of a query in batches so that
+    large results are not held in memory at once.
+
+    :param string: SQLite command
+    :param args: arguments for SQLite command
+    :return: rows of query
+    :rtype: generator of tuples
+    """
+    with get_cursor() as cursor:
+        cursor.execute(string, args)
+        rows = cursor.fetchmany(FETCH_SIZE)
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(FETCH_SIZE)
+
+
 def fetch_all_with_args(string, args):
     """This function fetches data from one or more rows in the
     database which match selected arguments.
@@ -180,13 +986,177 @@ def create_tables():
         CREATE_SOURCES_TABLE,
         CREATE_BUDGET_TABLE,
         CREATE_GOALS_TABLE,
+        CREATE_EXPENSES_DATE_INDEX,
+        CREATE_INCOME_DATE_INDEX,
+        CREATE_BUDGET_HISTORY_TABLE,
+        CREATE_GOALS_HISTORY_TABLE,
+        CREATE_BUDGET_HISTORY_INDEX,
+        CREATE_GOALS_HISTORY_INDEX,
+        CREATE_CATEGORY_TREE_TABLE,
+        CREATE_CATEGORY_TREE_INDEX,
+        CREATE_EXPENSES_CATEGORY_INDEX,
+        CREATE_INCOME_SOURCE_INDEX,
+        CREATE_RULES_TABLE,
+        CREATE_RECURRING_TABLE,
+        CREATE_RECURRING_INDEX,
+        CREATE_SPLITS_TABLE,
+        CREATE_SPLITS_EXPENSE_INDEX,
+        CREATE_SPLITS_CATEGORY_INDEX,
+        CREATE_SPLITS_DELETE_TRIGGER,
+        CREATE_ACCOUNTS_TABLE,
+        CREATE_TRANSFERS_TABLE,
+        CREATE_TRANSFERS_FROM_INDEX,
+        CREATE_TRANSFERS_TO_INDEX,
+        CREATE_ANOMALY_STATS_TABLE,
+        CREATE_ANOMALY_SCAN_TABLE,
+        CREATE_ANOMALIES_TABLE,
+        CREATE_DELETIONS_TABLE,
+        *CREATE_DELETIONS_TRIGGERS,
+        CREATE_SKETCHES_TABLE,
+        CREATE_SKETCH_SCAN_TABLE,
     ]
 
     for command in commands:
         with get_cursor() as cursor:
             cursor.execute(command)
 
+    with get_cursor(True) as cursor:
+        cursor.execute(SEED_DELETIONS)
+
     populate_tables()
+    seed_history()
+    insert_data(SEED_CATEGORY_TREE, ())
+
+    create_search_table()
+
+    add_column("expenses", "fingerprint", "TEXT")
+    add_column("income", "fingerprint", "TEXT")
+    add_column("expenses", "accountID", f"INTEGER DEFAULT {DEFAULT_ACCOUNT}")
+    add_column("income", "accountID", f"INTEGER DEFAULT {DEFAULT_ACCOUNT}")
+    # Left empty for a scan saved before deletions were counted, so the
+    # statistics and sketches are worked out again once
+    add_column("anomaly_scan", "deleted", "INTEGER")
+    add_column("sketch_scan", "deleted", "INTEGER")
+    for command in (
+        CREATE_EXPENSES_FINGERPRINT_INDEX,
+        CREATE_INCOME_FINGERPRINT_INDEX,
+        CREATE_EXPENSES_ACCOUNT_INDEX,
+        CREATE_INCOME_ACCOUNT_INDEX,
+        DROP_EXPENSE_LINES_VIEW,
+        CREATE_EXPENSE_LINES_VIEW,
+    ):
+        with get_cursor() as cursor:
+            cursor.execute(command)
+
+    # The balance of the first account is set before the triggers exist
+    with get_cursor(True) as cursor:
+        cursor.execute(SEED_ACCOUNT)
+        for command in CREATE_BALANCE_TRIGGERS:
+            cursor.execute(command)
+
+
+def create_search_table():
+    """This function creates the full text search table for expense
+    descriptions and the triggers which keep it up to date. Expenses
+    entered before the table existed are added to it. If SQLite was
+    built without FTS5 searches fall back to LIKE.
+
+    :return: None
+    """
+    tables = [row[0] for row in fetch_all(TABLE_EXISTS)]
+
+    try:
+        with get_cursor(True) as cursor:
+            cursor.execute(CREATE_EXPENSES_FTS)
+            cursor.execute(CREATE_FTS_INSERT_TRIGGER)
+            cursor.execute(CREATE_FTS_DELETE_TRIGGER)
+            cursor.execute(CREATE_FTS_UPDATE_TRIGGER)
+            if "expenses_fts" not in tables:
+                cursor.execute(REBUILD_EXPENSES_FTS)
+    except sqlite3.OperationalError:
+        pass
+
+
+def has_search_table():
+    """This function checks whether the full text search table exists.
+
+    :return: True if it exists or False if not
+    :rtype: bool
+    """
+    tables = [row[0] for row in fetch_all(TABLE_EXISTS)]
+    return "expenses_fts" in tables
+
+
+def search_expenses(match, patterns, filters, limit, offset):
+    """This function searches expense descriptions, ranking the best
+    matches first when full text search is available and the most
+    recent first when it isn't or when there are too many matches to
+    rank quickly.
+
+    :param match: FTS5 query
+    :param patterns: LIKE patterns used without full text search
+    :param filters: values with keys from SEARCH_FILTERS, or None
+    :param limit: number of rows to return
+    :param offset: number of rows to skip
+    :return: rows from expenses joined with categories
+    :rtype: list of tuples
+    """
+    conditions = ""
+    args = []
+
+    for key, value in filters.items():
+        if value is not None:
+            conditions += SEARCH_FILTERS[key]
+            args.append(value)
+
+    if has_search_table():
+        matches = fetch_one_with_args(COUNT_FTS_MATCHES, (match, MAX_RANKED))
+        order = BY_RANK if matches[0] < MAX_RANKED else BY_NEWEST
+        command = SEARCH_EXPENSES_FTS.format(conditions, order)
+        args = [match] + args
+    else:
+        command = SEARCH_EXPENSES_LIKE.format(
+            SEARCH_LIKE * len(patterns) + conditions
+        )
+        args = list(patterns) + args
+
+    return fetch_all_with_args(command, args + [limit, offset])
+
+
+def add_column(table, column, definition):
+    """This function adds a column to a table in a database created
+    before the column existed.
+
+    :param table: table name
+    :param column: column name
+    :param definition: column type
+    :return: None
+    """
+    columns = [row[1] for row in fetch_all(TABLE_COLUMNS.format(table))]
+
+    if column not in columns:
+        with get_cursor(True) as cursor:
+            cursor.execute(ADD_COLUMN.format(table, column, definition))
+
+
+def check_integrity():
+    """This function checks the database file for corruption.
+
+    :return: problems found, or ['ok']
+    :rtype: list of str
+    """
+    return [row[0] for row in fetch_all(QUICK_CHECK)]
+
+
+def seed_history():
+    """This function copies the current budgets and goals into the
+    history tables if nothing has been recorded there yet.
+
+    :return: None
+    """
+    with get_cursor(True) as cursor:
+        cursor.execute(SEED_BUDGET_HISTORY, (FIRST_DATE,))
+        cursor.execute(SEED_GOALS_HISTORY, (FIRST_DATE,))
 
 
 def populate_tables():
@@ -211,6 +1181,7 @@ def insert_budget(category_id, budget):
     insert_data(UPDATE_CATEGORY, (*budget_id, category_id))
 
 
+@cached
 def get_row_list(table):
     """This function gets a list of all the rows in a table.
 
@@ -231,47 +1202,456 @@ def enter_category(new_cat, table):
     """
 
     if table == "categories":
-        insert_data(INSERT_CATEGORY, (new_cat,))
+        add_category(new_cat)
     else:
         insert_data(INSERT_SOURCE, (new_cat,))
 
 
-def get_rows(year_month, table):
-    """This function gets all rows from a table and appends rows to a
-    list where the date they were entered matches a selected month.
+def add_category(description, parent_id=None):
+    """This function enters a new expense category, optionally as a
+    subcategory of an existing category.
+
+    :param description: new category description
+    :param parent_id: primary key of parent category (default = None)
+    :return: primary key of new category
+    :rtype: int
+    """
+    category_id = insert_data(INSERT_CATEGORY, (description,))
+
+    if parent_id is None:
+        parent_id = category_id
+
+    args = (category_id, parent_id, category_id, category_id)
+    insert_data(INSERT_CATEGORY_PATHS, args)
 
-    :param year_month: YYYY-MM
-    :return: all rows which match year_month from table
+    return category_id
+
+
+@cached
+def get_category_parents():
+    """This function gets the parent of every subcategory.
+
+    :return: parent category id with category id as keys
+    :rtype: dict
+    """
+    return dict(fetch_all(SELECT_CATEGORY_PARENTS))
+
+
+@cached
+def get_category_paths():
+    """This function gets every (ancestor, descendant) pair of
+    categories, including each category paired with itself.
+
+    :return: list of (ancestor id, descendant id)
     :rtype: list of tuples
     """
-    rows_list = []
-    rows = get_joined_rows(table)
+    return fetch_all(SELECT_CATEGORY_PATHS)
 
-    for row in rows:
-        if row[1][:7] == year_month:
-            rows_list.append(row)
 
-    return rows_list
+@cached
+def get_descendants(category_id):
+    """This function gets a category and all of its subcategories.
 
+    :param category_id: primary key in categories table
+    :return: primary keys of category and subcategories
+    :rtype: set of int
+    """
+    rows = fetch_all_with_args(SELECT_DESCENDANTS, (category_id,))
+    return {row[0] for row in rows}
 
-def get_joined_rows(table):
-    """This function gets all rows from a joined table.
 
-    :param table: table name
-    :return: all rows from joined table
+@cached
+def get_ancestors(category_id):
+    """This function gets a category and all the categories it is a
+    subcategory of.
+
+    :param category_id: primary key in categories table
+    :return: primary keys of category and parent categories
+    :rtype: list of int
+    """
+    rows = fetch_all_with_args(SELECT_ANCESTORS, (category_id,))
+    return [row[0] for row in rows]
+
+
+def get_rules():
+    """This function gets all rules for categorising expenses in the
+    order they were added.
+
+    :return: (id, kind, pattern, category id, min amount, max amount)
+    :rtype: list of tuples
+    """
+    return fetch_all(SELECT_RULES)
+
+
+def get_merchant_counts():
+    """This function counts how many times each description of a past
+    expense has been used with each category.
+
+    :return: (description, category id, count)
+    :rtype: list of tuples
+    """
+    return fetch_all(SELECT_MERCHANTS)
+
+
+def insert_expenses(expense_list):
+    """This function enters a list of expenses into the expenses table
+    in one transaction.
+
+    :param expense_list: list of (date, description, amount, category id)
+    :return: None
+    """
+    if expense_list:
+        insert_many((INSERT_EXPENSE, expense_list))
+
+
+@cached
+def get_accounts():
+    """This function gets every account with its balance.
+
+    :return: rows from accounts table
+    :rtype: list of tuples
+    """
+    return fetch_all(SELECT_ACCOUNTS)
+
+
+def get_balance(account_id):
+    """This function gets the balance of an account.
+
+    :param account_id: primary key in accounts table
+    :return: balance or None if there is no such account
+    :rtype: float or None
+    """
+    row = fetch_one_with_args(SELECT_BALANCE, (account_id,))
+
+    if row:
+        return row[0]
+
+    return None
+
+
+def get_account_history(account_id, limit):
+    """This function gets the latest expenses, income and transfers of
+    an account with the balance after each of them.
+
+    :param account_id: primary key in accounts table
+    :param limit: number of rows to return
+    :return: (date, description, amount, balance), newest first
+    :rtype: list of tuples
+    """
+    args = (account_id, limit) * 4 + (account_id, limit)
+    return fetch_all_with_args(SELECT_ACCOUNT_HISTORY, args)
+
+
+def get_recurring():
+    """This function gets every recurring expense and income.
+
+    :return: rows from recurring table, next due first
+    :rtype: list of tuples
+    """
+    return fetch_all(SELECT_RECURRING)
+
+
+def get_due_recurring(last_day):
+    """This function gets the recurring expenses and income with an
+    occurrence due on or before a date.
+
+    :param last_day: date as YYYY-MM-DD
+    :return: rows from recurring table
+    :rtype: list of tuples
+    """
+    return fetch_all_with_args(SELECT_DUE_RECURRING, (last_day,))
+
+
+def get_rows_without_fingerprint(table):
+    """This function gets the rows of the expenses or income table
+    which have not been given a fingerprint.
+
+    :param table: 'expenses' or 'income'
+    :return: (id, date, description, amount, category or source id)
     :rtype: list of tuples
     """
     table_dict = {
-        "expenses": SELECT_EXPENSES,
-        "income": SELECT_INCOME,
-        "categories": SELECT_CATEGORIES,
+        "expenses": SELECT_EXPS_NO_FINGERPRINT,
+        "income": SELECT_INC_NO_FINGERPRINT,
     }
+    return fetch_all(table_dict[table])
+
+
+def set_fingerprints(table, fingerprints):
+    """This function saves the fingerprints of rows in one transaction.
+
+    :param table: 'expenses' or 'income'
+    :param fingerprints: list of (fingerprint, id)
+    :return: None
+    """
+    with get_cursor(True) as cursor:
+        cursor.executemany(UPDATE_FINGERPRINT.format(table), fingerprints)
+
+
+def count_fingerprints(table, fingerprints):
+    """This function counts the rows in a table with each of a list of
+    fingerprints.
+
+    :param table: 'expenses' or 'income'
+    :param fingerprints: list of fingerprints
+    :return: number of rows with fingerprint as keys
+    :rtype: dict
+    """
+    fingerprints = list(set(fingerprints))
+    counts = {}
+
+    for i in range(0, len(fingerprints), MAX_ARGS):
+        chunk = fingerprints[i:i + MAX_ARGS]
+        places = ",".join("?" * len(chunk))
+        command = COUNT_FINGERPRINTS.format(table, places)
+        counts.update(fetch_all_with_args(command, chunk))
+
+    return counts
+
+
+def get_duplicates(table):
+    """This function gets every fingerprint shared by more than one row
+    of a table.
+
+    :param table: 'expenses' or 'income'
+    :return: (fingerprint, number of rows)
+    :rtype: list of tuples
+    """
+    return fetch_all(SELECT_DUPLICATES.format(table))
+
+
+def get_rows_by_fingerprint(table, fingerprint):
+    """This function gets all rows of a table with a fingerprint.
+
+    :param table: 'expenses' or 'income'
+    :param fingerprint: row fingerprint
+    :return: rows from table
+    :rtype: list of tuples
+    """
+    return fetch_all_with_args(
+        SELECT_BY_FINGERPRINT.format(table), (fingerprint,)
+    )
 
-    rows_list = fetch_all(table_dict[table])
 
-    return rows_list
+def delete_duplicates(table):
+    """This function deletes every row of a table which has the same
+    fingerprint as an earlier row.
+
+    :param table: 'expenses' or 'income'
+    :return: None
+    """
+    insert_data(DELETE_DUPLICATES.format(table), ())
 
 
+@cached
+def get_joined_rows(table):
+    """This function gets all rows from a joined table.
+
+    :param table: table name
+    :return: all rows from joined table
+    :rtype: list of tuples
+    """
+    if table == "categories":
+        return fetch_all(SELECT_CATEGORIES)
+
+    return Query(table).order_by("id", descending=True).fetch()
+
+
+class Query:
+    """This class represents a query of the expenses or income table,
+    joined with categories or sources, built up from filters so that
+    only the rows which are needed are read from the database.
+
+    Attributes
+    ----------
+    table : str
+        'expenses' or 'income'
+    conditions : list of str
+        SQL conditions which every row must meet
+    args : list
+        arguments for conditions
+    order : list of str
+        SQL columns to sort rows by
+    row_limit : int or None
+        most rows to return
+    offset : int
+        number of rows to skip
+
+    Methods
+    ----------
+    between:
+        keeps rows between two dates
+    in_categories:
+        keeps rows in a set of categories or sources
+    amount_between:
+        keeps rows with an amount between two amounts
+    matching:
+        keeps rows whose description contains some text
+    order_by:
+        sets the order of rows
+    limit:
+        sets the most rows to return
+    get_sql:
+        returns SQLite command and arguments
+    fetch:
+        returns all rows
+    stream:
+        yields rows in batches from the database
+    """
+
+    def __init__(self, table):
+        """Constructs a query of all rows of a table, newest first."""
+        self.table = table
+        self.conditions = []
+        self.args = []
+        self.order = [f"{table}.date DESC", f"{table}.id DESC"]
+        self.row_limit = None
+        self.offset = 0
+
+    def between(self, first_day=None, last_day=None):
+        """This method keeps rows dated between two dates.
+
+        :param self: Query object
+        :param first_day: first date in range or None for no start
+        :param last_day: last date in range or None for no end
+        :return: Query object
+        :rtype: obj
+        """
+        if first_day is not None:
+            self.conditions.append(f"{self.table}.date >= ?")
+            self.args.append(str(first_day))
+        if last_day is not None:
+            self.conditions.append(f"{self.table}.date <= ?")
+            self.args.append(str(last_day))
+
+        return self
+
+    def in_categories(self, category_ids):
+        """This method keeps rows in a set of expense categories or
+        income sources.
+
+        :param self: Query object
+        :param category_ids: category or source ids
+        :return: Query object
+        :rtype: obj
+        """
+        category_ids = [int(category_id) for category_id in category_ids]
+        column = QUERY_COLUMNS[self.table]["category"]
+        places = ",".join("?" * len(category_ids))
+
+        self.conditions.append(f"{column} IN ({places})")
+        self.args += category_ids
+
+        return self
+
+    def amount_between(self, min_amount=None, max_amount=None):
+        """This method keeps rows with an amount between two amounts.
+
+        :param self: Query object
+        :param min_amount: least amount or None for no minimum
+        :param max_amount: greatest amount or None for no maximum
+        :return: Query object
+        :rtype: obj
+        """
+        if min_amount is not None:
+            self.conditions.append(f"{self.table}.amount >= ?")
+            self.args.append(float(min_amount))
+        if max_amount is not None:
+            self.conditions.append(f"{self.table}.amount <= ?")
+            self.args.append(float(max_amount))
+
+        return self
+
+    def matching(self, text):
+        """This method keeps rows whose description contains some text,
+        ignoring case. The description of income is its source.
+
+        :param self: Query object
+        :param text: text to find
+        :return: Query object
+        :rtype: obj
+        """
+        column = QUERY_COLUMNS[self.table]["description"]
+        self.conditions.append(f"{column} LIKE ?")
+        self.args.append(f"%{text}%")
+
+        return self
+
+    def order_by(self, column, descending=False):
+        """This method sets the order of rows, with rows of equal value
+        in the order they were entered.
+
+        :param self: Query object
+        :param column: 'date', 'amount' or 'id'
+        :param descending: True for largest first (default = False)
+        :return: Query object
+        :rtype: obj
+        """
+        if column not in ORDER_COLUMNS:
+            raise ValueError(f"Cannot order by {column}")
+
+        direction = " DESC" if descending else ""
+        self.order = [
+            f"{self.table}.{column}{direction}",
+            f"{self.table}.id{direction}",
+        ]
+
+        return self
+
+    def limit(self, row_limit, offset=0):
+        """This method sets the most rows to return.
+
+        :param self: Query object
+        :param row_limit: most rows to return
+        :param offset: number of rows to skip (default = 0)
+        :return: Query object
+        :rtype: obj
+        """
+        self.row_limit = row_limit
+        self.offset = offset
+
+        return self
+
+    def get_sql(self):
+        """This method gets the SQLite command and arguments for the
+        query.
+
+        :param self: Query object
+        :return: SQLite command and arguments
+        :rtype: str, list
+        """
+        string = SELECT_JOINED[self.table]
+        args = list(self.args)
+
+        if self.conditions:
+            string += " WHERE " + " AND ".join(self.conditions)
+        string += " ORDER BY " + ", ".join(self.order)
+        if self.row_limit is not None:
+            string += " LIMIT ? OFFSET ?"
+            args += [self.row_limit, self.offset]
+
+        return string, args
+
+    def fetch(self):
+        """This method gets every row of the query.
+
+        :param self: Query object
+        :return: joined rows
+        :rtype: list of tuples
+        """
+        return fetch_all_with_args(*self.get_sql())
+
+    def stream(self):
+        """This method gets the rows of the query a batch at a time.
+
+        :param self: Query object
+        :return: joined rows
+        :rtype: generator of tuples
+        """
+        return stream_rows(*self.get_sql())
+
+
+@cached
 def get_category_from_id(id_, table):
     """This function gets the description of an expenses category or
     income source from its id number
@@ -287,6 +1667,7 @@ def get_category_from_id(id_, table):
     return category[0]
 
 
+@cached
 def get_category_from_budget(budget_id):
     """This function gets the category description, for a budget set by
     category, from its budget id number
@@ -326,6 +1707,7 @@ def enter_budget(category_id, amount, term):
     :param term: "weekly", "monthly", or "annual"
     :return: None
     """
+    today = datetime.date.today().strftime("%Y-%m-%d")
     cat_rows = get_row_list("categories")
 
     for row in cat_rows:
@@ -336,6 +1718,44 @@ def enter_budget(category_id, amount, term):
     budget_id = fetch_one(MAX_BUDGET_ID)
     insert_data(UPDATE_CAT_BUDGET, (*budget_id, category_id))
 
+    # Keep the replaced budget in history
+    insert_data(END_BUDGET_HISTORY, (today, category_id))
+    insert_data(INSERT_BUDGET_HISTORY, (category_id, amount, term, today))
+
+
+def get_budget_as_of(category_id, date):
+    """This function gets the budget which was set for a category on a
+    given date.
+
+    :param category_id: primary key in categories table
+    :param date: date as YYYY-MM-DD
+    :return: (amount, term) or None
+    :rtype: tuple or None
+    """
+    row = fetch_one_with_args(SELECT_BUDGET_AS_OF, (category_id, date))
+
+    if row and (row[2] is None or row[2] > date):
+        return float(row[0]), row[1]
+
+    return None
+
+
+def get_goal_as_of(goal, term, date):
+    """This function gets a goal amount which was set on a given date.
+
+    :param goal: 'budget', 'net income' or 'gross income'
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param date: date as YYYY-MM-DD
+    :return: goal amount or None
+    :rtype: float or None
+    """
+    row = fetch_one_with_args(SELECT_GOAL_AS_OF, (goal, term, date))
+
+    if row and (row[1] is None or row[1] > date):
+        return float(row[0])
+
+    return None
+
 
 def get_expenses_date_amount(category_id):
     """This function gets the date and amount of expenses from a chosen
@@ -345,11 +1765,12 @@ def get_expenses_date_amount(category_id):
     :return: date and amount of expenses
     :rtype: list of tuples
     """
-    date_amount = fetch_one_with_args(SELECT_DATE_AMOUNT, (category_id,))
+    date_amount = fetch_all_with_args(SELECT_DATE_AMOUNT, (category_id,))
 
     return date_amount
 
 
+@cached
 def get_expenses_by_date(days_list):
     """This function gets expenses for each day in a list.
 
@@ -367,6 +1788,7 @@ def get_expenses_by_date(days_list):
     return expenses_list
 
 
+@cached
 def get_income_by_date(days_list):
     """This function gets income for each day in a list
 
@@ -385,6 +1807,276 @@ def get_income_by_date(days_list):
     return income_list
 
 
+@cached
+def get_amounts_between(table, first_day, last_day):
+    """This function gets the date and amount of every row in the
+    expenses or income table between two dates in a single query.
+
+    :param table: 'expenses' or 'income'
+    :param first_day: first date in range
+    :param last_day: last date in range
+    :return: date and amount of each row
+    :rtype: list of tuples
+    """
+    table_dict = {
+        "expenses": SELECT_EXPS_BETWEEN,
+        "income": SELECT_INC_BETWEEN,
+    }
+
+    rows = fetch_all_with_args(table_dict[table], (first_day, last_day))
+    return rows
+
+
+def stream_rows_to_reconcile(table, first_day, last_day):
+    """This function streams the id, date, description and amount of
+    each row of the expenses or income table between two dates in date
+    order. The description of income is its source.
+
+    :param table: 'expenses' or 'income'
+    :param first_day: first date in range
+    :param last_day: last date in range
+    :return: (id, date, description, amount) for each row
+    :rtype: generator of tuples
+    """
+    table_dict = {
+        "expenses": SELECT_EXPS_TO_RECONCILE,
+        "income": SELECT_INC_TO_RECONCILE,
+    }
+    return stream_rows(table_dict[table], (first_day, last_day))
+
+
+def stream_rows_after(table, last_id):
+    """This function streams every row of the expenses or income table
+    entered after a row. A split expense has a row for its share in
+    each category.
+
+    :param table: 'expenses' or 'income'
+    :param last_id: id of last row already read
+    :return: (id, date, description, amount, category id, account id)
+        for expenses, (id, date, source id, amount, account id) for
+        income
+    :rtype: generator of tuples
+    """
+    return stream_rows(SELECT_SNAPSHOT[table], (last_id,))
+
+
+def count_rows_up_to(table, last_id):
+    """This function counts the rows of the expenses or income table up
+    to a row, counting each share of a split expense.
+
+    :param table: 'expenses' or 'income'
+    :param last_id: id of last row to count
+    :return: number of rows
+    :rtype: int
+    """
+    return fetch_one_with_args(COUNT_SNAPSHOT[table], (last_id,))[0]
+
+
+def get_deletions():
+    """This function gets the number of rows ever deleted from the
+    expenses and expense_splits tables, which is kept by triggers.
+
+    :return: number of rows deleted
+    :rtype: int
+    """
+    return fetch_one(SELECT_DELETIONS)[0]
+
+
+def get_expenses_to_add(scan):
+    """This function gets the expense lines which a summary kept up to
+    date one expense at a time has still to add. If an expense has been
+    deleted since the summary was saved it can't be taken out, so every
+    expense line is returned for the summary to be worked out again.
+
+    :param scan: (last expense id, deletions) saved with the summary,
+        or None if it has never been saved
+    :return: (id, date, description, amount, category id, account id)
+        for each expense line to add, oldest first, the scan to save
+        once they are added, and True if the summary must be worked
+        out again
+    :rtype: list of tuples, tuple, bool
+    """
+    last_id, deleted = scan or (0, None)
+    deletions = get_deletions()
+    rebuilt = scan is not None and deleted != deletions
+    if rebuilt:
+        last_id = 0
+
+    rows = sorted(stream_rows_after("expenses", last_id))
+    if rows:
+        last_id = rows[-1][0]
+
+    return rows, (last_id, deletions), rebuilt
+
+
+def get_anomaly_stats():
+    """This function gets the statistics of each expense category used
+    to find unusual expenses, and how far through the expenses they
+    have been kept up to date.
+
+    :return: (last expense id, deletions) or None if no expenses have
+        been added yet, and (category id, count, mean, m2, quantiles as
+        JSON) for each category
+    :rtype: tuple or None, list of tuples
+    """
+    scan = fetch_one(SELECT_ANOMALY_SCAN)
+    return scan, fetch_all(SELECT_ANOMALY_STATS)
+
+
+def save_anomaly_stats(scan, stats, anomalies, rebuilt=False):
+    """This function saves the statistics of expense categories and the
+    unusual expenses found since they were last saved, in one
+    transaction.
+
+    :param scan: (last expense id added to the statistics, deletions)
+    :param stats: (category id, count, mean, m2, quantiles as JSON) for
+        each category which has changed
+    :param anomalies: (expense id, category id, amount, usual amount)
+        for each unusual expense, or share of a split expense, found
+    :param rebuilt: True if the statistics were worked out again from
+        the first expense, replacing all saved (default = False)
+    :return: None
+    """
+    with get_cursor(True) as cursor:
+        if rebuilt:
+            cursor.execute(CLEAR_ANOMALY_STATS)
+            cursor.execute(CLEAR_ANOMALIES)
+        cursor.executemany(SAVE_ANOMALY_STATS, stats)
+        cursor.executemany(INSERT_ANOMALY, anomalies)
+        cursor.execute(SAVE_ANOMALY_SCAN, scan)
+
+    record_write(SAVE_ANOMALY_SCAN, scan, None)
+
+
+def get_anomalies(limit):
+    """This function gets the most recent unusual expenses.
+
+    :param limit: number of rows to return
+    :return: (date, description, amount, category, usual amount) for
+        each unusual expense, newest first
+    :rtype: list of tuples
+    """
+    return fetch_all_with_args(SELECT_ANOMALIES, (limit,))
+
+
+def get_sketch_scan():
+    """This function gets how far through the expenses the spending
+    sketches have been kept up to date.
+
+    :return: (last expense id, deletions) or None if no expenses have
+        been added yet
+    :rtype: tuple or None
+    """
+    return fetch_one(SELECT_SKETCH_SCAN)
+
+
+@cached
+def get_sketches(first_month, last_month):
+    """This function gets the spending sketch of each category in each
+    month between two months.
+
+    :param first_month: first month as YYYY-MM
+    :param last_month: last month as YYYY-MM
+    :return: (month, category id, sketch as JSON) for each category and
+        month with spending
+    :rtype: list of tuples
+    """
+    return fetch_all_with_args(SELECT_SKETCHES, (first_month, last_month))
+
+
+def save_sketches(scan, sketches, rebuilt=False):
+    """This function saves the spending sketches which have changed, in
+    one transaction.
+
+    :param scan: (last expense id added to the sketches, deletions)
+    :param sketches: (month, category id, sketch as JSON) for each
+        sketch which has changed
+    :param rebuilt: True if the sketches were worked out again from the
+        first expense, replacing all saved (default = False)
+    :return: None
+    """
+    with get_cursor(True) as cursor:
+        if rebuilt:
+            cursor.execute(CLEAR_SKETCHES)
+        cursor.executemany(SAVE_SKETCH, sketches)
+        cursor.execute(SAVE_SKETCH_SCAN, scan)
+
+    record_write(SAVE_SKETCH_SCAN, scan, None)
+
+
+@cached
+def get_category_totals(first_day, last_day):
+    """This function gets the total spent in each expense category
+    between two dates.
+
+    :param first_day: first date in range
+    :param last_day: last date in range
+    :return: total spent with category id as keys
+    :rtype: dict
+    """
+    rows = fetch_all_with_args(SELECT_CAT_TOTALS, (first_day, last_day))
+
+    totals = {}
+    for category_id, total in rows:
+        totals[category_id] = round(total, 2)
+
+    return totals
+
+
+@cached
+def get_rollup_totals(first_day, last_day):
+    """This function gets the total spent between two dates in each
+    category including all of its subcategories.
+
+    :param first_day: first date in range
+    :param last_day: last date in range
+    :return: total spent with category id as keys
+    :rtype: dict
+    """
+    rows = fetch_all_with_args(SELECT_ROLLUP_TOTALS, (first_day, last_day))
+
+    totals = {}
+    for category_id, total in rows:
+        totals[category_id] = round(total, 2)
+
+    return totals
+
+
+@cached
+def get_pivot_totals(term, first_day, last_day, table="expenses"):
+    """This function gets the total spent in each category, or earned
+    from each source, in each week, month or year between two dates.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param first_day: first date in range
+    :param last_day: last date in range
+    :param table: 'expenses' or 'income' (default = 'expenses')
+    :return: (category or source id, period, total) where period is
+        the Monday of the week as YYYY-MM-DD, the month as YYYY-MM or
+        the year as YYYY
+    :rtype: list of tuples
+    """
+    string = SELECT_PIVOT[table].format(PIVOT_PERIODS[term])
+    return fetch_all_with_args(string, (first_day, last_day))
+
+
+@cached
+def get_total_spending(first_day, last_day):
+    """This function gets the total spent between two dates.
+
+    :param first_day: first date in range
+    :param last_day: last date in range
+    :return: total spent
+    :rtype: float
+    """
+    total = fetch_one_with_args(SELECT_EXPS_TOTAL, (first_day, last_day))
+
+    if total[0]:
+        return round(total[0], 2)
+
+    return 0
+
+
 def enter_goal(goal, amount, term):
     """This function enters a new goal into the goals table
 
@@ -393,6 +2085,8 @@ def enter_goal(goal, amount, term):
     :param term: 'weekly', 'monthly' or 'annual'
     :return: None
     """
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
     if goal in ("net income", "gross income"):
         goals_list = get_row_list("goals")
         for row in goals_list:
@@ -407,7 +2101,15 @@ def enter_goal(goal, amount, term):
 
     insert_data(INSERT_GOAL, (goal, amount, term))
 
+    # Keep the replaced goal in history
+    if goal == "budget":
+        insert_data(END_GOAL_TERM_HISTORY, (today, goal, term))
+    else:
+        insert_data(END_GOAL_HISTORY, (today, goal))
+    insert_data(INSERT_GOAL_HISTORY, (goal, amount, term, today))
+
 
+@cached
 def get_goal(goal, term):
     """This function gets a goal amount from the goals table from its
     description and term
@@ -0,0 +1,140 @@
+"""This module finds expenses and income which have been entered more
+than once, for example by importing overlapping bank statements. Each
+row is given a fingerprint made from its date, description, amount and
+category or source, which is saved in the indexed fingerprint column
+of its table so duplicates can be found without comparing rows.
+"""
+
+import hashlib
+from database import database_commands as dc
+from functions.categoriser import normalise
+
+INSERT_COMMAND = {
+    "expenses": dc.INSERT_EXPENSE_FINGERPRINT,
+    "income": dc.INSERT_INCOME_FINGERPRINT,
+}
+
+
+def fingerprint(date, description, amount, category_id):
+    """This function gets the fingerprint of an expense or income.
+
+    :param date: date as YYYY-MM-DD
+    :param description: expense description or '' for income
+    :param amount: amount of money
+    :param category_id: category id for expenses or source id for income
+    :return: fingerprint
+    :rtype: str
+    """
+    pence = round(float(amount) * 100)
+    key = f"{str(date)[:10]}|{normalise(description)}|{pence}|{category_id}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def fill_fingerprints(table):
+    """This function saves a fingerprint for every row in a table which
+    was entered without one.
+
+    :param table: 'expenses' or 'income'
+    :return: None
+    """
+    rows = dc.get_rows_without_fingerprint(table)
+    fingerprints = []
+
+    for row in rows:
+        fingerprints.append((fingerprint(*row[1:]), row[0]))
+
+    if fingerprints:
+        dc.set_fingerprints(table, fingerprints)
+
+
+def get_row_fingerprint(table, row):
+    """This function gets the fingerprint of a row to be inserted.
+
+    :param table: 'expenses' or 'income'
+    :param row: (date, description, amount, category id) for expenses
+        or (date, source id, amount) for income
+    :return: fingerprint
+    :rtype: str
+    """
+    if table == "expenses":
+        return fingerprint(*row)
+
+    date, source_id, amount = row
+    return fingerprint(date, "", amount, source_id)
+
+
+def filter_new_rows(table, rows):
+    """This function separates rows to be inserted into those which are
+    not yet in the table and those which are. A row which appears more
+    than once is only new as many times as it is missing from the
+    table.
+
+    :param table: 'expenses' or 'income'
+    :param rows: (date, description, amount, category id) for expenses
+        or (date, source id, amount) for income
+    :return: new rows with their fingerprint added, and rows skipped as
+        duplicates
+    :rtype: list of tuples, list of tuples
+    """
+    fill_fingerprints(table)
+
+    fingerprints = [get_row_fingerprint(table, row) for row in rows]
+    counts = dc.count_fingerprints(table, fingerprints)
+    new_rows = []
+    duplicates = []
+
+    for row, row_fingerprint in zip(rows, fingerprints):
+        if counts.get(row_fingerprint, 0) > 0:
+            counts[row_fingerprint] -= 1
+            duplicates.append(row)
+        else:
+            new_rows.append((*row, row_fingerprint))
+
+    return new_rows, duplicates
+
+
+def insert_new_rows(table, rows):
+    """This function inserts rows into the expenses or income table in
+    one transaction, skipping any which are already in the table.
+
+    :param table: 'expenses' or 'income'
+    :param rows: (date, description, amount, category id) for expenses
+        or (date, source id, amount) for income
+    :return: rows inserted and rows skipped as duplicates
+    :rtype: list of tuples, list of tuples
+    """
+    new_rows, duplicates = filter_new_rows(table, rows)
+
+    if new_rows:
+        dc.insert_many((INSERT_COMMAND[table], new_rows))
+
+    return [row[:-1] for row in new_rows], duplicates
+
+
+def find_duplicates(table):
+    """This function gets the rows of a table which repeat an earlier
+    row.
+
+    :param table: 'expenses' or 'income'
+    :return: (first row, number of copies) for each repeated row
+    :rtype: list of tuples
+    """
+    fill_fingerprints(table)
+    duplicates = []
+
+    for row_fingerprint, count in dc.get_duplicates(table):
+        rows = dc.get_rows_by_fingerprint(table, row_fingerprint)
+        duplicates.append((rows[0], count - 1))
+
+    return duplicates
+
+
+def remove_duplicates(table):
+    """This function deletes every row of a table which repeats an
+    earlier row, keeping the first.
+
+    :param table: 'expenses' or 'income'
+    :return: None
+    """
+    fill_fingerprints(table)
+    dc.delete_duplicates(table)
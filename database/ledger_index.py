@@ -0,0 +1,443 @@
+"""This module contains an optional in-memory index of the expenses and
+income tables. It is loaded once when the programme starts and is
+updated incrementally when a new expense or income is inserted, so
+views can find rows and totals in a date range without reading the
+database again. Any other change to the tables marks the index as out
+of date and it is reloaded the next time it is used.
+
+Writes can be committed on the batch writer's thread, so the index is
+only read or changed while holding a lock.
+"""
+
+import bisect
+import datetime
+import threading
+from database import database_commands as dc
+
+# Tables whose changes affect the rows held in the index
+WATCHED_TABLES = (
+    "expenses",
+    "expense_splits",
+    "income",
+    "categories",
+    "sources",
+    "budget",
+)
+# Position of the category or source id in a joined row
+CATEGORY_COLUMN = {"expenses": 4, "income": 2}
+# Position of the category or source id in the arguments of an insert
+CATEGORY_ARG = {"expenses": 3, "income": 1}
+# Arguments of an insert which are the first columns of a row, before
+# the fingerprint and account id
+ROW_ARGS = {"expenses": 4, "income": 3}
+CATEGORY_TABLE = {"expenses": "categories", "income": "sources"}
+INSERT_COMMANDS = {
+    "expenses": (dc.INSERT_EXPENSE, dc.INSERT_EXPENSE_ACCOUNT),
+    "income": (dc.INSERT_INCOME, dc.INSERT_INCOME_ACCOUNT),
+}
+
+_index = {"enabled": False, "stale": True, "tables": {}}
+# Held while the index is read or changed. Loading the index reads it
+# again, so the same thread can take the lock more than once
+_lock = threading.RLock()
+
+
+class TableIndex:
+    """This class represents the index of one table.
+
+    Attributes
+    ----------
+    table : str
+        'expenses' or 'income'
+    dates : list of str
+        date of each row in date order
+    rows : list of tuples
+        joined rows in the same order as dates
+    totals : DailyTotals
+        total amount of rows on each day
+    postings : dict
+        DailyTotals of the rows in each category with category id as
+        keys
+    categories : dict
+        rows from categories or sources table with id as keys
+
+    Methods
+    ----------
+    add_row:
+        adds a joined row to the index
+    add_inserted:
+        adds a newly inserted row to the index from its arguments
+    rows_between:
+        returns rows between two dates
+    total_between:
+        returns total amount between two dates
+    """
+
+    def __init__(self, table):
+        """Constructs the index for a table from the database."""
+        self.table = table
+        self.dates = []
+        self.rows = []
+        self.totals = DailyTotals()
+        self.postings = {}
+        self.categories = {}
+
+        for row in dc.get_row_list(CATEGORY_TABLE[table]):
+            self.categories[row[0]] = row
+
+        rows = dc.get_joined_rows(table)
+        rows.sort(key=lambda row: (str(row[1])[:10], row[0]))
+
+        for row in rows:
+            self.add_row(row)
+
+    def add_row(self, row):
+        """This method adds a joined row to the index keeping rows in
+        date order.
+
+        :param self: TableIndex object
+        :param row: joined row from table
+        :return: None
+        """
+        date = str(row[1])[:10]
+        amount = float(row[3])
+        position = bisect.bisect_right(self.dates, date)
+
+        self.dates.insert(position, date)
+        self.rows.insert(position, row)
+        self.totals.add(date, amount)
+
+        category_id = row[CATEGORY_COLUMN[self.table]]
+        self.postings.setdefault(category_id, DailyTotals()).add(
+            date, amount
+        )
+
+    def add_inserted(self, args, row_id):
+        """This method adds a row which has just been inserted with one
+        of INSERT_COMMANDS to the index.
+
+        :param self: TableIndex object
+        :param args: arguments the row was inserted with
+        :param row_id: primary key of the new row
+        :return: None
+        """
+        values = list(args)
+        values[2] = float(values[2])
+        category_id = values[CATEGORY_ARG[self.table]]
+        if category_id is None:
+            # A split expense is added from its splits when reloaded
+            return
+        category = self.categories.get(int(category_id))
+
+        # The row has the columns of SELECT_JOINED, with no fingerprint
+        # and the default account if the insert didn't give one
+        columns = ROW_ARGS[self.table]
+        account_id = dc.DEFAULT_ACCOUNT
+        if len(values) > columns:
+            account_id = values[columns]
+
+        # The join would have left out a row without a category
+        if category:
+            self.add_row(
+                (row_id, *values[:columns], None, account_id, *category)
+            )
+
+    def rows_between(self, first_day, last_day):
+        """This method gets rows between two dates, newest first.
+
+        :param self: TableIndex object
+        :param first_day: first date in range as YYYY-MM-DD or YYYY-MM
+        :param last_day: date after the range as YYYY-MM-DD or YYYY-MM
+        :return: joined rows in range
+        :rtype: list of tuples
+        """
+        start = bisect.bisect_left(self.dates, first_day)
+        end = bisect.bisect_left(self.dates, last_day)
+        return self.rows[start:end][::-1]
+
+    def total_between(self, first_day, last_day, category_id=None):
+        """This method gets the total amount between two dates for all
+        rows or for one category.
+
+        :param self: TableIndex object
+        :param first_day: first date in range as YYYY-MM-DD
+        :param last_day: last date in range as YYYY-MM-DD
+        :param category_id: category or source id (default = None)
+        :return: total amount
+        :rtype: float
+        """
+        totals = self.totals
+
+        if category_id is not None:
+            if category_id not in self.postings:
+                return 0
+            totals = self.postings[category_id]
+
+        return totals.total_between(first_day, last_day)
+
+
+class DailyTotals:
+    """This class represents the total amount on each day in a Fenwick
+    tree, so that adding an amount on any date, and getting the total
+    between two dates, take O(log n) time. The days held grow to twice
+    their number when an amount falls outside them.
+
+    Attributes
+    ----------
+    first : int
+        ordinal of the first day held, or None before any amount
+    days : list of floats
+        total amount on each day held
+    tree : list of floats
+        Fenwick tree of days, tree[i] is the total of the days ending
+        with days[i - 1], as many as the lowest set bit of i
+
+    Methods
+    ----------
+    add:
+        adds an amount on a date
+    total_to:
+        returns total amount up to and including a day
+    total_between:
+        returns total amount between two dates
+    resize:
+        holds a different range of days
+    """
+
+    def __init__(self):
+        """Constructs totals with no days."""
+        self.first = None
+        self.days = []
+        self.tree = [0]
+
+    def add(self, date, amount):
+        """This method adds an amount on a date.
+
+        :param self: DailyTotals object
+        :param date: date as YYYY-MM-DD
+        :param amount: amount to add
+        :return: None
+        """
+        day = get_day(date)
+        size = len(self.days)
+
+        if self.first is None:
+            self.resize(day, 1)
+        elif day < self.first:
+            first = min(day, self.first - size)
+            self.resize(first, self.first + size - first)
+        elif day >= self.first + size:
+            self.resize(self.first, max(day - self.first + 1, 2 * size))
+
+        position = day - self.first
+        self.days[position] += amount
+        i = position + 1
+        while i < len(self.tree):
+            self.tree[i] += amount
+            i += i & -i
+
+    def total_to(self, day):
+        """This method gets the total amount up to and including a day.
+
+        :param self: DailyTotals object
+        :param day: ordinal of day
+        :return: total amount
+        :rtype: float
+        """
+        if self.first is None:
+            return 0
+
+        i = min(day - self.first + 1, len(self.days))
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+
+        return total
+
+    def total_between(self, first_day, last_day):
+        """This method gets the total amount between two dates.
+
+        :param self: DailyTotals object
+        :param first_day: first date in range as YYYY-MM-DD
+        :param last_day: last date in range as YYYY-MM-DD
+        :return: total amount
+        :rtype: float
+        """
+        total = self.total_to(get_day(last_day)) - self.total_to(
+            get_day(first_day) - 1
+        )
+        return round(total, 2)
+
+    def resize(self, first, size):
+        """This method holds a range of days which includes every day
+        already held, and builds the tree again in O(size) time.
+
+        :param self: DailyTotals object
+        :param first: ordinal of first day
+        :param size: number of days
+        :return: None
+        """
+        days = [0] * size
+        if self.first is not None:
+            start = self.first - first
+            days[start : start + len(self.days)] = self.days
+
+        tree = [0] + days
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+
+        self.first, self.days, self.tree = first, days, tree
+
+
+def get_day(date):
+    """This function gets the ordinal of a date, including dates stored
+    without leading zeros such as 2024-1-5.
+
+    :param date: date as YYYY-MM-DD
+    :return: ordinal of date
+    :rtype: int
+    """
+    year, month, day = str(date).split()[0].split("-")
+    return datetime.date(int(year), int(month), int(day)).toordinal()
+
+
+def load_index():
+    """This function enables the index and loads the expenses and
+    income tables into it.
+
+    :return: None
+    """
+    with _lock:
+        _index["tables"] = {
+            "expenses": TableIndex("expenses"),
+            "income": TableIndex("income"),
+        }
+        _index["stale"] = False
+
+        if not _index["enabled"]:
+            dc.add_write_listener(on_write)
+            _index["enabled"] = True
+
+
+def is_enabled():
+    """This function checks whether the index has been loaded.
+
+    :return: True if enabled or False if not
+    :rtype: bool
+    """
+    return _index["enabled"]
+
+
+def get_table(table):
+    """This function gets the index of a table, reloading the index
+    first if the database has changed in a way it could not follow.
+
+    :param table: 'expenses' or 'income'
+    :return: index of table
+    :rtype: obj
+    """
+    with _lock:
+        if _index["stale"]:
+            load_index()
+
+        return _index["tables"][table]
+
+
+def on_write(string, args, row_id):
+    """This function updates the index after a write to the database.
+
+    :param string: SQLite command that was committed
+    :param args: arguments for command
+    :param row_id: id of the inserted row or None
+    :return: None
+    """
+    with _lock:
+        if _index["stale"]:
+            return
+
+        for table, commands in INSERT_COMMANDS.items():
+            if string in commands and row_id is not None:
+                try:
+                    _index["tables"][table].add_inserted(args, row_id)
+                except (TypeError, ValueError):
+                    # A row the index can't follow is read on reloading
+                    _index["stale"] = True
+                return
+
+        for table in WATCHED_TABLES:
+            if table in string:
+                _index["stale"] = True
+                return
+
+
+def get_rows_in_months(table, first_month, last_month):
+    """This function gets joined rows from a table between the start of
+    one month and the end of another.
+
+    :param table: 'expenses' or 'income'
+    :param first_month: first month as YYYY-MM
+    :param last_month: last month as YYYY-MM
+    :return: joined rows, newest first
+    :rtype: list of tuples
+    """
+    year, month = last_month.split("-")
+    next_month = datetime.date(int(year), int(month), 1)
+    next_month = (next_month + datetime.timedelta(days=31)).strftime("%Y-%m")
+
+    with _lock:
+        return get_table(table).rows_between(first_month, next_month)
+
+
+def get_all_rows(table):
+    """This function gets all joined rows from a table.
+
+    :param table: 'expenses' or 'income'
+    :return: joined rows, newest first
+    :rtype: list of tuples
+    """
+    with _lock:
+        return get_table(table).rows[::-1]
+
+
+def get_total_between(table, first_day, last_day, category_id=None):
+    """This function gets the total amount in a table between two
+    dates.
+
+    :param table: 'expenses' or 'income'
+    :param first_day: first date as YYYY-MM-DD
+    :param last_day: last date as YYYY-MM-DD
+    :param category_id: category or source id (default = None)
+    :return: total amount
+    :rtype: float
+    """
+    with _lock:
+        return get_table(table).total_between(
+            first_day, last_day, category_id
+        )
+
+
+def get_category_totals(table, first_day, last_day):
+    """This function gets the total amount for each category or source
+    between two dates.
+
+    :param table: 'expenses' or 'income'
+    :param first_day: first date as YYYY-MM-DD
+    :param last_day: last date as YYYY-MM-DD
+    :return: totals with category id as keys
+    :rtype: dict
+    """
+    totals = {}
+
+    with _lock:
+        table_index = get_table(table)
+        for category_id in table_index.postings:
+            total = table_index.total_between(
+                first_day, last_day, category_id
+            )
+            if total:
+                totals[category_id] = total
+
+    return totals
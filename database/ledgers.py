@@ -0,0 +1,272 @@
+"""This module finds the database file of each ledger when the programme
+keeps a separate ledger for each user or household. Ledgers are spread
+across subfolders by a hash of their id, so no folder holds too many
+files, and every ledger uses the same commands in database_commands.py.
+
+Connections are kept open in a pool shared by all ledgers. The pool
+holds at most MAX_OPEN idle connections and closes the least recently
+used one when it is full. Commands can be run over every ledger at once
+from the command line with
+
+    python -m database.ledgers migrate|check [workers]
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+from database import database_commands as dc
+
+# Folder holding a subfolder of ledger files for each hash prefix
+LEDGER_FOLDER = "ledgers"
+# Most idle connections kept open across all ledgers
+MAX_OPEN = 32
+# Ledgers worked on at the same time by run_on_all
+DEFAULT_WORKERS = 8
+LEDGER_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+EXTENSION = ".db"
+
+
+class ConnectionPool:
+    """This class represents a pool of open database connections with
+    the least recently used connection closed when the pool is full. A
+    connection is taken out of the pool while a command uses it, so no
+    two threads ever share one.
+
+    Attributes
+    ----------
+    max_open : int
+        most idle connections kept open
+    idle : OrderedDict
+        lists of idle connections with path as keys, least recently
+        used first
+    count : int
+        number of idle connections
+    lock : Lock
+        held while the pool is changed
+
+    Methods
+    ----------
+    take:
+        returns a connection to a database file
+    give:
+        returns a connection to the pool after use
+    close:
+        closes every idle connection
+    """
+
+    def __init__(self, max_open=MAX_OPEN):
+        """Constructs an empty pool."""
+        self.max_open = max_open
+        self.idle = OrderedDict()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def take(self, path):
+        """This method gets an idle connection to a database file or
+        opens a new one.
+
+        :param self: ConnectionPool object
+        :param path: path to database file
+        :return: connection
+        :rtype: obj
+        """
+        with self.lock:
+            connections = self.idle.get(path)
+            if connections:
+                self.count -= 1
+                db = connections.pop()
+                if not connections:
+                    del self.idle[path]
+                return db
+
+        # Connections move between threads, but only one uses each
+        return sqlite3.connect(path, check_same_thread=False)
+
+    def give(self, path, db):
+        """This method puts a connection back in the pool, closing the
+        least recently used connection if the pool is full.
+
+        :param self: ConnectionPool object
+        :param path: path to database file
+        :param db: connection
+        :return: None
+        """
+        closing = []
+
+        with self.lock:
+            self.idle.setdefault(path, []).append(db)
+            self.idle.move_to_end(path)
+            self.count += 1
+
+            while self.count > self.max_open:
+                oldest, connections = next(iter(self.idle.items()))
+                closing.append(connections.pop(0))
+                self.count -= 1
+                if not connections:
+                    del self.idle[oldest]
+
+        for connection in closing:
+            connection.close()
+
+    def close(self):
+        """This method closes every idle connection.
+
+        :param self: ConnectionPool object
+        :return: None
+        """
+        with self.lock:
+            connections = [db for dbs in self.idle.values() for db in dbs]
+            self.idle.clear()
+            self.count = 0
+
+        for db in connections:
+            db.close()
+
+
+_pool = ConnectionPool()
+# Blocks using a ledger and the pool used before the first of them, so
+# the pool is put back once the last one ends
+_users = {"count": 0, "previous": None}
+_users_lock = threading.Lock()
+
+
+def get_path(ledger_id):
+    """This function gets the database file of a ledger.
+
+    :param ledger_id: id of user or ledger, of letters, numbers, '_'
+        and '-'
+    :return: path to database file
+    :rtype: str
+    """
+    if not LEDGER_ID.fullmatch(str(ledger_id)):
+        raise ValueError(f"Invalid ledger id: {ledger_id!r}")
+
+    prefix = hashlib.sha1(str(ledger_id).encode()).hexdigest()[:2]
+    return os.path.join(LEDGER_FOLDER, prefix, f"{ledger_id}{EXTENSION}")
+
+
+def get_ledger_ids():
+    """This function gets the id of every ledger which has a database
+    file.
+
+    :return: ledger ids
+    :rtype: list of str
+    """
+    paths = glob.glob(os.path.join(LEDGER_FOLDER, "*", "*" + EXTENSION))
+    return sorted(os.path.basename(path)[: -len(EXTENSION)] for path in paths)
+
+
+@contextmanager
+def use_ledger(ledger_id):
+    """This function makes every command in the current thread use the
+    database file of a ledger until the block ends, creating the file
+    if needed. Connections come from the shared pool while any block is
+    running, and the pool used before is put back when they end.
+
+    :param ledger_id: id of user or ledger
+    :return: None
+    """
+    path = get_path(ledger_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with _users_lock:
+        if not _users["count"]:
+            _users["previous"] = dc.get_connection_pool()
+            dc.set_connection_pool(_pool)
+        _users["count"] += 1
+
+    try:
+        with dc.use_database(path):
+            yield
+    finally:
+        with _users_lock:
+            _users["count"] -= 1
+            if not _users["count"]:
+                dc.set_connection_pool(_users["previous"])
+
+
+def open_ledger(ledger_id):
+    """This function makes the programme use the database file of a
+    ledger from now on.
+
+    :param ledger_id: id of user or ledger
+    :return: None
+    """
+    path = get_path(ledger_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dc.set_connection_pool(_pool)
+    dc.DATABASE = path
+
+
+def run_on_all(function, workers=DEFAULT_WORKERS):
+    """This function calls a function for every ledger, with several
+    ledgers worked on at the same time. An error in one ledger doesn't
+    stop the others.
+
+    :param function: function taking no arguments, run while each
+        ledger is in use
+    :param workers: number of ledgers worked on at the same time
+    :return: result, or the error raised, with ledger id as keys
+    :rtype: dict
+    """
+
+    def run(ledger_id):
+        # Any error, even in opening the ledger, is kept as its result
+        try:
+            with use_ledger(ledger_id):
+                return function()
+        except Exception as e:
+            return e
+
+    ledger_ids = get_ledger_ids()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(run, ledger_ids)
+
+    return dict(zip(ledger_ids, results))
+
+
+# Commands which can be run over every ledger from the command line
+COMMANDS = {
+    "migrate": dc.create_tables,
+    "check": dc.check_integrity,
+}
+
+
+def main(args):
+    """This function runs a command over every ledger and prints the
+    result for each.
+
+    :param args: command and optional number of workers
+    :return: number of ledgers where the command failed
+    :rtype: int
+    """
+    if not args or args[0] not in COMMANDS:
+        print("Usage: python -m database.ledgers migrate|check [workers]")
+        return 1
+
+    workers = int(args[1]) if len(args) > 1 else DEFAULT_WORKERS
+    results = run_on_all(COMMANDS[args[0]], workers)
+    failures = 0
+
+    for ledger_id, result in results.items():
+        # Commands return None, or ['ok'] from an integrity check
+        if isinstance(result, Exception) or result not in (None, ["ok"]):
+            failures += 1
+            print(f"FAILED {ledger_id}: {result}")
+        else:
+            print(f"ok     {ledger_id}")
+
+    _pool.close()
+    print(f"\n{len(results)} ledgers, {failures} failed.")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(sys.argv[1:]) else 0)
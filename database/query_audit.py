@@ -0,0 +1,257 @@
+"""This module checks the query plan of every SQL statement in
+database_commands.py, and of typical queries built with Query, against
+a database filled with a realistic number of rows. It reports each
+statement which scans a whole table rather than using an index, and
+each index search which also has to read the table because the index
+doesn't cover the columns used.
+
+Run it from the programme folder with
+
+    python -m database.query_audit [number of expenses]
+
+It exits with status 1 if a statement scans a large table and is not
+listed in ALLOWED_SCANS, so it can be run as a check before changes
+are merged.
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from database import database_commands as dc, dedup
+
+# Expenses in the test database, about 15 years of daily spending
+DEFAULT_ROWS = 100000
+# Tables which grow with use, so a scan of them gets slower over time
+LARGE_TABLES = (
+    "expenses",
+    "expense_splits",
+    "transfers",
+    "income",
+    "budget_history",
+    "goals_history",
+)
+STATEMENT_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+# Arguments for statements which have a table or SQL inserted in them
+FORMAT_ARGS = {
+    "SELECT_ROWS": [("expenses",), ("income",)],
+    "UPDATE_FINGERPRINT": [("expenses",), ("income",)],
+    "COUNT_FINGERPRINTS": [("expenses", "?"), ("income", "?")],
+    "SELECT_DUPLICATES": [("expenses",), ("income",)],
+    "SELECT_BY_FINGERPRINT": [("expenses",), ("income",)],
+    "DELETE_DUPLICATES": [("expenses",), ("income",)],
+    "SEARCH_EXPENSES_FTS": [("", dc.BY_RANK), ("", dc.BY_NEWEST)],
+    "SEARCH_EXPENSES_LIKE": [(dc.SEARCH_LIKE,)],
+    "SELECT_PIVOT": [(period,) for period in dc.PIVOT_PERIODS.values()],
+}
+# Statements which are meant to read every row of a table, with reason
+ALLOWED_SCANS = {
+    "SELECT_ROWS": "lists a whole table",
+    "SELECT_MERCHANTS": "counts every description for categorising",
+    "SEARCH_EXPENSES_LIKE": "LIKE can't use an index, used without FTS5",
+    "SEED_BUDGET_HISTORY": "run once on start-up",
+    "SEED_GOALS_HISTORY": "run once on start-up",
+    "SEED_ACCOUNT": "run once when the first account is made",
+    "Query(expenses)": "lists all history",
+    "Query(income)": "lists all history",
+    "Query(expenses).matching": "LIKE can't use an index",
+}
+
+
+def get_statements():
+    """This function gets every SQL statement in database_commands.py
+    which reads or changes rows, with placeholders filled in.
+
+    :return: (name, statement) for each statement
+    :rtype: list of tuples
+    """
+    statements = []
+
+    for name, value in sorted(vars(dc).items()):
+        if not name.isupper():
+            continue
+
+        values = [(name, value)]
+        if isinstance(value, dict):
+            values = [(f"{name}[{key}]", item) for key, item in value.items()]
+
+        for statement_name, statement in values:
+            if not isinstance(statement, str):
+                continue
+            if not statement.lstrip().upper().startswith(STATEMENT_KINDS):
+                continue
+
+            for args in FORMAT_ARGS.get(name, [()]):
+                statements.append((statement_name, statement.format(*args)))
+
+    return statements + get_query_statements()
+
+
+def get_query_statements():
+    """This function gets the statements built with Query by the menus.
+
+    :return: (name, statement) for each statement
+    :rtype: list of tuples
+    """
+    statements = []
+
+    for table in ("expenses", "income"):
+        queries = {
+            f"Query({table})": dc.Query(table),
+            f"Query({table}).between": dc.Query(table).between(
+                "2024-01-01", "2024-03-31"
+            ),
+            f"Query({table}).in_categories": dc.Query(table)
+            .between("2024-01-01", "2024-03-31")
+            .in_categories([1, 2]),
+            f"Query({table}).in_categories all history": dc.Query(
+                table
+            ).in_categories([1]),
+        }
+        if table == "expenses":
+            queries[f"Query({table}).matching"] = dc.Query(table).matching(
+                "tesco"
+            )
+
+        for name, query in queries.items():
+            statements.append((name, query.get_sql()[0]))
+
+    return statements
+
+
+def fill_database(rows):
+    """This function fills a new database with random expenses and
+    income spread over the past years.
+
+    :param rows: number of expenses
+    :return: None
+    """
+    dc.create_tables()
+    random.seed(0)
+    days = 365 * 15
+    first = time.time() - days * 86400
+    category_ids = [row[0] for row in dc.get_row_list("categories")]
+    source_ids = [row[0] for row in dc.get_row_list("sources")]
+
+    def get_date():
+        seconds = first + random.randrange(days) * 86400
+        return time.strftime("%Y-%m-%d", time.localtime(seconds))
+
+    expenses = []
+    income = []
+
+    for i in range(rows):
+        description = f"Shop {random.randrange(500)}"
+        amount = round(random.uniform(1, 200), 2)
+        category_id = random.choice(category_ids)
+        expenses.append((get_date(), description, amount, category_id))
+
+        # About one income for every twenty expenses
+        if i % 20 == 0:
+            amount = round(random.uniform(100, 3000), 2)
+            income.append((get_date(), random.choice(source_ids), amount))
+
+    dc.insert_many((dc.INSERT_EXPENSE, expenses))
+    dc.insert_many((dc.INSERT_INCOME, income))
+    dedup.fill_fingerprints("expenses")
+    dedup.fill_fingerprints("income")
+
+    with dc.get_cursor(True) as cursor:
+        cursor.execute("ANALYZE")
+
+
+def get_plan(statement):
+    """This function gets the query plan of a statement.
+
+    :param statement: SQLite command
+    :return: detail of each step of plan
+    :rtype: list of str
+    """
+    args = [None] * statement.count("?")
+
+    with dc.get_cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, args)
+        rows = cursor.fetchall()
+
+    return [row[-1] for row in rows]
+
+
+def check_plan(plan, statement):
+    """This function finds the steps of a plan which scan a large table
+    and the index searches which also read the table. Statements which
+    select every column can't be covered by an index so their searches
+    aren't reported.
+
+    :param plan: detail of each step of plan
+    :param statement: SQLite command
+    :return: scanned tables and searches without a covering index
+    :rtype: list of str, list of str
+    """
+    every_column = "SELECT *" in statement or ".*" in statement
+    scans = []
+    uncovered = []
+
+    for detail in plan:
+        words = detail.split()
+        if len(words) < 2 or words[0] not in ("SCAN", "SEARCH"):
+            continue
+
+        table = words[1]
+        if table not in LARGE_TABLES or "VIRTUAL TABLE" in detail:
+            continue
+
+        if words[0] == "SCAN":
+            scans.append(detail)
+        elif "USING INDEX" in detail and not every_column:
+            uncovered.append(detail)
+
+    return scans, uncovered
+
+
+def audit(rows=DEFAULT_ROWS):
+    """This function prints the plan of every statement which scans a
+    large table, or which could be served by a covering index, in a
+    temporary database.
+
+    :param rows: number of expenses in test database
+    :return: number of statements which scan a table and are not
+        allowed to
+    :rtype: int
+    """
+    database = dc.DATABASE
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as folder:
+        dc.DATABASE = os.path.join(folder, "audit.db")
+        try:
+            fill_database(rows)
+            statements = get_statements()
+
+            for name, statement in statements:
+                try:
+                    plan = get_plan(statement)
+                except sqlite3.Error as e:
+                    print(f"ERROR  {name}: {e}")
+                    failures += 1
+                    continue
+
+                scans, uncovered = check_plan(plan, statement)
+                if scans and name not in ALLOWED_SCANS:
+                    failures += 1
+                    print(f"SCAN   {name}: " + "; ".join(scans))
+                elif scans:
+                    print(f"ok     {name}: {ALLOWED_SCANS[name]}")
+                for detail in uncovered:
+                    print(f"note   {name}: not covering, {detail}")
+        finally:
+            dc.DATABASE = database
+
+    print(f"\n{len(statements)} statements checked, {failures} failed.")
+    return failures
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    sys.exit(1 if audit(number) else 0)
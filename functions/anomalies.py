@@ -0,0 +1,234 @@
+"""This module warns the user when an expense is unusually large for its
+category, such as a grocery shop three times the usual amount. It keeps
+the count, mean and variance of the expenses in each category, and
+estimates of their median and 95th percentile, which are updated one
+expense at a time and saved in the database.
+
+When an expense is entered, and when the programme starts, the
+statistics are brought up to date with only the expenses entered since
+they were last saved. Each of those expenses is compared with the
+statistics of its category before it is added to them, and unusual
+expenses are kept so they can be viewed later. The statistics are
+worked out again from the first expense if any they include have since
+been deleted.
+"""
+
+import json
+from database import database_commands as dc
+from functions import common_functions as cf
+from maths import streaming
+
+# Expenses in a category before any of them can be called unusual
+MIN_EXPENSES = 10
+# Quantile an unusual expense must be above
+UPPER_QUANTILE = 0.95
+# An expense above the upper quantile is unusual if it is this many
+# standard deviations above the mean, or this many times the median
+Z_LIMIT = 3
+RATIO_LIMIT = 3
+# Unusual expenses shown at a time
+MAX_SHOWN = 20
+DESCRIPTION_WIDTH = 24
+CATEGORY_WIDTH = 16
+UNUSUAL = "\033[93m\U000026a0\033[0m"
+UNUSUAL_EXPENSE = "{} Unusual expense: {} in {}, where {} is usual."
+
+
+class CategoryStats:
+    """This class represents the statistics of the expenses in one
+    category.
+
+    Attributes
+    ----------
+    stats : RunningStats
+        count, mean and variance of expenses
+    median : P2Quantile
+        estimate of the median expense
+    upper : P2Quantile
+        estimate of the UPPER_QUANTILE of expenses
+
+    Methods
+    ----------
+    add:
+        adds an expense
+    get_usual:
+        returns the usual amount if an expense is unusual
+    to_row:
+        returns the statistics as a row to save
+    """
+
+    def __init__(self, stats=None, median=None, upper=None):
+        """Constructs statistics, empty or as they were saved."""
+        self.stats = stats or streaming.RunningStats()
+        self.median = median or streaming.P2Quantile(0.5)
+        self.upper = upper or streaming.P2Quantile(UPPER_QUANTILE)
+
+    def add(self, amount):
+        """This method adds an expense to the statistics.
+
+        :param self: CategoryStats object
+        :param amount: amount of expense
+        :return: None
+        """
+        self.stats.add(amount)
+        self.median.add(amount)
+        self.upper.add(amount)
+
+    def get_usual(self, amount):
+        """This method checks whether an expense is unusually large
+        compared with the expenses added so far.
+
+        :param self: CategoryStats object
+        :param amount: amount of expense
+        :return: median expense if the expense is unusual, else None
+        :rtype: float or None
+        """
+        if self.stats.count < MIN_EXPENSES:
+            return None
+        if amount <= self.upper.get_estimate():
+            return None
+
+        median = self.median.get_estimate()
+        z_score = self.stats.get_z_score(amount)
+        if (z_score is not None and z_score >= Z_LIMIT) or (
+            median > 0 and amount >= RATIO_LIMIT * median
+        ):
+            return median
+
+        return None
+
+    def to_row(self, category_id):
+        """This method gets the statistics as a row of the anomaly_stats
+        table.
+
+        :param self: CategoryStats object
+        :param category_id: primary key in categories table
+        :return: (category id, count, mean, m2, quantiles as JSON)
+        :rtype: tuple
+        """
+        quantiles = json.dumps(
+            {"median": self.median.to_dict(), "upper": self.upper.to_dict()}
+        )
+        stats = self.stats
+
+        return (category_id, stats.count, stats.mean, stats.m2, quantiles)
+
+
+def from_row(row):
+    """This function gets the statistics of a category from a row of the
+    anomaly_stats table.
+
+    :param row: (category id, count, mean, m2, quantiles as JSON)
+    :return: statistics
+    :rtype: CategoryStats
+    """
+    quantiles = json.loads(row[4])
+
+    return CategoryStats(
+        streaming.RunningStats(row[1], row[2], row[3]),
+        streaming.quantile_from_dict(quantiles["median"]),
+        streaming.quantile_from_dict(quantiles["upper"]),
+    )
+
+
+def update():
+    """This function brings the statistics of every category up to date
+    with the expenses entered since they were last saved, and saves
+    them with any unusual expenses found.
+
+    :return: (expense id, category id, amount, usual amount) for each
+        unusual expense found
+    :rtype: list of tuples
+    """
+    scan, rows = dc.get_anomaly_stats()
+    new_rows, scan, rebuilt = dc.get_expenses_to_add(scan)
+    if not new_rows and not rebuilt:
+        return []
+
+    categories = {} if rebuilt else {row[0]: from_row(row) for row in rows}
+    found = []
+    changed = set()
+    for expense_id, _, _, amount, category_id, _ in new_rows:
+        stats = categories.setdefault(category_id, CategoryStats())
+        usual = stats.get_usual(amount)
+        if usual is not None:
+            found.append((expense_id, category_id, amount, usual))
+        stats.add(amount)
+        changed.add(category_id)
+
+    dc.save_anomaly_stats(
+        scan,
+        [categories[i].to_row(i) for i in changed],
+        [(*row[:3], round(row[3], 2)) for row in found],
+        rebuilt,
+    )
+
+    return found
+
+
+def check_expense(expense_id):
+    """This function gets a warning for each line of a new expense which
+    is unusual for its category. It is called after the expense has been
+    entered into the database.
+
+    :param expense_id: primary key in expenses table
+    :return: warnings
+    :rtype: list of str
+    """
+    warnings = []
+
+    for row_id, category_id, amount, usual in update():
+        if row_id == expense_id:
+            warnings.append(
+                UNUSUAL_EXPENSE.format(
+                    UNUSUAL,
+                    cf.money_format(round(amount, 2)),
+                    dc.get_category_from_id(category_id, "categories"),
+                    cf.money_format(round(usual, 2)),
+                )
+            )
+
+    return warnings
+
+
+def print_alerts(expense_id):
+    """This function prints a warning if a new expense is unusual.
+
+    :param expense_id: primary key in expenses table
+    :return: None
+    """
+    for warning in check_expense(expense_id):
+        print(warning)
+
+
+def print_anomalies():
+    """This function brings the statistics up to date and prints the
+    most recent unusual expenses.
+
+    :return: None
+    """
+    update()
+    rows = dc.get_anomalies(MAX_SHOWN)
+
+    if not rows:
+        print(cf.NO_RESULTS)
+        return
+
+    print()
+    print(
+        "Date".ljust(11)
+        + "Expense".ljust(DESCRIPTION_WIDTH)
+        + "Category".ljust(CATEGORY_WIDTH)
+        + "Amount".rjust(12)
+        + "Usual".rjust(12)
+    )
+    print("_" * (11 + DESCRIPTION_WIDTH + CATEGORY_WIDTH + 24))
+
+    for date, description, amount, category, usual in rows:
+        print(
+            str(date)[:10].ljust(11)
+            + description[: DESCRIPTION_WIDTH - 1].ljust(DESCRIPTION_WIDTH)
+            + category[: CATEGORY_WIDTH - 1].ljust(CATEGORY_WIDTH)
+            + cf.money_format(round(amount, 2)).rjust(12)
+            + cf.money_format(round(usual, 2)).rjust(12)
+        )
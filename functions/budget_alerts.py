@@ -0,0 +1,282 @@
+"""This module warns the user as soon as a new expense takes their
+spending over 80% or 100% of a budget. It keeps a running total of
+spending for each category budget and for the overall budget in the
+current week, month and year. Totals are read from the database when
+the programme starts, when a budget changes or when a new week, month
+or year begins.
+
+The totals are then kept up to date by a write listener, so that an
+expense counts wherever it is entered from, such as the batch writer or
+the asyncio ledger. A single expense is added to them as it is
+committed; any other write to the expenses, such as a split expense,
+an import or a deletion, makes them be read again before the next
+check.
+"""
+
+import datetime
+import threading
+from database import database_commands as dc
+from functions import common_functions as cf, date_functions as df
+
+TERMS = ("weekly", "monthly", "annual")
+# Fractions of a budget at which the user is warned, highest first
+THRESHOLDS = (1, 0.8)
+OVERSPENT = "\033[91m\U000026a0\033[0m"
+OVER_BUDGET = "{} Over budget: spent {} of {} {} budget of {}."
+NEAR_BUDGET = "{} Spent {}% of {} {} budget ({} of {})."
+
+# Commands whose arguments are (date, description, amount, category
+# id, ...) for one expense, added to the totals as they are committed
+INSERT_COMMANDS = (dc.INSERT_EXPENSE, dc.INSERT_EXPENSE_ACCOUNT)
+# Tables whose other changes mean the totals must be read again
+WATCHED_TABLES = (
+    "expenses",
+    "expense_splits",
+    "categories",
+    "budget",
+    "goals",
+)
+
+_alerts = {"loaded": False, "periods": {}, "budgets": {}, "spent": {}}
+# Held while the totals are read or changed, as writes can be committed
+# on other threads. Loading the totals reads them again, so the same
+# thread can take the lock more than once
+_lock = threading.RLock()
+
+
+def load_counters():
+    """This function loads all budgets and the total spent against each
+    of them in the current week, month and year.
+
+    :return: None
+    """
+    budgets = {}
+
+    # Budgets set by category
+    for row in dc.get_joined_rows("categories"):
+        budgets[(row[0], row[5])] = (row[1], float(row[4]))
+
+    # Overall budgets have no category
+    for term in TERMS:
+        goal = dc.get_goal("budget", term)
+        if goal:
+            budgets[(None, term)] = ("overall", float(goal))
+
+    with _lock:
+        _alerts["budgets"] = budgets
+
+        for term in TERMS:
+            rebuild_term(term)
+
+        _alerts["loaded"] = True
+
+    dc.add_write_listener(on_write)
+
+
+def rebuild_term(term):
+    """This function sets the running totals for every budget in a term
+    from the total spent in each category since the term started.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: None
+    """
+    first_day = df.get_term_start(term)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    totals = dc.get_rollup_totals(first_day, today)
+
+    for category_id, budget_term in _alerts["budgets"]:
+        if budget_term != term:
+            continue
+        if category_id is None:
+            spent = dc.get_total_spending(first_day, today)
+        else:
+            spent = totals.get(category_id, 0)
+        _alerts["spent"][(category_id, term)] = spent
+
+    _alerts["periods"][term] = first_day
+
+
+def reset():
+    """This function clears the running totals so they are loaded again
+    before the next expense is checked. It is called when a budget
+    changes, and by the write listener for any change to expenses
+    other than a single new expense.
+
+    :return: None
+    """
+    _alerts["loaded"] = False
+
+
+def on_write(string, args, row_id):
+    """This function updates the running totals after a write to the
+    database.
+
+    :param string: SQLite command that was committed
+    :param args: arguments for command
+    :param row_id: id of the inserted row or None
+    :return: None
+    """
+    with _lock:
+        if not _alerts["loaded"]:
+            return
+
+        if string in INSERT_COMMANDS and args[3] is not None:
+            add_expense(args[0], args[2], args[3])
+            return
+
+        for table in WATCHED_TABLES:
+            if table in string:
+                reset()
+                return
+
+
+def get_amounts(lines):
+    """This function gets the amount of an expense counted against each
+    budget. Budgets on parent categories include their subcategories.
+
+    :param lines: (amount, category id) for each line of expense
+    :return: amount with category id, or None for the overall budget,
+        as keys
+    :rtype: dict
+    """
+    amounts = {}
+
+    for amount, category_id in lines:
+        for budget_id in dc.get_ancestors(category_id) + [None]:
+            amounts[budget_id] = amounts.get(budget_id, 0) + float(amount)
+
+    return amounts
+
+
+def add_expense(date, amount, category_id):
+    """This function adds a new expense to the running totals of the
+    terms it falls in.
+
+    :param date: date of expense
+    :param amount: amount of expense
+    :param category_id: primary key in categories table
+    :return: None
+    """
+    amounts = get_amounts([(amount, category_id)])
+
+    for term in TERMS:
+        # Totals of a term which has ended are read again when checked
+        if _alerts["periods"][term] != df.get_term_start(term):
+            continue
+        if str(date)[:10] < _alerts["periods"][term]:
+            continue
+
+        for budget_id, amount in amounts.items():
+            key = (budget_id, term)
+            if key in _alerts["spent"]:
+                _alerts["spent"][key] += amount
+
+
+def check_expense(date, amount, category_id):
+    """This function gets a warning for each budget a new expense takes
+    over 80% or 100%. It is called after the expense has been entered
+    into the database, and so added to the running totals.
+
+    :param date: date of expense
+    :param amount: amount of expense
+    :param category_id: primary key in categories table
+    :return: warnings
+    :rtype: list of str
+    """
+    return check_expense_lines(date, [(amount, category_id)])
+
+
+def check_expense_lines(date, lines):
+    """This function gets a warning for each budget a new expense, which
+    may be split across several categories, takes over 80% or 100%. The
+    running totals already include the expense, whether it was added
+    as it was committed or read with the totals.
+
+    :param date: date of expense
+    :param lines: (amount, category id) for each line of expense
+    :return: warnings
+    :rtype: list of str
+    """
+    amounts = get_amounts(lines)
+    warnings = []
+
+    with _lock:
+        if not _alerts["loaded"]:
+            load_counters()
+
+        for term in TERMS:
+            first_day = df.get_term_start(term)
+
+            # A new week, month or year has started since totals were set
+            if _alerts["periods"][term] != first_day:
+                rebuild_term(term)
+
+            if str(date)[:10] < first_day:
+                continue
+
+            for budget_id, amount in amounts.items():
+                key = (budget_id, term)
+                if key in _alerts["budgets"]:
+                    spent = _alerts["spent"][key]
+                    warning = get_warning(key, spent - amount, spent)
+                    if warning:
+                        warnings.append(warning)
+
+    return warnings
+
+
+def get_warning(key, before, after):
+    """This function gets a warning if a budget threshold lies between
+    the total spent before and after an expense.
+
+    :param key: (category id or None, term)
+    :param before: total spent before expense
+    :param after: total spent after expense
+    :return: warning or None
+    :rtype: str or None
+    """
+    description, limit = _alerts["budgets"][key]
+    term = key[1]
+
+    for threshold in THRESHOLDS:
+        if before < threshold * limit <= after:
+            spent = cf.money_format(round(after, 2))
+            budget = cf.money_format(limit)
+
+            if threshold == 1:
+                return OVER_BUDGET.format(
+                    OVERSPENT, spent, term, description, budget
+                )
+
+            percent = int(after / limit * 100)
+            return NEAR_BUDGET.format(
+                OVERSPENT, percent, term, description, spent, budget
+            )
+
+    return None
+
+
+def print_alerts(date, amount, category_id):
+    """This function prints any budget warnings for a new expense.
+
+    :param date: date of expense
+    :param amount: amount of expense
+    :param category_id: primary key in categories table
+    :return: None
+    """
+    for warning in check_expense(date, amount, category_id):
+        print(warning)
+
+
+def print_split_alerts(date, splits):
+    """This function prints any budget warnings for a new expense split
+    across several categories.
+
+    :param date: date of expense
+    :param splits: (category id, amount) for each category
+    :return: None
+    """
+    lines = [(amount, category_id) for category_id, amount in splits]
+
+    for warning in check_expense_lines(date, lines):
+        print(warning)
@@ -0,0 +1,334 @@
+"""This module contains the logic to choose a category for an expense
+from its description and amount, so that expenses imported from a
+bank statement don't have to be categorised one at a time.
+
+User rules are checked first, in the order they were added, and then
+descriptions which exactly match a past expense are given the category
+most often used for it. 'contains' and 'starts with' rules are
+compiled into one Aho-Corasick automaton so every rule is checked in a
+single pass over the description, and regular expression rules are
+joined into one pattern which is only searched rule by rule when it
+matches. Rules with groups or flags for the whole expression would
+match differently once joined, so they are always searched on their
+own.
+
+References
+----------
+[1] Aho, A. V. and Corasick, M. J. (1975) Efficient string matching:
+an aid to bibliographic search. Communications of the ACM 18(6).
+"""
+
+from collections import deque
+import re
+
+CONTAINS = "contains"
+STARTS_WITH = "starts with"
+REGEX = "regex"
+AMOUNT = "amount"
+RULE_KINDS = (CONTAINS, STARTS_WITH, REGEX, AMOUNT)
+NOT_WORD = re.compile(r"[^0-9a-z]+")
+
+
+class Automaton:
+    """This class represents an Aho-Corasick automaton which finds every
+    occurrence of a set of patterns in a text in one pass [1].
+
+    Attributes
+    ----------
+    goto : list of dict
+        next state for each character from each state
+    fail : list of int
+        state to fall back to when a character has no next state
+    delta : list of dict
+        next state for each character from each state after following
+        failure links
+    output : list of list
+        (pattern length, value) for each pattern ending at each state
+
+    Methods
+    ----------
+    search:
+        yields start position and value of each pattern found in a text
+    """
+
+    def __init__(self, patterns):
+        """Constructs the automaton from (pattern, value) pairs."""
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, value in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(pattern), value))
+
+        # Set failure links breadth first so each state falls back to
+        # the longest suffix of its path which is also a prefix
+        order = []
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                if state:
+                    self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[
+                    self.fail[next_state]
+                ]
+
+        # Follow the failure links in advance so searching takes one
+        # step for each character
+        self.delta = [dict(self.goto[0])] + [{} for _ in self.goto[1:]]
+        for state in order:
+            self.delta[state] = {
+                **self.delta[self.fail[state]],
+                **self.goto[state],
+            }
+
+    def search(self, text):
+        """This method finds every pattern in a text.
+
+        :param self: Automaton object
+        :param text: text to search
+        :return: start position and value for each pattern found
+        :rtype: generator of tuples
+        """
+        delta, output = self.delta, self.output
+        state = 0
+
+        for i, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            if output[state]:
+                for length, value in output[state]:
+                    yield i - length + 1, value
+
+
+class Categoriser:
+    """This class represents all rules for categorising expenses
+    compiled into one matcher.
+
+    Attributes
+    ----------
+    automaton : Automaton
+        'contains' and 'starts with' rules
+    regex : compiled pattern or None
+        regular expression rules which can be joined as one pattern
+    regex_rules : list of tuples
+        (compiled pattern, rule, True if joined in regex) for each
+        regular expression rule
+    amount_rules : list of tuples
+        rules which only match on amount
+    merchants : dict
+        category id with normalised description of past expenses as
+        keys
+
+    Methods
+    ----------
+    classify:
+        returns the category id for an expense or None
+    classify_many:
+        returns categorised and uncategorised expenses from a list
+    """
+
+    def __init__(self, rules, merchants):
+        """Constructs a matcher from rules and past expenses.
+
+        rules are (id, kind, pattern, category id, min amount, max
+        amount) rows and merchants maps normalised descriptions to
+        category ids.
+        """
+        patterns = []
+        self.regex_rules = []
+        self.amount_rules = []
+
+        for rule in sorted(rules):
+            kind, pattern = rule[1], rule[2]
+            if kind in (CONTAINS, STARTS_WITH):
+                patterns.append((normalise(pattern), rule))
+            elif kind == REGEX:
+                self.regex_rules.append(
+                    (re.compile(pattern, re.I), rule, can_join(pattern))
+                )
+            else:
+                self.amount_rules.append(rule)
+
+        self.automaton = Automaton(patterns)
+        self.regex = None
+        joined = [rule[2] for _, rule, join in self.regex_rules if join]
+        if joined:
+            self.regex = re.compile(
+                "|".join(f"(?:{pattern})" for pattern in joined), re.I
+            )
+        self.merchants = merchants
+        self.has_bands = any(
+            rule[4] is not None or rule[5] is not None for rule in rules
+        )
+
+    def classify(self, description, amount):
+        """This method gets the category for an expense from the first
+        rule it matches, or from past expenses with the same
+        description.
+
+        :param self: Categoriser object
+        :param description: expense description
+        :param amount: expense amount
+        :return: category id or None
+        :rtype: int or None
+        """
+        text = normalise(description)
+        best = None
+
+        for start, rule in self.automaton.search(text):
+            if rule[1] == STARTS_WITH and start:
+                continue
+            if in_band(rule, amount) and (best is None or rule < best):
+                best = rule
+
+        # Joined rules can only match if the joined pattern does
+        any_joined = self.regex is not None and self.regex.search(
+            description
+        )
+        for pattern, rule, join in self.regex_rules:
+            if best is not None and rule > best:
+                break
+            if join and not any_joined:
+                continue
+            if pattern.search(description) and in_band(rule, amount):
+                best = rule
+                break
+
+        for rule in self.amount_rules:
+            if best is not None and rule > best:
+                break
+            if in_band(rule, amount):
+                best = rule
+                break
+
+        if best is not None:
+            return best[3]
+
+        return self.merchants.get(text)
+
+    def classify_many(self, expenses):
+        """This method categorises a list of expenses. Descriptions
+        which have already been seen are not matched again.
+
+        :param self: Categoriser object
+        :param expenses: list of (date, description, amount)
+        :return: (date, description, amount, category id) for each
+            categorised expense and (date, description, amount) for
+            each expense which matched nothing
+        :rtype: list of tuples, list of tuples
+        """
+        categorised = []
+        uncategorised = []
+        seen = {}
+
+        for date, description, amount in expenses:
+            key = description
+            if self.has_bands:
+                key = (description, amount)
+
+            if key not in seen:
+                seen[key] = self.classify(description, amount)
+
+            category_id = seen[key]
+            if category_id is None:
+                uncategorised.append((date, description, amount))
+            else:
+                categorised.append((date, description, amount, category_id))
+
+        return categorised, uncategorised
+
+
+def normalise(description):
+    """This function converts a description to lower case letters and
+    numbers separated by single spaces, so descriptions written
+    differently can be compared.
+
+    :param description: expense description
+    :return: normalised description
+    :rtype: str
+    """
+    return NOT_WORD.sub(" ", description.lower()).strip()
+
+
+def in_band(rule, amount):
+    """This function checks whether an amount is within the minimum and
+    maximum amount of a rule.
+
+    :param rule: (id, kind, pattern, category id, min amount, max amount)
+    :param amount: expense amount
+    :return: True if in band or False if not
+    :rtype: bool
+    """
+    if rule[4] is not None and amount < rule[4]:
+        return False
+    if rule[5] is not None and amount > rule[5]:
+        return False
+
+    return True
+
+
+def is_valid_regex(pattern):
+    """This function checks that a regular expression can be compiled.
+
+    :param pattern: regular expression
+    :return: True if valid or False if invalid
+    :rtype: bool
+    """
+    try:
+        re.compile(pattern)
+        return True
+    except re.error:
+        return False
+
+
+def can_join(pattern):
+    """This function checks whether a regular expression matches the
+    same text when joined with others into one pattern. Joining
+    renumbers groups, which backreferences point to, and flags for the
+    whole expression must come at the start of the joined pattern.
+
+    :param pattern: regular expression
+    :return: True if it can be joined or False if not
+    :rtype: bool
+    """
+    try:
+        return re.compile(f"(?:{pattern})").groups == 0
+    except re.error:
+        return False
+
+
+def get_merchants(rows):
+    """This function gets the category most often used for each
+    description of past expenses.
+
+    :param rows: (description, category id, count) rows
+    :return: category id with normalised description as keys
+    :rtype: dict
+    """
+    counts = {}
+
+    for description, category_id, count in rows:
+        if category_id is None:
+            continue
+        text = normalise(str(description))
+        if count > counts.get(text, (0, None))[0]:
+            counts[text] = (count, category_id)
+
+    merchants = {}
+    for text, (_, category_id) in counts.items():
+        merchants[text] = category_id
+
+    return merchants
@@ -3,9 +3,10 @@ across multiple modules: expenses.py, income.py, budget.py and goals.py.
 """
 
 from time import sleep
+import calendar
 import os
 import datetime
-from database import database_commands
+from database import database_commands, ledger_index
 
 SEL_DATES = """\n\U0001f5d3  Please choose from the following time periods:\n
 1.  This month
@@ -99,43 +100,62 @@ def money_format(some_amount):
     return some_amount
 
 
-def get_rows_from_dates(date_range, table):
+def get_rows_from_dates(date_range, table, category_ids=None):
     """This function selects rows from a table which match the date
-    range selected by user.
+    range selected by user and, optionally, a set of categories or
+    sources.
 
     :param date_range: User selection: '1', '2', '3', '4' or '5'
     :param table: str table name in database
-    :return: rows from table which match date range
+    :param category_ids: category or source ids or None for all
+    :return: rows from table which match date range, newest first
     :rtype: list of tuples
     """
-    today = datetime.date.today()
-    # Selection "1" is today's month.
-    year_month = str(today)[:7]  # Get YYYY-MM from YYYY-MM-DD
+    # Views of a few categories are left to the query, which reads only
+    # their rows through the category index rather than the whole range
+    if ledger_index.is_enabled() and category_ids is None:
+        return get_indexed_rows_from_dates(date_range, table)
 
-    # Get rows for this month
-    rows_in_months = database_commands.get_rows(year_month, table)
+    query = database_commands.Query(table)
 
-    # "2" selects 3 months, "3" selects 6 months, "4" selects past year
-    if date_range in ("2", "3", "4"):
+    # Rows are kept from the first day of the range to the end of this
+    # month, or from all history
+    first_day = get_first_day(date_range)
+    if first_day is not None:
+        today = datetime.date.today()
+        last_day = today.replace(
+            day=calendar.monthrange(today.year, today.month)[1]
+        )
+        query.between(first_day, last_day)
 
-        time_period = get_range_for_search(date_range)
+    if category_ids is not None:
+        query.in_categories(category_ids)
 
-        # List of items in format YYYY-MM from date range selected
-        months_list = select_months(time_period)
+    return query.fetch()
 
-        # Get rows for each previous month
-        for year_month in months_list:
-            add_months = database_commands.get_rows(year_month, table)
 
-            # Append rows to list for each month
-            for row in add_months:
-                rows_in_months.append(row)
+def get_indexed_rows_from_dates(date_range, table):
+    """This function selects rows from the ledger index which match the
+    date range selected by user.
 
+    :param date_range: User selection: '1', '2', '3', '4' or '5'
+    :param table: 'expenses' or 'income'
+    :return: rows from table which match date range
+    :rtype: list of tuples
+    """
     # Get rows for all time
     if date_range == "5":
-        rows_in_months = database_commands.get_joined_rows(table)
+        return ledger_index.get_all_rows(table)
 
-    return rows_in_months
+    this_month = str(datetime.date.today())[:7]
+    first_month = this_month
+
+    # "2" selects 3 months, "3" selects 6 months, "4" selects past year
+    if date_range in ("2", "3", "4"):
+        time_period = get_range_for_search(date_range)
+        first_month = select_months(time_period)[-1]
+
+    return ledger_index.get_rows_in_months(table, first_month, this_month)
 
 
 def select_months(time_period):
@@ -160,6 +180,27 @@ def select_months(time_period):
     return months_list
 
 
+def get_first_day(date_range):
+    """This function gets the first day of the date range selected by
+    user.
+
+    :param date_range: User selection: '1', '2', '3', '4' or '5'
+    :return: first day as YYYY-MM-DD or None for all history
+    :rtype: str or None
+    """
+    if date_range == "5":
+        return None
+
+    first_month = str(datetime.date.today())[:7]
+
+    # "2" selects 3 months, "3" selects 6 months, "4" selects past year
+    if date_range in ("2", "3", "4"):
+        time_period = get_range_for_search(date_range)
+        first_month = select_months(time_period)[-1]
+
+    return f"{first_month}-01"
+
+
 def get_range_for_search(selection):
     """This function gets a range of values user selection for a number
     of months to search
@@ -225,6 +266,25 @@ def get_amount():
         print(INVALID_INPUT)
 
 
+def get_optional_amount(string):
+    """This function gets an amount from the user which may be left
+    blank.
+
+    :param string: input prompt
+    :return: amount or None
+    :rtype: float or None
+    """
+    while True:
+        new_amount = input(string).strip()
+
+        if new_amount == "":
+            return None
+        if amount_check(new_amount):
+            return float(new_amount)
+
+        print(INVALID_INPUT)
+
+
 def amount_check(new_amount):
     """This function checks that a user input is valid for a monetary
     amount.
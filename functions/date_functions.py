@@ -36,6 +36,47 @@ def get_days_list(term):
     return term_dict[term]
 
 
+def get_term_start(term):
+    """This function gets the first day of the current week, month or
+    year.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: first day of term as YYYY-MM-DD
+    :rtype: str
+    """
+    day = datetime.date.today()
+    term_dict = {
+        "weekly": day - relativedelta(weekday=MO(-1)),
+        "monthly": day.replace(day=1),
+        "annual": day.replace(month=1, day=1),
+    }
+    return term_dict[term].strftime("%Y-%m-%d")
+
+
+def get_term_range(term, periods_ago):
+    """This function gets the first and last day of a past week, month
+    or year.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param periods_ago: number of weeks, months or years before the
+        current one
+    :return: first day and last day as YYYY-MM-DD
+    :rtype: str, str
+    """
+    first_day = datetime.date.fromisoformat(get_term_start(term))
+    step_dict = {
+        "weekly": relativedelta(weeks=1),
+        "monthly": relativedelta(months=1),
+        "annual": relativedelta(years=1),
+    }
+    step = step_dict[term]
+
+    first_day = first_day - step * periods_ago
+    last_day = first_day + step - datetime.timedelta(days=1)
+
+    return first_day.strftime("%Y-%m-%d"), last_day.strftime("%Y-%m-%d")
+
+
 def get_week_dates():
     """This function gets last Monday's date, makes a new list and
     appends last Monday. It then calls function to get dates before
@@ -0,0 +1,258 @@
+"""This module makes a report of spending with a row for each category
+and a column for each week, month or year, with the total, budget and
+variance of each category over all of the columns. The totals come from
+one grouped query, and a category includes spending in its
+subcategories as it does in budget progress. The report can be printed
+as a table or saved as a CSV file.
+"""
+
+import csv
+import datetime
+from dateutil.relativedelta import relativedelta
+from database import database_commands as dc
+from functions import common_functions as cf, date_functions as df
+from maths import calculations as calc
+
+STEPS = {
+    "weekly": relativedelta(weeks=1),
+    "monthly": relativedelta(months=1),
+    "annual": relativedelta(years=1),
+}
+# Heading of each column, matching the periods of dc.PIVOT_PERIODS
+PERIOD_FORMATS = {"weekly": "%Y-%m-%d", "monthly": "%Y-%m", "annual": "%Y"}
+CATEGORY_WIDTH = 16
+COLUMN_WIDTH = 12
+TOTAL = "TOTAL"
+
+
+class Pivot:
+    """This class represents spending by category and period.
+
+    Attributes
+    ----------
+    term : str
+        'weekly', 'monthly' or 'annual'
+    periods : list of str
+        heading of each column, oldest first
+    rows : list of tuples
+        (category, amount in each period, total, budget or None,
+        variance or None) for each category with spending or a budget
+    totals : tuple
+        (TOTAL, amount in each period, total, overall budget or None,
+        variance or None)
+
+    Methods
+    ----------
+    get_lines:
+        returns the report as lines of a table
+    write_csv:
+        saves the report as a CSV file
+    """
+
+    def __init__(self, term, periods, rows, totals):
+        """Constructs a report from its rows."""
+        self.term = term
+        self.periods = periods
+        self.rows = rows
+        self.totals = totals
+
+    def get_lines(self):
+        """This method gets the report as lines of a table, with amounts
+        right aligned in columns.
+
+        :param self: Pivot object
+        :return: header, one line for each category and total line
+        :rtype: list of str
+        """
+        headings = self.periods + ["Total", "Budget", "Variance"]
+        line = "_" * (CATEGORY_WIDTH + COLUMN_WIDTH * len(headings))
+        lines = [
+            "Category".ljust(CATEGORY_WIDTH)
+            + "".join(heading.rjust(COLUMN_WIDTH) for heading in headings),
+            line,
+        ]
+
+        for row in self.rows + [self.totals]:
+            if row is self.totals:
+                lines.append(line)
+            cells = [*row[1], row[2], row[3], row[4]]
+            lines.append(
+                str(row[0])[: CATEGORY_WIDTH - 1].ljust(CATEGORY_WIDTH)
+                + "".join(format_cell(cell) for cell in cells)
+            )
+
+        return lines
+
+    def write_csv(self, path):
+        """This method saves the report as a CSV file.
+
+        :param self: Pivot object
+        :param path: path to CSV file
+        :return: None
+        """
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(
+                ["Category", *self.periods, "Total", "Budget", "Variance"]
+            )
+            for row in self.rows + [self.totals]:
+                writer.writerow([row[0], *row[1], *row[2:]])
+
+
+def format_cell(amount):
+    """This function formats an amount as a column of the table.
+
+    :param amount: amount or None
+    :return: amount right aligned, or '-' for None
+    :rtype: str
+    """
+    text = "-" if amount is None else f"{amount:,.2f}"
+
+    # Always leave a space so large amounts don't run together
+    return " " + text.rjust(COLUMN_WIDTH - 1)
+
+
+def get_periods(term, number):
+    """This function gets the first day of the last few weeks, months or
+    years, including the current one.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param number: number of weeks, months or years
+    :return: first day of each period, oldest first
+    :rtype: list of dates
+    """
+    current = datetime.date.fromisoformat(df.get_term_start(term))
+    return [current - STEPS[term] * i for i in range(number - 1, -1, -1)]
+
+
+def get_period_amount(amount, from_term, to_term):
+    """This function converts a budget for one term into a budget for
+    another term.
+
+    :param amount: budget amount
+    :param from_term: term of budget
+    :param to_term: term to convert to
+    :return: budget over to_term
+    :rtype: float
+    """
+    annual = {
+        "weekly": calc.annual_from_weekly,
+        "monthly": calc.annual_from_monthly,
+        "annual": float,
+    }[from_term](amount)
+
+    return {
+        "weekly": calc.get_week_from_year,
+        "monthly": calc.get_month_from_year,
+        "annual": float,
+    }[to_term](annual)
+
+
+def get_overall_budget(term):
+    """This function gets the overall budget over a term, converted from
+    another term's budget if none is set for it.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: budget amount or None
+    :rtype: float or None
+    """
+    for budget_term in (term, "monthly", "weekly", "annual"):
+        amount = dc.get_goal("budget", budget_term)
+        if amount:
+            return get_period_amount(amount, budget_term, term)
+
+    return None
+
+
+def get_variance(total, budget):
+    """This function gets how far spending is under a budget.
+
+    :param total: total spent
+    :param budget: budget amount or None
+    :return: budget left, negative if overspent, or None
+    :rtype: float or None
+    """
+    if budget is None:
+        return None
+
+    return calc.difference(total, budget)
+
+
+def make_pivot(term, number):
+    """This function gets spending by category in each of the last few
+    weeks, months or years.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param number: number of weeks, months or years, including the
+        current one
+    :return: report
+    :rtype: Pivot
+    """
+    starts = get_periods(term, number)
+    first_day = starts[0].strftime("%Y-%m-%d")
+    last_day = datetime.date.today().strftime("%Y-%m-%d")
+    periods = [start.strftime(PERIOD_FORMATS[term]) for start in starts]
+    columns = {period: i for i, period in enumerate(periods)}
+
+    # Each category's own spending, then added to the categories above it
+    own = {}
+    for category_id, period, total in dc.get_pivot_totals(
+        term, first_day, last_day
+    ):
+        if period in columns:
+            amounts = own.setdefault(category_id, [0.0] * len(periods))
+            amounts[columns[period]] += total
+
+    rolled_up = {}
+    for ancestor_id, descendant_id in dc.get_category_paths():
+        if descendant_id in own:
+            amounts = rolled_up.setdefault(ancestor_id, [0.0] * len(periods))
+            for i, amount in enumerate(own[descendant_id]):
+                amounts[i] += amount
+
+    budgets = {}
+    for row in dc.get_joined_rows("categories"):
+        if row[4] is not None and row[5] in STEPS:
+            budget = get_period_amount(float(row[4]), row[5], term)
+            budgets[row[0]] = round(budget * len(periods), 2)
+
+    rows = []
+    for row in dc.get_row_list("categories"):
+        amounts = rolled_up.get(row[0])
+        budget = budgets.get(row[0])
+        if amounts is None and budget is None:
+            continue
+
+        if amounts is None:
+            amounts = [0.0] * len(periods)
+        amounts = [round(amount, 2) for amount in amounts]
+        total = calc.total_spending(amounts)
+        variance = get_variance(total, budget)
+        rows.append((row[1], amounts, total, budget, variance))
+
+    amounts = [
+        round(sum(category[i] for category in own.values()), 2)
+        for i in range(len(periods))
+    ]
+    total = calc.total_spending(amounts)
+    budget = get_overall_budget(term)
+    if budget is not None:
+        budget = round(budget * len(periods), 2)
+    totals = (TOTAL, amounts, total, budget, get_variance(total, budget))
+
+    return Pivot(term, periods, rows, totals)
+
+
+def print_pivot(pivot):
+    """This function prints a report as a table.
+
+    :param pivot: report
+    :return: None
+    """
+    if not pivot.rows and not pivot.totals[2]:
+        print(cf.NO_RESULTS)
+        return
+
+    print()
+    for line in pivot.get_lines():
+        print(line)
@@ -0,0 +1,215 @@
+"""This module reconciles the expenses and income in the database with a
+bank statement. Each payment out of the account should match an
+expense and each payment in should match an income with the same
+amount, dated within a few days of it.
+
+The statement is read once into hash tables keyed by amount in pence
+and day, one for payments out and one for payments in. Expenses and
+income in the dates covered by the statement are then streamed from the
+database and each looks up the days either side of its own date, so
+every row is compared only with statement lines of the same amount. When
+more than one line could match, the one whose description is most alike
+and then the one closest in date is chosen.
+"""
+
+import datetime
+from database import database_commands as dc
+from functions import statements as st
+from functions.categoriser import normalise
+
+# Days a statement line may be dated before or after the ledger row
+DATE_WINDOW = 3
+TABLES = ("expenses", "income")
+
+
+class Reconciliation:
+    """This class represents the result of reconciling a statement with
+    the expenses and income in the database.
+
+    Attributes
+    ----------
+    matched : list of tuples
+        (statement line, ledger row, table) for each match
+    missing : list of tuples
+        (date, description, amount, table) for each statement line with
+        no match in the database
+    extra : list of tuples
+        (id, date, description, amount, table) for each ledger row in
+        the dates of the statement with no match in the statement
+    first_day : str or None
+        date of first line in statement
+    last_day : str or None
+        date of last line in statement
+
+    Methods
+    ----------
+    is_balanced:
+        returns True if every line and row was matched
+    """
+
+    def __init__(self):
+        """Constructs an empty reconciliation."""
+        self.matched = []
+        self.missing = []
+        self.extra = []
+        self.first_day = None
+        self.last_day = None
+
+    def is_balanced(self):
+        """This method checks whether the statement and database agree.
+
+        :param self: Reconciliation object
+        :return: True if nothing is missing or extra or False if not
+        :rtype: bool
+        """
+        return not self.missing and not self.extra
+
+
+def get_day(date, days):
+    """This function gets the day number of a date, remembering the
+    dates already converted.
+
+    :param date: date as YYYY-MM-DD
+    :param days: day number with date as keys
+    :return: day number
+    :rtype: int
+    """
+    day = days.get(date)
+    if day is None:
+        day = datetime.date.fromisoformat(date[:10]).toordinal()
+        days[date] = day
+
+    return day
+
+
+def get_similarity(words, description):
+    """This function compares two descriptions by the words they share.
+
+    :param words: set of words in first description
+    :param description: second description
+    :return: shared words as a fraction of all words, from 0 to 1
+    :rtype: float
+    """
+    other = set(normalise(str(description)).split())
+    if not words or not other:
+        return 0
+
+    return len(words & other) / len(words | other)
+
+
+def build_buckets(transactions, days):
+    """This function reads statement lines into one hash table for
+    payments out and one for payments in.
+
+    :param transactions: (date, description, amount) for each line
+    :param days: day number with date as keys
+    :return: lines, buckets of line numbers keyed by (pence, day) for
+        each table, and first and last day
+    :rtype: list, dict, str, str
+    """
+    lines = []
+    buckets = {table: {} for table in TABLES}
+    first_day = last_day = None
+
+    for date, description, amount in transactions:
+        if amount == 0:
+            continue
+
+        table = "expenses" if amount < 0 else "income"
+        amount = round(abs(amount), 2)
+        key = (round(amount * 100), get_day(date, days))
+        buckets[table].setdefault(key, []).append(len(lines))
+        lines.append((date, description, amount, table))
+
+        if first_day is None or date < first_day:
+            first_day = date
+        if last_day is None or date > last_day:
+            last_day = date
+
+    return lines, buckets, first_day, last_day
+
+
+def find_match(row, lines, buckets, days):
+    """This function finds and removes the statement line which best
+    matches a row from the database.
+
+    :param row: (id, date, description, amount)
+    :param lines: statement lines
+    :param buckets: line numbers keyed by (pence, day)
+    :param days: day number with date as keys
+    :return: line number or None if no line matches
+    :rtype: int or None
+    """
+    pence = round(row[3] * 100)
+    day = get_day(row[1], days)
+    candidates = []
+
+    for offset in range(-DATE_WINDOW, DATE_WINDOW + 1):
+        bucket = buckets.get((pence, day + offset))
+        if bucket:
+            for position in range(len(bucket)):
+                candidates.append((bucket, position, offset))
+
+    if not candidates:
+        return None
+
+    # Descriptions are only compared when there is a choice of lines
+    best = candidates[0]
+    if len(candidates) > 1:
+        words = set(normalise(str(row[2])).split())
+        best = max(
+            candidates,
+            key=lambda candidate: (
+                get_similarity(words, lines[candidate[0][candidate[1]]][1]),
+                -abs(candidate[2]),
+            ),
+        )
+
+    bucket, position, _ = best
+    return bucket.pop(position)
+
+
+def reconcile(path):
+    """This function reconciles a statement with the expenses and income
+    in the database between the first and last day of the statement,
+    allowing for payments which take a few days to clear.
+
+    :param path: path to statement CSV file
+    :return: Reconciliation object
+    :rtype: obj
+    """
+    days = {}
+    result = Reconciliation()
+    lines, buckets, first_day, last_day = build_buckets(
+        st.read_statement(path), days
+    )
+
+    if first_day is None:
+        return result
+
+    result.first_day, result.last_day = first_day, last_day
+    # Rows just outside the statement may match lines near its ends
+    window = datetime.timedelta(days=DATE_WINDOW)
+    first_date = datetime.date.fromisoformat(first_day) - window
+    last_date = datetime.date.fromisoformat(last_day) + window
+    found = set()
+
+    for table in TABLES:
+        rows = dc.stream_rows_to_reconcile(
+            table, first_date.isoformat(), last_date.isoformat()
+        )
+        for row in rows:
+            line_number = find_match(row, lines, buckets[table], days)
+
+            if line_number is not None:
+                found.add(line_number)
+                line = lines[line_number]
+                result.matched.append((line[:3], row, table))
+            elif first_day <= row[1] <= last_day:
+                result.extra.append((*row, table))
+
+    for line_number, line in enumerate(lines):
+        if line_number not in found:
+            result.missing.append(line)
+
+    return result
@@ -0,0 +1,169 @@
+"""This module enters expenses and income which repeat on a schedule,
+such as a mortgage paid on the first of every month. Each recurring
+item keeps a count of the occurrences already entered. When the
+programme starts every occurrence due since it was last run is entered
+in one transaction, together with the new counts, so running the
+catch-up again never enters an occurrence twice. An occurrence matching
+an expense or income which was entered by hand is skipped.
+
+Occurrences are counted from the first date rather than from the one
+before, so a payment on the 31st is made on the last day of shorter
+months and returns to the 31st afterwards.
+"""
+
+import datetime
+from dateutil.relativedelta import relativedelta
+from database import database_commands as dc, dedup
+
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+YEARLY = "yearly"
+DAYS = "days"
+FREQUENCIES = (WEEKLY, MONTHLY, YEARLY, DAYS)
+INSERT_COMMAND = {
+    "expenses": dc.INSERT_EXPENSE_FINGERPRINT,
+    "income": dc.INSERT_INCOME_FINGERPRINT,
+}
+
+
+def get_step(frequency, interval):
+    """This function gets the time between two occurrences.
+
+    :param frequency: 'weekly', 'monthly', 'yearly' or 'days'
+    :param interval: number of weeks, months, years or days
+    :return: time between occurrences
+    :rtype: timedelta or relativedelta
+    """
+    if frequency == WEEKLY:
+        return datetime.timedelta(weeks=interval)
+    if frequency == MONTHLY:
+        return relativedelta(months=interval)
+    if frequency == YEARLY:
+        return relativedelta(years=interval)
+
+    return datetime.timedelta(days=interval)
+
+
+def get_due_rows(item, last_day):
+    """This function gets the rows to enter for every occurrence of a
+    recurring item due on or before a date.
+
+    :param item: row from recurring table
+    :param last_day: date as YYYY-MM-DD
+    :return: rows for expenses or income table, and number of
+        occurrences and next date after them
+    :rtype: list of tuples, int, str
+    """
+    kind, description, amount, category_id = item[1:5]
+    frequency, interval, start_date, end_date, occurrences = item[5:10]
+    if end_date and end_date < last_day:
+        last_day = end_date
+
+    first = datetime.date.fromisoformat(start_date)
+    step = get_step(frequency, interval)
+    rows = []
+    date = (first + step * occurrences).strftime("%Y-%m-%d")
+
+    while date <= last_day:
+        if kind == "expenses":
+            rows.append((date, description, amount, category_id))
+        else:
+            rows.append((date, category_id, amount))
+        occurrences += 1
+        date = (first + step * occurrences).strftime("%Y-%m-%d")
+
+    return rows, occurrences, date
+
+
+def get_dates_between(item, first_day, last_day):
+    """This function gets the date of every occurrence of a recurring
+    item between two dates, whether or not it has been entered.
+
+    :param item: row from recurring table
+    :param first_day: first date as YYYY-MM-DD
+    :param last_day: last date as YYYY-MM-DD
+    :return: dates as YYYY-MM-DD
+    :rtype: list of str
+    """
+    frequency, interval, start_date, end_date = item[5:9]
+    if end_date and end_date < last_day:
+        last_day = end_date
+
+    first = datetime.date.fromisoformat(start_date)
+    step = get_step(frequency, interval)
+    dates = []
+    occurrences = 0
+    date = start_date
+
+    while date <= last_day:
+        if date >= first_day:
+            dates.append(date)
+        occurrences += 1
+        date = (first + step * occurrences).strftime("%Y-%m-%d")
+
+    return dates
+
+
+def catch_up(today=None):
+    """This function enters every occurrence of recurring expenses and
+    income due up to today in one transaction.
+
+    :param today: date as YYYY-MM-DD (default = today)
+    :return: number of expenses and income entered
+    :rtype: int
+    """
+    if today is None:
+        today = datetime.date.today().strftime("%Y-%m-%d")
+
+    rows = {"expenses": [], "income": []}
+    updates = []
+
+    for item in dc.get_due_recurring(today):
+        due_rows, occurrences, next_date = get_due_rows(item, today)
+        rows[item[1]] += due_rows
+        updates.append((occurrences, next_date, item[0], item[9]))
+
+    if not updates:
+        return 0
+
+    commands = []
+    entered = 0
+    for table, table_rows in rows.items():
+        new_rows, _ = dedup.filter_new_rows(table, table_rows)
+        commands.append((INSERT_COMMAND[table], new_rows))
+        entered += len(new_rows)
+
+    commands.append((dc.UPDATE_RECURRING, updates))
+    dc.insert_batch(commands)
+
+    return entered
+
+
+def add_recurring(kind, description, amount, category_id, schedule):
+    """This function enters a new recurring expense or income and
+    enters any occurrences already due.
+
+    :param kind: 'expenses' or 'income'
+    :param description: expense description, or source for income
+    :param amount: amount of each occurrence
+    :param category_id: category id for expenses or source id for
+        income
+    :param schedule: (frequency, interval, start date, end date or None)
+    :return: number of occurrences entered
+    :rtype: int
+    """
+    frequency, interval, start_date, end_date = schedule
+    item = (
+        kind,
+        description,
+        float(amount),
+        category_id,
+        frequency,
+        interval,
+        start_date,
+        end_date,
+        start_date,
+    )
+    dc.insert_data(dc.INSERT_RECURRING, item)
+
+    return catch_up()
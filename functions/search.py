@@ -0,0 +1,93 @@
+"""This module contains the logic to search expense descriptions. A
+search is made of words, which match whole words in a description,
+words ending in '*', which match any word starting with them, and
+phrases in double quotes, which match words next to each other in the
+same order. Every word and phrase in a search must match. Results can
+be filtered by date, amount and category and are returned a page at a
+time.
+"""
+
+import re
+from database import database_commands as dc
+from functions.categoriser import normalise
+
+# Number of expenses shown on each page of results
+PAGE_SIZE = 20
+TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def parse_query(text):
+    """This function splits a search into the words and phrases which
+    must match.
+
+    :param text: search entered by user
+    :return: (words, True if prefix) for each word or phrase
+    :rtype: list of tuples
+    """
+    terms = []
+
+    for phrase, word in TERM.findall(text):
+        prefix = bool(word) and word.endswith("*")
+        words = tuple(normalise(phrase or word).split())
+        if words:
+            terms.append((words, prefix))
+
+    return terms
+
+
+def get_match(terms):
+    """This function writes search terms as an FTS5 query. Each term is
+    quoted so that characters in descriptions are never read as query
+    syntax.
+
+    :param terms: (words, True if prefix) for each term
+    :return: FTS5 query
+    :rtype: str
+    """
+    match = []
+
+    for words, prefix in terms:
+        term = '"' + " ".join(words) + '"'
+        if prefix:
+            term += "*"
+        match.append(term)
+
+    return " ".join(match)
+
+
+def get_patterns(terms):
+    """This function writes search terms as LIKE patterns, used when
+    SQLite has no full text search.
+
+    :param terms: (words, True if prefix) for each term
+    :return: LIKE patterns
+    :rtype: list of str
+    """
+    return ["%" + "%".join(words) + "%" for words, _ in terms]
+
+
+def search(text, filters, page=0):
+    """This function gets one page of expenses matching a search.
+
+    :param text: search entered by user
+    :param filters: values with keys 'first_day', 'last_day',
+        'min_amount', 'max_amount' and 'category_id', or None
+    :param page: page number from 0
+    :return: rows from expenses joined with categories, and True if
+        there are more pages
+    :rtype: list of tuples, bool
+    """
+    terms = parse_query(text)
+    if not terms:
+        return [], False
+
+    # Fetch one more row than a page to see if there is another page
+    rows = dc.search_expenses(
+        get_match(terms),
+        get_patterns(terms),
+        filters,
+        PAGE_SIZE + 1,
+        page * PAGE_SIZE,
+    )
+
+    return rows[:PAGE_SIZE], len(rows) > PAGE_SIZE
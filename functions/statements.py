@@ -0,0 +1,92 @@
+"""This module contains functions to read bank statements saved as CSV
+files. Each line of a statement has a date, a description and an
+amount, where money paid out is negative and money paid in is
+positive. Dates may be written as YYYY-MM-DD or DD/MM/YYYY and a
+header line is skipped.
+"""
+
+import csv
+import datetime
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+
+# Dates already converted, as a statement has many lines on each day
+_parsed_dates = {}
+
+
+def read_statement(path):
+    """This function reads the lines of a statement one at a time.
+
+    :param path: path to CSV file
+    :return: (date as YYYY-MM-DD, description, amount) for each line
+    :rtype: generator of tuples
+    """
+    with open(path, newline="", encoding="utf-8-sig") as statement:
+        for line in csv.reader(statement):
+            transaction = parse_line(line)
+            if transaction:
+                yield transaction
+
+
+def parse_line(line):
+    """This function gets the date, description and amount from one
+    line of a statement.
+
+    :param line: list of fields from CSV file
+    :return: (date, description, amount) or None if line is not a
+        transaction
+    :rtype: tuple or None
+    """
+    if len(line) < 3:
+        return None
+
+    date = parse_date(line[0].strip())
+    try:
+        amount = float(line[2].replace(",", "").replace("£", "").strip())
+    except ValueError:
+        return None
+
+    if not date:
+        return None
+
+    return date, line[1].strip(), amount
+
+
+def parse_date(text):
+    """This function converts a date from a statement to YYYY-MM-DD.
+
+    :param text: date as written in statement
+    :return: date as YYYY-MM-DD or None if not a date
+    :rtype: str or None
+    """
+    if text in _parsed_dates:
+        return _parsed_dates[text]
+
+    parsed = None
+    for date_format in DATE_FORMATS:
+        try:
+            date = datetime.datetime.strptime(text, date_format)
+            parsed = date.strftime("%Y-%m-%d")
+            break
+        except ValueError:
+            continue
+
+    _parsed_dates[text] = parsed
+    return parsed
+
+
+def get_payments(transactions):
+    """This function gets the money paid out from statement lines as
+    expenses with positive amounts.
+
+    :param transactions: (date, description, amount) for each line
+    :return: (date, description, amount) for each payment
+    :rtype: list of tuples
+    """
+    payments = []
+
+    for date, description, amount in transactions:
+        if amount < 0:
+            payments.append((date, description, round(-amount, 2)))
+
+    return payments
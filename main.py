@@ -1,8 +1,11 @@
 """This module contains the entry point for the Budget and Expenses
-Tracker App.
+Tracker App. Run it with --ledger and an id to use that user's own
+ledger rather than finances.db.
 """
 
+import argparse
 import os
+from database import ledgers
 from menu import main_menu
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -11,6 +14,13 @@ os.chdir(script_dir)
 
 def main():
     """This function is the main entry point of the programme."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ledger", help="id of user or ledger to open")
+    args = parser.parse_args()
+
+    if args.ledger:
+        ledgers.open_ledger(args.ledger)
+
     main_menu.main_menu()
 
 
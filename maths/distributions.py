@@ -0,0 +1,250 @@
+"""This module describes how much is spent on each expense, such as the
+median, percentiles and a histogram of expenses in a category. A
+t-digest of the expenses in each category is kept for each month and
+saved in the database. Statistics for a range of months, or for a
+category and its subcategories, come from merging those digests rather
+than from reading and sorting every expense.
+
+Digests are brought up to date with only the expenses entered since
+they were last saved, and are worked out again from the first expense
+if any they include have since been deleted.
+"""
+
+import datetime
+import json
+from dateutil.relativedelta import relativedelta
+from database import database_commands as dc
+from functions import common_functions as cf
+from maths import streaming
+
+PERCENTILES = (10, 25, 50, 75, 90, 95)
+HISTOGRAM_BINS = 8
+# Percentile at which the last bin of a histogram starts
+HISTOGRAM_TOP = 95
+BAR_WIDTH = 40
+BAR = "█"
+
+
+def get_month(date):
+    """This function gets the month of a date, including dates stored
+    without leading zeros such as 2024-1-5.
+
+    :param date: date as YYYY-MM-DD
+    :return: month as YYYY-MM
+    :rtype: str
+    """
+    year, month = str(date).split()[0].split("-")[:2]
+    return f"{int(year):04d}-{int(month):02d}"
+
+
+def get_months(number):
+    """This function gets the first and last of the last few months,
+    including the current one.
+
+    :param number: number of months
+    :return: first and last month as YYYY-MM
+    :rtype: str, str
+    """
+    today = datetime.date.today()
+    first = today - relativedelta(months=number - 1)
+
+    return first.strftime("%Y-%m"), today.strftime("%Y-%m")
+
+
+def update():
+    """This function adds the expenses entered since the digests were
+    last saved to the digest of their category and month, and saves the
+    digests which have changed.
+
+    :return: number of expenses added
+    :rtype: int
+    """
+    new_rows, scan, rebuilt = dc.get_expenses_to_add(dc.get_sketch_scan())
+    if not new_rows and not rebuilt:
+        return 0
+
+    amounts = {}
+    for _, date, _, amount, category_id, _ in new_rows:
+        key = (get_month(date), category_id)
+        amounts.setdefault(key, []).append(amount)
+
+    digests = {}
+    if amounts and not rebuilt:
+        months = [month for month, _ in amounts]
+        for month, category_id, sketch in dc.get_sketches(
+            min(months), max(months)
+        ):
+            digests[(month, category_id)] = streaming.digest_from_dict(
+                json.loads(sketch)
+            )
+
+    sketches = []
+    for key, values in amounts.items():
+        digest = digests.get(key) or streaming.TDigest()
+        for amount in values:
+            digest.add(amount)
+        sketches.append((*key, json.dumps(digest.to_dict())))
+
+    dc.save_sketches(scan, sketches, rebuilt)
+
+    return len(new_rows)
+
+
+def get_monthly_digests(first_month, last_month, category_ids=None):
+    """This function gets a digest of the expenses in each month between
+    two months.
+
+    :param first_month: first month as YYYY-MM
+    :param last_month: last month as YYYY-MM
+    :param category_ids: category ids to include or None for all
+    :return: digest with month as keys
+    :rtype: dict
+    """
+    digests = {}
+
+    for month, category_id, sketch in dc.get_sketches(first_month, last_month):
+        if category_ids is None or category_id in category_ids:
+            digest = digests.setdefault(month, streaming.TDigest())
+            digest.merge(streaming.digest_from_dict(json.loads(sketch)))
+
+    return dict(sorted(digests.items()))
+
+
+def get_digest(first_month, last_month, category_ids=None):
+    """This function gets a digest of all expenses between two months.
+
+    :param first_month: first month as YYYY-MM
+    :param last_month: last month as YYYY-MM
+    :param category_ids: category ids to include or None for all
+    :return: digest
+    :rtype: TDigest
+    """
+    digest = streaming.TDigest()
+
+    for month_digest in get_monthly_digests(
+        first_month, last_month, category_ids
+    ).values():
+        digest.merge(month_digest)
+
+    return digest
+
+
+def get_percentiles(digest, percentiles=PERCENTILES):
+    """This function gets percentiles of the expenses in a digest.
+
+    :param digest: digest of expenses
+    :param percentiles: percentiles from 0 to 100 (default = PERCENTILES)
+    :return: amount with percentile as keys, or {} with no expenses
+    :rtype: dict
+    """
+    if not digest.count:
+        return {}
+
+    return {
+        percentile: round(digest.get_quantile(percentile / 100), 2)
+        for percentile in percentiles
+    }
+
+
+def get_summary(digest):
+    """This function gets the number, total, mean, median, smallest and
+    largest of the expenses in a digest.
+
+    :param digest: digest of expenses
+    :return: values with keys 'count', 'total', 'mean', 'median', 'min'
+        and 'max', or None with no expenses
+    :rtype: dict or None
+    """
+    if not digest.count:
+        return None
+
+    return {
+        "count": digest.count,
+        "total": round(digest.total, 2),
+        "mean": round(digest.total / digest.count, 2),
+        "median": round(digest.get_quantile(0.5), 2),
+        "min": round(digest.minimum, 2),
+        "max": round(digest.maximum, 2),
+    }
+
+
+def get_histogram(digest, bins=HISTOGRAM_BINS):
+    """This function gets the number of expenses in bins of equal width
+    from the smallest expense up to the HISTOGRAM_TOP percentile, and in
+    one last bin for the largest expenses.
+
+    :param digest: digest of expenses
+    :param bins: number of bins (default = HISTOGRAM_BINS)
+    :return: (lowest amount, highest amount, number of expenses) for
+        each bin, or [] with no expenses
+    :rtype: list of tuples
+    """
+    if not digest.count:
+        return []
+
+    low = digest.minimum
+    top = digest.get_quantile(HISTOGRAM_TOP / 100)
+    width = (top - low) / (bins - 1)
+    if width <= 0:
+        return [(round(low, 2), round(digest.maximum, 2), digest.count)]
+
+    edges = [low + width * i for i in range(bins)] + [digest.maximum]
+    counts = digest.get_histogram(edges)
+
+    return [
+        (round(edges[i], 2), round(edges[i + 1], 2), counts[i])
+        for i in range(bins)
+    ]
+
+
+def print_distribution(first_month, last_month, category_ids=None):
+    """This function prints the summary, percentiles and histogram of the
+    expenses between two months, and the median and mean of each month.
+
+    :param first_month: first month as YYYY-MM
+    :param last_month: last month as YYYY-MM
+    :param category_ids: category ids to include or None for all
+    :return: None
+    """
+    update()
+    monthly = get_monthly_digests(first_month, last_month, category_ids)
+    digest = streaming.TDigest()
+    for month_digest in monthly.values():
+        digest.merge(month_digest)
+
+    summary = get_summary(digest)
+    if summary is None:
+        print(cf.NO_RESULTS)
+        return
+
+    count = summary["count"]
+    print(f"\nExpenses from {first_month} to {last_month}: {count}")
+    for key in ("total", "mean", "median", "min", "max"):
+        print(f"{key.capitalize():<10}{cf.money_format(summary[key]):>12}")
+
+    print("\nPercentile")
+    for percentile, amount in get_percentiles(digest).items():
+        print(f"{percentile:<10}{cf.money_format(amount):>12}")
+
+    print("\nAmount")
+    histogram = get_histogram(digest)
+    most = max(count for _, _, count in histogram) or 1
+    for low, high, count in histogram:
+        bar = BAR * round(count / most * BAR_WIDTH)
+        print(f"{low:>9,.2f} - {high:>9,.2f} {count:>6} {bar}")
+
+    print()
+    print(
+        "Month".ljust(10)
+        + "Expenses".rjust(10)
+        + "Median".rjust(12)
+        + "Mean".rjust(12)
+    )
+    for month, month_digest in monthly.items():
+        month_summary = get_summary(month_digest)
+        print(
+            month.ljust(10)
+            + str(month_summary["count"]).rjust(10)
+            + cf.money_format(month_summary["median"]).rjust(12)
+            + cf.money_format(month_summary["mean"]).rjust(12)
+        )
@@ -0,0 +1,176 @@
+"""This module projects how much will have been spent in each category,
+or earned from each source, by the end of the current week, month or
+year. A projection is the amount so far, plus recurring payments still
+due before the end of the term, plus an estimate of everything else.
+
+The estimate blends two rates for spending which doesn't recur. One
+is the run-rate of the term so far. The other is the exponentially
+smoothed total of past terms. The run-rate counts for more as the term
+goes on. Every category is worked out at once with NumPy arrays of
+term totals, which come from one grouped query.
+"""
+
+import datetime
+import numpy as np
+from database import database_commands as dc
+from functions import date_functions as df, pivot, recurring
+
+# Past terms used for the smoothed total
+HISTORY = {"weekly": 12, "monthly": 12, "annual": 3}
+# Weight of the latest term when smoothing past terms
+ALPHA = 0.3
+
+
+def smooth(history, alpha=ALPHA):
+    """This function gets the exponentially smoothed value of each row
+    of a table of past totals.
+
+    :param history: array with a row for each category and a column
+        for each past term, oldest first
+    :param alpha: weight of the latest term (default = ALPHA)
+    :return: smoothed total of each category
+    :rtype: NumPy array
+    """
+    if not history.shape[1]:
+        return np.zeros(history.shape[0])
+
+    level = history[:, 0].astype(float)
+    for column in history.T[1:]:
+        level = alpha * column + (1 - alpha) * level
+
+    return level
+
+
+def project(so_far, recurring_so_far, recurring_left, smoothed, fraction):
+    """This function projects the total of each category at the end of
+    the term.
+
+    :param so_far: total so far this term
+    :param recurring_so_far: part of so_far from recurring payments
+    :param recurring_left: recurring payments due later this term
+    :param smoothed: smoothed total of past terms
+    :param fraction: part of the term which has passed, above 0
+    :return: projected total at the end of the term
+    :rtype: NumPy array
+    """
+    other_so_far = so_far - recurring_so_far
+    run_rate = other_so_far / fraction
+    # Past totals include recurring payments, which are added separately
+    past_rate = np.maximum(smoothed - recurring_so_far - recurring_left, 0)
+
+    # With no past terms to go on only the run-rate can be used
+    weight = np.where(smoothed > 0, fraction, 1.0)
+    rate = weight * run_rate + (1 - weight) * past_rate
+    other_left = (1 - fraction) * rate
+
+    return so_far + recurring_left + np.maximum(other_left, 0)
+
+
+def get_term_dates(term):
+    """This function gets the first and last day of the current term.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: first and last day of term
+    :rtype: date, date
+    """
+    first_day = datetime.date.fromisoformat(df.get_term_start(term))
+    last_day = first_day + pivot.STEPS[term] - datetime.timedelta(days=1)
+
+    return first_day, last_day
+
+
+def get_recurring_totals(table, first_day, today, last_day):
+    """This function adds up the occurrences of recurring payments this
+    term for each category or source.
+
+    :param table: 'expenses' or 'income'
+    :param first_day: first day of term as YYYY-MM-DD
+    :param today: today's date as YYYY-MM-DD
+    :param last_day: last day of term as YYYY-MM-DD
+    :return: totals up to today and totals after today, with category
+        or source id as keys
+    :rtype: dict, dict
+    """
+    so_far = {}
+    left = {}
+
+    for item in dc.get_recurring():
+        if item[1] != table:
+            continue
+        for date in recurring.get_dates_between(item, first_day, last_day):
+            totals = so_far if date <= today else left
+            totals[item[4]] = totals.get(item[4], 0) + item[3]
+
+    return so_far, left
+
+
+def forecast(term, table="expenses"):
+    """This function projects the total of each category, or source for
+    income, at the end of the current term.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param table: 'expenses' or 'income' (default = 'expenses')
+    :return: projected total with category or source id as keys
+    :rtype: dict
+    """
+    today = datetime.date.today()
+    first_day, last_day = get_term_dates(term)
+    fraction = ((today - first_day).days + 1) / (
+        (last_day - first_day).days + 1
+    )
+
+    step = pivot.STEPS[term]
+    starts = [first_day - step * i for i in range(HISTORY[term], 0, -1)]
+    periods = [start.strftime(pivot.PERIOD_FORMATS[term]) for start in starts]
+    periods.append(first_day.strftime(pivot.PERIOD_FORMATS[term]))
+    columns = {period: i for i, period in enumerate(periods)}
+
+    now = today.strftime("%Y-%m-%d")
+    totals = dc.get_pivot_totals(
+        term, starts[0].strftime("%Y-%m-%d"), now, table
+    )
+    recurring_so_far, recurring_left = get_recurring_totals(
+        table,
+        first_day.strftime("%Y-%m-%d"),
+        now,
+        last_day.strftime("%Y-%m-%d"),
+    )
+
+    ids = {row[0] for row in totals}
+    ids = sorted((ids | set(recurring_so_far) | set(recurring_left)) - {None})
+    if not ids:
+        return {}
+    rows = {category_id: i for i, category_id in enumerate(ids)}
+
+    table_totals = np.zeros((len(ids), len(periods)))
+    for category_id, period, total in totals:
+        if category_id in rows and period in columns:
+            table_totals[rows[category_id], columns[period]] += total
+
+    def to_array(amounts):
+        return np.array([amounts.get(category_id, 0) for category_id in ids])
+
+    projected = project(
+        table_totals[:, -1],
+        to_array(recurring_so_far),
+        to_array(recurring_left),
+        smooth(table_totals[:, :-1]),
+        fraction,
+    )
+
+    return {
+        category_id: round(float(amount), 2)
+        for category_id, amount in zip(ids, projected)
+    }
+
+
+def forecast_total(term, table="expenses"):
+    """This function projects the total spending, or income, at the end
+    of the current term.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param table: 'expenses' or 'income' (default = 'expenses')
+    :return: projected total
+    :rtype: float
+    """
+    return round(sum(forecast(term, table).values()), 2)
@@ -4,7 +4,9 @@ week in the year so far, it draws a line of best fit for the cumulative
 average spending for each week and it draws a horizontal line for the
 target budget.  Similarly, for gross or net income it plots income in
 a scatter graph, draws a line showing the cumulative average income for
-each week and a horizontal line showing the target income.
+each week and a horizontal line showing the target income. A shaded
+band can show the range of averages in simulated years to the end of
+the year.
 """
 
 from matplotlib import pyplot as plt
@@ -12,13 +14,18 @@ import numpy as np
 from functions import common_functions as cf
 
 
-def make_plot(common_args, goal_args, labels):
+def make_plot(common_args, goal_args, labels, projection=None, band=None):
     """This function plots a graph to show progress in a financial
     goal
 
     :param common_args: tuple with arguments common to all goals
     :param goal_args: tuple with goal-specific arguments
     :param labels: tuple with strings for labels relevant to goal
+    :param projection: x and y coordinates of a dashed line to the
+        average projected at the end of the year (default = None)
+    :param band: week numbers, lower and upper averages of simulated
+        years, and the chance of meeting the goal or None
+        (default = None)
     :return: None
     """
     year, x_coords = common_args
@@ -26,7 +33,10 @@ def make_plot(common_args, goal_args, labels):
 
     plt.style.use("seaborn-v0_8-paper")
     _, ax = plt.subplots()
-    plt.title(f"{labels[0]} Progress for {year}")
+    title = f"{labels[0]} Progress for {year}"
+    if band and band[3] is not None:
+        title += f" ({band[3]:.0%} chance of meeting {labels[2].lower()})"
+    plt.title(title)
     plt.xlabel("Weeks")
     plt.ylabel("Amount (£)")
 
@@ -43,6 +53,26 @@ def make_plot(common_args, goal_args, labels):
     y2 = a * x + b
     ax.plot(x, y2, color="b", label=f"Average {labels[1]}")
 
+    # Plot dashed line to the average projected at the end of the year
+    if projection:
+        ax.plot(
+            *projection,
+            color="b",
+            linestyle="--",
+            label=f"Projected {labels[1]}",
+        )
+
+    # Shade the range of averages from simulated years
+    if band:
+        ax.fill_between(
+            band[0],
+            band[1],
+            band[2],
+            color="b",
+            alpha=0.1,
+            label=f"Simulated {labels[1]}",
+        )
+
     # Plot line y = target
     y1 = target
 
@@ -0,0 +1,208 @@
+"""This module estimates the chance of meeting each annual financial
+goal by simulating the rest of the year many times. Each simulated
+year adds weeks drawn at random, with replacement, from the weeks of
+the last two years to the income and spending so far this year. Income
+and spending are drawn from the same week, so that weeks when both are
+high stay together. Every path is simulated at once with NumPy arrays
+of a row for each path and a column for each week.
+"""
+
+import datetime
+import numpy as np
+from database import database_commands as dc
+
+PATHS = 10000
+# Past weeks drawn from, ending the week before this one
+HISTORY_WEEKS = 104
+# Percentiles of simulated paths drawn as a band around the projection
+BAND = (5, 95)
+
+
+class Simulation:
+    """This class represents simulated totals of income and spending
+    for each week left in the year.
+
+    Attributes
+    ----------
+    weeks_done : int
+        weeks of the year so far, including this one
+    income : NumPy array
+        total income by the end of each week left, with a row for each
+        path and a first column for the total so far
+    spending : NumPy array
+        total spending by the end of each week left, as for income
+
+    Methods
+    ----------
+    get_totals:
+        returns the simulated totals for a goal
+    get_chance:
+        returns the chance of meeting a goal
+    get_range:
+        returns the band and median of year-end totals for a goal
+    get_band:
+        returns the band of weekly averages to draw on a graph
+    """
+
+    def __init__(self, weeks_done, income, spending):
+        """Constructs a simulation from its paths."""
+        self.weeks_done = weeks_done
+        self.income = income
+        self.spending = spending
+
+    def get_totals(self, goal):
+        """This method gets the simulated totals for a goal by the end
+        of each week left.
+
+        :param self: Simulation object
+        :param goal: 'gross income', 'net income' or 'budget'
+        :return: totals with a row for each path
+        :rtype: NumPy array
+        """
+        if goal == "gross income":
+            return self.income
+        if goal == "budget":
+            return self.spending
+
+        return self.income - self.spending
+
+    def get_chance(self, goal, target):
+        """This method gets the chance of meeting an annual goal, which
+        for a budget is spending no more than it.
+
+        :param self: Simulation object
+        :param goal: 'gross income', 'net income' or 'budget'
+        :param target: annual goal amount
+        :return: fraction of paths meeting the goal
+        :rtype: float
+        """
+        totals = self.get_totals(goal)[:, -1]
+        if goal == "budget":
+            return float(np.mean(totals <= target))
+
+        return float(np.mean(totals >= target))
+
+    def get_range(self, goal):
+        """This method gets the band and median of the simulated totals
+        at the end of the year.
+
+        :param self: Simulation object
+        :param goal: 'gross income', 'net income' or 'budget'
+        :return: lower end of band, median and upper end of band
+        :rtype: tuple of floats
+        """
+        totals = self.get_totals(goal)[:, -1]
+        low, median, high = np.percentile(totals, (BAND[0], 50, BAND[1]))
+
+        return round(float(low), 2), round(float(median), 2), round(
+            float(high), 2
+        )
+
+    def get_band(self, goal):
+        """This method gets the band of the simulated average weekly
+        amount from this week to the end of the year, to draw around
+        the projection on a graph.
+
+        :param self: Simulation object
+        :param goal: 'gross income', 'net income' or 'budget'
+        :return: week numbers, lower and upper ends of band
+        :rtype: NumPy arrays
+        """
+        x = np.arange(self.weeks_done, self.weeks_done + self.income.shape[1])
+        averages = self.get_totals(goal) / x
+        low, high = np.percentile(averages, BAND, axis=0)
+
+        return x, low, high
+
+
+def get_week_number(date, first_day):
+    """This function gets the week a date falls in, counting from the
+    week starting on a day. Dates stored without leading zeros, such as
+    2024-1-5, are read as well.
+
+    :param date: date as YYYY-MM-DD
+    :param first_day: first day of week 0
+    :return: week number
+    :rtype: int
+    """
+    year, month, day = str(date).split()[0].split("-")
+    days = datetime.date(int(year), int(month), int(day)) - first_day
+
+    return days.days // 7
+
+
+def get_history(this_week, weeks=HISTORY_WEEKS):
+    """This function gets the total income and spending of each of the
+    weeks before this week. Weeks before the first with any income or
+    spending are left out.
+
+    :param this_week: first day of this week
+    :param weeks: number of past weeks (default = HISTORY_WEEKS)
+    :return: income and spending of each week, oldest first
+    :rtype: NumPy array, NumPy array
+    """
+    first_day = this_week - datetime.timedelta(weeks=weeks)
+    last_day = this_week - datetime.timedelta(days=1)
+    totals = []
+
+    for table in ("income", "expenses"):
+        rows = dc.get_amounts_between(
+            table,
+            first_day.strftime("%Y-%m-%d"),
+            last_day.strftime("%Y-%m-%d"),
+        )
+        numbers = []
+        amounts = []
+        for date, amount in rows:
+            # Dates without leading zeros can be outside the range
+            number = get_week_number(date, first_day)
+            if 0 <= number < weeks:
+                numbers.append(number)
+                amounts.append(float(amount))
+        totals.append(
+            np.bincount(
+                np.array(numbers, dtype=int), weights=amounts, minlength=weeks
+            )
+        )
+
+    income, spending = totals
+    used = np.flatnonzero(income + spending)
+    if not len(used):
+        return income[:0], spending[:0]
+
+    return income[used[0]:], spending[used[0]:]
+
+
+def simulate(so_far, weeks_done, weeks_left, history, paths=PATHS, seed=None):
+    """This function simulates the income and spending of the weeks left
+    in the year by drawing past weeks at random.
+
+    :param so_far: income and spending so far this year
+    :param weeks_done: weeks of the year so far, including this one
+    :param weeks_left: weeks left in the year
+    :param history: income and spending of each past week, from
+        get_history
+    :param paths: number of simulated years (default = PATHS)
+    :param seed: seed for the random numbers, for repeatable results
+        (default = None)
+    :return: simulation, or None if there are no past weeks
+    :rtype: Simulation or None
+    """
+    income_weeks, spending_weeks = history
+    if not len(income_weeks):
+        return None
+
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(income_weeks), size=(paths, weeks_left))
+
+    def get_paths(total, weekly):
+        # A first column of zeros gives the total so far on every path
+        drawn = np.zeros((paths, weeks_left + 1))
+        np.cumsum(weekly[picks], axis=1, out=drawn[:, 1:])
+        return drawn + total
+
+    return Simulation(
+        weeks_done,
+        get_paths(so_far[0], income_weeks),
+        get_paths(so_far[1], spending_weeks),
+    )
@@ -0,0 +1,352 @@
+"""This module keeps a copy of the expenses and income tables as NumPy
+arrays, one file for each column, for analysis over many years. The
+files are opened memory mapped so that totals by month, year or
+category are worked out over whole columns at once without reading
+rows from the database into Python.
+
+Each expense, or share of a split expense, has its id, day, month,
+amount in pence, category, account and the number of its description
+in a table of descriptions. Income has a source in place of category
+and description. Days are counted from 1970-01-01 and months from
+January 1970.
+
+A snapshot is brought up to date by adding the rows entered since the
+last row it holds. It is taken again from the start if rows it holds
+have since been deleted. Run it from the programme folder with
+
+    python -m maths.snapshot [folder]
+"""
+
+import json
+import os
+import sys
+import time
+import numpy as np
+from database import database_commands as dc
+
+# Folder next to the database file which holds its snapshot
+SNAPSHOT_SUFFIX = ".snapshot"
+META_FILE = "snapshot.json"
+COLUMNS = {
+    "expenses": (
+        ("id", np.int64),
+        ("day", np.int32),
+        ("month", np.int32),
+        ("amount", np.int64),
+        ("category", np.int32),
+        ("account", np.int32),
+        ("description", np.int32),
+    ),
+    "income": (
+        ("id", np.int64),
+        ("day", np.int32),
+        ("month", np.int32),
+        ("amount", np.int64),
+        ("source", np.int32),
+        ("account", np.int32),
+    ),
+}
+DESCRIPTIONS = "descriptions"
+# Stands for a missing category, source or account
+NONE_ID = -1
+
+
+def get_folder(folder=None):
+    """This function gets the folder of the snapshot of the database
+    used by the current thread.
+
+    :param folder: folder to use instead (default = None)
+    :return: path to folder
+    :rtype: str
+    """
+    return folder or dc.get_database() + SNAPSHOT_SUFFIX
+
+
+def get_file(folder, table, column):
+    """This function gets the file holding a column of a table.
+
+    :param folder: snapshot folder
+    :param table: 'expenses' or 'income'
+    :param column: column name
+    :return: path to file
+    :rtype: str
+    """
+    return os.path.join(folder, f"{table}_{column}.npy")
+
+
+def read_meta(folder):
+    """This function reads the last id and number of rows held for each
+    table.
+
+    :param folder: snapshot folder
+    :return: {'last_id': int, 'rows': int} with table as keys
+    :rtype: dict
+    """
+    try:
+        with open(os.path.join(folder, META_FILE), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_array(path, array):
+    """This function saves an array, replacing the file only once it is
+    written so that a reader never sees half a file.
+
+    :param path: path to file
+    :param array: NumPy array
+    :return: None
+    """
+    temp = path + ".tmp"
+    with open(temp, "wb") as file:
+        np.save(file, array)
+    os.replace(temp, path)
+
+
+def to_columns(table, rows, descriptions):
+    """This function turns rows from the database into columns.
+
+    :param table: 'expenses' or 'income'
+    :param rows: rows from stream_rows_after
+    :param descriptions: number of each description with description
+        as keys, added to for new descriptions
+    :return: arrays with column name as keys
+    :rtype: dict
+    """
+    if table == "expenses":
+        names = ("id", "date", "description", "amount", "category")
+    else:
+        names = ("id", "date", "source", "amount")
+    values = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+    values["account"] = [row[-1] for row in rows]
+
+    # Some dates are stored without leading zeros, such as 2024-1-5
+    parts = np.array(
+        [str(date).split()[0].split("-") for date in values.pop("date")],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    months = (parts[:, 0] - 1970) * 12 + parts[:, 1] - 1
+    values["month"] = months
+    values["day"] = months.astype("M8[M]").astype("M8[D]").astype(
+        np.int64
+    ) + (parts[:, 2] - 1)
+    values["amount"] = np.rint(np.array(values["amount"], float) * 100)
+    for name in ("category", "source", "account"):
+        if name in values:
+            values[name] = [NONE_ID if i is None else i for i in values[name]]
+    if table == "expenses":
+        values["description"] = [
+            descriptions.setdefault(description, len(descriptions))
+            for description in values["description"]
+        ]
+
+    return {
+        column: np.asarray(values[column], dtype=dtype)
+        for column, dtype in COLUMNS[table]
+    }
+
+
+def refresh_table(folder, table, meta):
+    """This function adds the rows of a table entered since the snapshot
+    was last brought up to date.
+
+    :param folder: snapshot folder
+    :param table: 'expenses' or 'income'
+    :param meta: last id and number of rows held for each table,
+        updated for this table
+    :return: number of rows added
+    :rtype: int
+    """
+    held = meta.get(table, {"last_id": 0, "rows": 0})
+    taken = table in meta
+
+    # Rows deleted since the last snapshot mean it must be taken again
+    if held["rows"]:
+        if dc.count_rows_up_to(table, held["last_id"]) != held["rows"]:
+            held = {"last_id": 0, "rows": 0}
+            taken = False
+
+    rows = list(dc.stream_rows_after(table, held["last_id"]))
+    if not rows and taken:
+        return 0
+
+    descriptions = {}
+    if table == "expenses" and held["rows"]:
+        path = get_file(folder, table, DESCRIPTIONS)
+        for i, description in enumerate(np.load(path)):
+            descriptions[str(description)] = i
+
+    new = to_columns(table, rows, descriptions)
+    for column, array in new.items():
+        path = get_file(folder, table, column)
+        if held["rows"]:
+            # Files can hold rows written after the meta file was saved
+            old = np.load(path, mmap_mode="r")[: held["rows"]]
+            array = np.concatenate([old, array])
+        save_array(path, array)
+
+    if table == "expenses":
+        save_array(
+            get_file(folder, table, DESCRIPTIONS),
+            np.array(list(descriptions), dtype=str),
+        )
+
+    last_id = int(new["id"].max()) if rows else held["last_id"]
+    meta[table] = {"last_id": last_id, "rows": held["rows"] + len(rows)}
+
+    return len(rows)
+
+
+def refresh(folder=None):
+    """This function brings the snapshot of the database up to date,
+    taking it for the first time if there is none.
+
+    :param folder: snapshot folder (default = None for the folder next
+        to the database file)
+    :return: number of rows added with table as keys
+    :rtype: dict
+    """
+    folder = get_folder(folder)
+    os.makedirs(folder, exist_ok=True)
+    meta = read_meta(folder)
+    added = {table: refresh_table(folder, table, meta) for table in COLUMNS}
+
+    path = os.path.join(folder, META_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+    os.replace(path + ".tmp", path)
+
+    return added
+
+
+def load(table, folder=None):
+    """This function opens the columns of a table from the snapshot,
+    memory mapped so that only the parts used are read from disk.
+
+    :param table: 'expenses' or 'income'
+    :param folder: snapshot folder (default = None for the folder next
+        to the database file)
+    :return: arrays with column name as keys, and 'descriptions' for
+        expenses
+    :rtype: dict
+    """
+    folder = get_folder(folder)
+    rows = read_meta(folder).get(table, {"rows": 0})["rows"]
+    columns = {}
+
+    for column, dtype in COLUMNS[table]:
+        if rows:
+            path = get_file(folder, table, column)
+            columns[column] = np.load(path, mmap_mode="r")[:rows]
+        else:
+            columns[column] = np.zeros(0, dtype=dtype)
+
+    if table == "expenses":
+        path = get_file(folder, table, DESCRIPTIONS)
+        columns[DESCRIPTIONS] = np.load(path) if rows else np.zeros(0, str)
+
+    return columns
+
+
+def to_day(date):
+    """This function gets the day number of a date.
+
+    :param date: date as YYYY-MM-DD
+    :return: days since 1970-01-01
+    :rtype: int
+    """
+    return int(np.datetime64(str(date)[:10], "D").astype(np.int64))
+
+
+def get_mask(columns, first_day=None, last_day=None):
+    """This function selects the rows between two dates.
+
+    :param columns: columns from load
+    :param first_day: first date as YYYY-MM-DD or None for no start
+    :param last_day: last date as YYYY-MM-DD or None for no end
+    :return: True for each row between the dates
+    :rtype: NumPy array of bool
+    """
+    mask = np.ones(len(columns["id"]), dtype=bool)
+    if first_day is not None:
+        mask &= columns["day"] >= to_day(first_day)
+    if last_day is not None:
+        mask &= columns["day"] <= to_day(last_day)
+
+    return mask
+
+
+def totals_by(columns, key, first_day=None, last_day=None):
+    """This function adds up amounts grouped by a column, or by year.
+
+    :param columns: columns from load
+    :param key: column name, such as 'category' or 'month', or 'year'
+    :param first_day: first date as YYYY-MM-DD or None for no start
+    :param last_day: last date as YYYY-MM-DD or None for no end
+    :return: total in pounds with key value as keys
+    :rtype: dict
+    """
+    mask = get_mask(columns, first_day, last_day)
+    if key == "year":
+        values = columns["month"][mask] // 12 + 1970
+    else:
+        values = columns[key][mask]
+
+    keys, groups = np.unique(values, return_inverse=True)
+    totals = np.bincount(groups, weights=columns["amount"][mask])
+
+    return {
+        int(value): round(float(total) / 100, 2)
+        for value, total in zip(keys, totals)
+    }
+
+
+def year_over_year(columns, key=None, value=None):
+    """This function gets the total for each month of every year, for
+    comparing the same month across years.
+
+    :param columns: columns from load
+    :param key: column to filter by, such as 'category' (default = None)
+    :param value: value of column to keep (default = None)
+    :return: 12 monthly totals in pounds with year as keys
+    :rtype: dict
+    """
+    months = columns["month"]
+    amounts = columns["amount"]
+    if key is not None:
+        mask = columns[key] == value
+        months = months[mask]
+        amounts = amounts[mask]
+    if not len(months):
+        return {}
+
+    first = int(months.min()) // 12 * 12
+    totals = np.bincount(months - first, weights=amounts)
+    totals = np.pad(totals, (0, -len(totals) % 12)).reshape(-1, 12)
+
+    return {
+        first // 12 + 1970 + i: [round(float(t) / 100, 2) for t in year]
+        for i, year in enumerate(totals)
+    }
+
+
+def main(args):
+    """This function brings the snapshot up to date and prints the rows
+    added.
+
+    :param args: optional snapshot folder
+    :return: None
+    """
+    folder = args[0] if args else None
+    start = time.perf_counter()
+    added = refresh(folder)
+    seconds = time.perf_counter() - start
+
+    for table, rows in added.items():
+        held = read_meta(get_folder(folder))[table]["rows"]
+        print(f"{table}: {rows} rows added, {held} rows held")
+    print(f"Snapshot taken in {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
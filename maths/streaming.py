@@ -0,0 +1,509 @@
+"""This module contains statistics which are kept up to date one value
+at a time, so that they never need the values seen before. RunningStats
+keeps the count, mean and variance with Welford's method, and
+P2Quantile estimates a quantile, such as the median, from five markers
+with the P-squared method of Jain and Chlamtac. Adding a value takes
+the same time however many values have been seen, and each can be
+saved and loaded again later.
+
+TDigest summarises values as a few hundred weighted means, kept close
+together at the extremes and further apart in the middle, as in
+Dunning's t-digest. Two digests can be merged, so a digest kept for
+each month gives percentiles over any range of months without the
+values themselves.
+"""
+
+import math
+
+# Size of a digest, larger for more accurate percentiles
+COMPRESSION = 100
+# Values added before they are merged into a digest's centroids
+BUFFER_SIZE = 500
+
+
+class RunningStats:
+    """This class represents the count, mean and variance of values
+    seen one at a time.
+
+    Attributes
+    ----------
+    count : int
+        number of values seen
+    mean : float
+        mean of values seen
+    m2 : float
+        sum of squared differences from the mean
+
+    Methods
+    ----------
+    add:
+        adds a value
+    get_variance:
+        returns the sample variance
+    get_sd:
+        returns the sample standard deviation
+    get_z_score:
+        returns how many standard deviations a value is above the mean
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        """Constructs statistics, empty or as they were saved."""
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        """This method adds a value to the statistics.
+
+        :param self: RunningStats object
+        :param value: value to add
+        :return: None
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def get_variance(self):
+        """This method gets the sample variance of the values seen.
+
+        :param self: RunningStats object
+        :return: variance, or 0 for fewer than two values
+        :rtype: float
+        """
+        if self.count < 2:
+            return 0.0
+
+        return self.m2 / (self.count - 1)
+
+    def get_sd(self):
+        """This method gets the sample standard deviation of the values
+        seen.
+
+        :param self: RunningStats object
+        :return: standard deviation
+        :rtype: float
+        """
+        return math.sqrt(self.get_variance())
+
+    def get_z_score(self, value):
+        """This method gets how many standard deviations a value is
+        above the mean of the values seen.
+
+        :param self: RunningStats object
+        :param value: value to compare
+        :return: z-score, or None if the values seen don't vary
+        :rtype: float or None
+        """
+        sd = self.get_sd()
+        if not sd:
+            return None
+
+        return (value - self.mean) / sd
+
+
+class P2Quantile:
+    """This class represents an estimate of a quantile of values seen one
+    at a time. The first five values are kept, and after that five
+    markers are moved towards the minimum, the quantile halfway below
+    it, the quantile, the quantile halfway above it and the maximum.
+
+    Attributes
+    ----------
+    p : float
+        quantile estimated, between 0 and 1
+    heights : list of float
+        value at each marker, or the first values seen in order
+    positions : list of float
+        number of values at or below each marker, less one
+    desired : list of float
+        position each marker should be at
+
+    Methods
+    ----------
+    add:
+        adds a value
+    get_estimate:
+        returns the estimated quantile
+    to_dict:
+        returns the estimate as a dict to save
+    """
+
+    def __init__(self, p, heights=None, positions=None, desired=None):
+        """Constructs an estimate, empty or as it was saved."""
+        self.p = p
+        self.heights = heights or []
+        self.positions = positions or [0.0, 1.0, 2.0, 3.0, 4.0]
+        self.desired = desired or [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.steps = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, value):
+        """This method adds a value to the estimate.
+
+        :param self: P2Quantile object
+        :param value: value to add
+        :return: None
+        """
+        heights = self.heights
+
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.steps[i]
+
+        for i in range(1, 4):
+            self.adjust(i)
+
+    def adjust(self, i):
+        """This method moves a middle marker one place towards its
+        desired position if it is a place or more away from it.
+
+        :param self: P2Quantile object
+        :param i: marker number, from 1 to 3
+        :return: None
+        """
+        heights = self.heights
+        positions = self.positions
+        offset = self.desired[i] - positions[i]
+
+        if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (
+            offset <= -1 and positions[i - 1] - positions[i] < -1
+        ):
+            step = 1 if offset > 0 else -1
+            height = self.parabolic(i, step)
+            if not heights[i - 1] < height < heights[i + 1]:
+                height = heights[i] + step * (
+                    heights[i + step] - heights[i]
+                ) / (positions[i + step] - positions[i])
+            heights[i] = height
+            positions[i] += step
+
+    def parabolic(self, i, step):
+        """This method gets the new height of a marker moved one place,
+        from the parabola through it and the markers either side.
+
+        :param self: P2Quantile object
+        :param i: marker number, from 1 to 3
+        :param step: 1 or -1
+        :return: new height
+        :rtype: float
+        """
+        q = self.heights
+        n = self.positions
+
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step)
+            * (q[i + 1] - q[i])
+            / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step)
+            * (q[i] - q[i - 1])
+            / (n[i] - n[i - 1])
+        )
+
+    def get_estimate(self):
+        """This method gets the estimated quantile of the values seen.
+
+        :param self: P2Quantile object
+        :return: estimate, or None if no values have been seen
+        :rtype: float or None
+        """
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            # The exact quantile of the few values kept
+            index = round(self.p * (len(self.heights) - 1))
+            return self.heights[index]
+
+        return self.heights[2]
+
+    def to_dict(self):
+        """This method gets the estimate as a dict which can be saved as
+        JSON.
+
+        :param self: P2Quantile object
+        :return: quantile, heights, positions and desired positions
+        :rtype: dict
+        """
+        return {
+            "p": self.p,
+            "heights": self.heights,
+            "positions": self.positions,
+            "desired": self.desired,
+        }
+
+
+def quantile_from_dict(saved):
+    """This function gets a quantile estimate saved with to_dict.
+
+    :param saved: dict from P2Quantile.to_dict
+    :return: estimate
+    :rtype: P2Quantile
+    """
+    return P2Quantile(
+        saved["p"], saved["heights"], saved["positions"], saved["desired"]
+    )
+
+
+class TDigest:
+    """This class represents a t-digest, which estimates any quantile of
+    the values added to it and can be merged with another digest.
+
+    Attributes
+    ----------
+    compression : int
+        size of digest, larger for more accurate percentiles
+    centroids : list of lists
+        [mean, weight] of each group of values, in order of mean
+    buffer : list of lists
+        [value, weight] added since the centroids were last merged
+    count : int
+        number of values added
+    total : float
+        sum of values added
+    minimum : float
+        smallest value added, or None
+    maximum : float
+        largest value added, or None
+
+    Methods
+    ----------
+    add:
+        adds a value
+    merge:
+        adds every value of another digest
+    compress:
+        merges added values into the centroids
+    get_quantile:
+        returns the estimated quantile
+    get_histogram:
+        returns the number of values between each pair of edges
+    to_dict:
+        returns the digest as a dict to save
+    """
+
+    def __init__(
+        self,
+        compression=COMPRESSION,
+        centroids=None,
+        count=0,
+        total=0.0,
+        minimum=None,
+        maximum=None,
+    ):
+        """Constructs a digest, empty or as it was saved."""
+        self.compression = compression
+        self.centroids = centroids or []
+        self.buffer = []
+        self.count = count
+        self.total = total
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value, weight=1):
+        """This method adds a value to the digest.
+
+        :param self: TDigest object
+        :param value: value to add
+        :param weight: number of times value is added (default = 1)
+        :return: None
+        """
+        self.buffer.append([value, weight])
+        self.count += weight
+        self.total += value * weight
+
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.compress()
+
+    def merge(self, other):
+        """This method adds every value of another digest to the digest.
+
+        :param self: TDigest object
+        :param other: digest to merge
+        :return: None
+        """
+        if not other.count:
+            return
+
+        other.compress()
+        self.buffer.extend([mean, weight] for mean, weight in other.centroids)
+        self.count += other.count
+        self.total += other.total
+
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.compress()
+
+    def get_limit(self, done, weight):
+        """This method gets the most weight the centroids up to and
+        including the next one can have, so that centroids near the
+        extremes stay small.
+
+        :param self: TDigest object
+        :param done: weight of centroids before the next one
+        :param weight: weight of the whole digest
+        :return: weight limit
+        :rtype: float
+        """
+        scale = self.compression / (2 * math.pi)
+        k = scale * math.asin(2 * done / weight - 1) + 1
+
+        if k / scale >= math.pi / 2:
+            return weight
+
+        return (math.sin(k / scale) + 1) / 2 * weight
+
+    def compress(self):
+        """This method merges the values added since it was last called
+        into the centroids.
+
+        :param self: TDigest object
+        :return: None
+        """
+        if not self.buffer:
+            return
+
+        points = sorted(self.centroids + self.buffer)
+        weight = sum(point[1] for point in points)
+        merged = [list(points[0])]
+        done = 0
+        limit = self.get_limit(done, weight)
+
+        for mean, point_weight in points[1:]:
+            current = merged[-1]
+            if done + current[1] + point_weight <= limit:
+                current[1] += point_weight
+                current[0] += (mean - current[0]) * point_weight / current[1]
+            else:
+                done += current[1]
+                limit = self.get_limit(done, weight)
+                merged.append([mean, point_weight])
+
+        self.centroids = merged
+        self.buffer = []
+
+    def get_quantile(self, q):
+        """This method estimates a quantile of the values added. Each
+        centroid's weight is taken to be centred on its mean, and the
+        quantile is found between the two nearest means.
+
+        :param self: TDigest object
+        :param q: quantile, between 0 and 1
+        :return: estimate, or None if no values have been added
+        :rtype: float or None
+        """
+        self.compress()
+        if not self.centroids:
+            return None
+
+        centroids = self.centroids
+        target = q * self.count
+        first_mean, first_weight = centroids[0]
+        last_mean, last_weight = centroids[-1]
+
+        if target <= first_weight / 2:
+            if first_weight == 1:
+                return first_mean
+            return self.minimum + (first_mean - self.minimum) * target / (
+                first_weight / 2
+            )
+        if target >= self.count - last_weight / 2:
+            if last_weight == 1:
+                return last_mean
+            return self.maximum - (self.maximum - last_mean) * (
+                self.count - target
+            ) / (last_weight / 2)
+
+        centre = first_weight / 2
+        for (mean, weight), (next_mean, next_weight) in zip(
+            centroids, centroids[1:]
+        ):
+            next_centre = centre + (weight + next_weight) / 2
+            if target <= next_centre:
+                fraction = (target - centre) / (next_centre - centre)
+                return mean + (next_mean - mean) * fraction
+            centre = next_centre
+
+        return last_mean
+
+    def get_histogram(self, edges):
+        """This method estimates the number of values between each pair
+        of edges, counting each centroid in the bin holding its mean.
+
+        :param self: TDigest object
+        :param edges: edges of bins in order, at least two
+        :return: number of values in each bin
+        :rtype: list of int
+        """
+        self.compress()
+        counts = [0] * (len(edges) - 1)
+
+        for mean, weight in self.centroids:
+            for i in range(len(counts)):
+                if mean < edges[i + 1] or i == len(counts) - 1:
+                    if mean >= edges[i] or i == 0:
+                        counts[i] += weight
+                    break
+
+        return counts
+
+    def to_dict(self):
+        """This method gets the digest as a dict which can be saved as
+        JSON.
+
+        :param self: TDigest object
+        :return: compression, centroids, count, total, minimum and
+            maximum
+        :rtype: dict
+        """
+        self.compress()
+
+        return {
+            "compression": self.compression,
+            "centroids": self.centroids,
+            "count": self.count,
+            "total": self.total,
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+
+
+def digest_from_dict(saved):
+    """This function gets a digest saved with to_dict.
+
+    :param saved: dict from TDigest.to_dict
+    :return: digest
+    :rtype: TDigest
+    """
+    return TDigest(
+        saved["compression"],
+        saved["centroids"],
+        saved["count"],
+        saved["total"],
+        saved["min"],
+        saved["max"],
+    )
@@ -0,0 +1,216 @@
+"""This module contains the accounts menu. It gets user choice to view
+account balances, view the history of an account, add an account,
+transfer money between accounts or return to main menu.
+"""
+
+from time import sleep
+import datetime
+from database import database_commands as dc
+from functions import common_functions as cf
+
+SEL = "\033[36m\033[1m -------- \033[0m\033[1m"
+END = "\033[36m\033[1m --------\033[0m"
+MENU_TITLE = f"\U0001f3e6{SEL}ACCOUNTS{END}"
+ACCOUNTS_MENU = f"""{MENU_TITLE}
+\nPlease choose from the following options:
+\n1.  View balances
+2.  View account history
+3.  Add account
+4.  Transfer between accounts
+0.  Return to main menu
+\nEnter your selection: \
+"""
+SEL_ = f"{cf.SEL_}"
+END_ = f"{cf.END_}"
+SELECT_1 = f"{SEL_}View Balances{END_}"
+SELECT_2 = f"{SEL_}View Account History{END_}"
+SELECT_3 = f"{SEL_}Add Account{END_}"
+SELECT_4 = f"{SEL_}Transfer Between Accounts{END_}"
+KIND_MENU = """\nWhat kind of account is it?
+\n1.  Current account
+2.  Savings account
+3.  Credit card
+\nEnter your selection: \
+"""
+KINDS = {"1": "current", "2": "savings", "3": "credit card"}
+ENTER_BALANCE = "\nEnter balance now (or press enter for none): "
+ENTER_OWED = "\nEnter amount owed now (or press enter for none): "
+# Number of expenses, income and transfers shown in account history
+HISTORY_ROWS = 30
+PRINT_LINE = "\033[90m_\033[0m" * 70
+VIEW_HISTORY = "\n{}\t{:<24}{:>12}{:>14}"
+
+
+def print_accounts(accounts):
+    """This function prints a numbered list of accounts with their
+    balances.
+
+    :param accounts: rows from accounts table
+    :return: None
+    """
+    print("\n\U0001f3e6 \033[1mAccounts: \033[0m\n")
+
+    for i, account in enumerate(accounts):
+        balance = cf.money_format(round(account[3], 2))
+        print(f"{i + 1}.  {account[1]} ({account[2]}), balance {balance}")
+
+
+def select_account(string="\nEnter selection: ", accounts=None):
+    """This function gets an account from user selection.
+
+    :param string: input prompt (default = 'Enter selection: ')
+    :param accounts: rows from accounts table to choose from
+        (default = None for every account)
+    :return: row from accounts table
+    :rtype: tuple
+    """
+    if accounts is None:
+        accounts = dc.get_accounts()
+    print_accounts(accounts)
+
+    while True:
+        selection = input(string).strip()
+        if selection.isdigit() and 0 < int(selection) <= len(accounts):
+            return accounts[int(selection) - 1]
+        print(cf.INVALID_INPUT)
+
+
+def get_account_id():
+    """This function gets the account an expense or income is paid from
+    or into. The user is only asked when there is more than one account.
+
+    :return: primary key in accounts table
+    :rtype: int
+    """
+    accounts = dc.get_accounts()
+    if len(accounts) < 2:
+        return dc.DEFAULT_ACCOUNT
+
+    return select_account("\nEnter account: ", accounts)[0]
+
+
+def add_account():
+    """This function gets a new account and its balance from the user
+    and enters it into the accounts table.
+
+    :return: None
+    """
+    while True:
+        name = input("\nEnter account name: ").strip()
+        if cf.description_check(name):
+            break
+        print(cf.INVALID_INPUT)
+
+    selection = input(KIND_MENU).strip().replace(".", "")
+    while selection not in KINDS:
+        print(cf.INVALID_INPUT)
+        selection = input(KIND_MENU).strip().replace(".", "")
+    kind = KINDS[selection]
+
+    # Money owed on a credit card is a negative balance
+    if kind == "credit card":
+        balance = -(cf.get_optional_amount(ENTER_OWED) or 0)
+    else:
+        balance = cf.get_optional_amount(ENTER_BALANCE) or 0
+
+    dc.insert_data(dc.INSERT_ACCOUNT, (name, kind, balance))
+    print("\nAccount has been added \U00002705")
+    sleep(0.6)
+
+
+def transfer():
+    """This function moves money from one account to another. Transfers
+    are not counted as spending or income.
+
+    :return: None
+    """
+    accounts = dc.get_accounts()
+    if len(accounts) < 2:
+        print("\nAdd another account to transfer money between them.")
+        sleep(1)
+        return
+
+    from_account = select_account("\nTransfer from: ", accounts)
+    others = [account for account in accounts if account != from_account]
+    to_account = select_account("\nTransfer to: ", others)
+    amount = float(cf.get_amount())
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    dc.insert_data(
+        dc.INSERT_TRANSFER, (today, from_account[0], to_account[0], amount)
+    )
+    print("\nTransfer has been made \U00002705")
+    sleep(0.6)
+
+
+def view_history():
+    """This function prints the latest expenses, income and transfers of
+    an account selected by the user with the balance after each.
+
+    :return: None
+    """
+    account = select_account()
+    rows = dc.get_account_history(account[0], HISTORY_ROWS)
+
+    cf.clear()
+    if not rows:
+        print(cf.NO_RESULTS)
+        return
+
+    print(f"\n\033[1m{account[1]}\033[0m\n{PRINT_LINE}")
+    for date, description, amount, balance in rows:
+        print(
+            VIEW_HISTORY.format(
+                str(date)[:10],
+                str(description)[:22],
+                cf.money_format(round(amount, 2)),
+                cf.money_format(round(balance, 2)),
+            )
+        )
+    print(PRINT_LINE)
+
+
+def accounts_menu():
+    """This function gets user selection for the accounts menu and calls
+    relevant functions according to user choice
+
+    :return: None
+    """
+    while True:
+        cf.clear()
+        menu = input(ACCOUNTS_MENU).strip().replace(".", "")
+
+        # ****** View balances ******
+        if menu == "1":
+            cf.clear()
+            print(SELECT_1)
+            print_accounts(dc.get_accounts())
+            cf.finish_viewing()
+
+        # ****** View account history ******
+        elif menu == "2":
+            cf.clear()
+            print(SELECT_2)
+            view_history()
+            cf.finish_viewing()
+
+        # ****** Add account ******
+        elif menu == "3":
+            cf.clear()
+            print(SELECT_3)
+            add_account()
+
+        # ****** Transfer between accounts ******
+        elif menu == "4":
+            cf.clear()
+            print(SELECT_4)
+            transfer()
+
+        # ****** Return to main menu ******
+        elif menu == "0":
+            cf.clear()
+            break
+
+        else:
+            cf.clear()
+            print(cf.INVALID_INPUT)
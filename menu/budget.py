@@ -5,10 +5,12 @@ or year or return to main menu.
 """
 
 from time import sleep
+import datetime
 from functions import common_functions as cf, date_functions as df
-from database import database_commands
-from menu import expenses
-from maths import calculations
+from functions import budget_alerts, pivot
+from database import database_commands, ledger_index
+from menu import expenses, categories as cat
+from maths import calculations, forecast
 
 SEL = "\033[36m\033[1m -------- \033[0m\033[1m"
 END = "\033[36m\033[1m --------\033[0m"
@@ -19,6 +21,8 @@ BUDGET_MENU = f"""{MENU_TITLE}
 2.  Set budget by category
 3.  View budgets
 4.  View budget progress
+5.  View past budget progress
+6.  View spending by period
 0.  Return to main menu
 \nEnter your selection: \
 """
@@ -46,6 +50,27 @@ SELECT_1 = f"{SEL_}Set Budget{END_}"
 SELECT_2 = f"{SEL_}Set Budget by Category{END_}"
 SELECT_3 = f"{SEL_}View Budgets{END_}"
 SELECT_4 = f"{SEL_}View Budget Progress{END_}"
+SELECT_5 = f"{SEL_}View Past Budget Progress{END_}"
+SELECT_6 = f"{SEL_}View Spending by Period{END_}"
+PERIODS_AGO = {
+    "weekly": "\nHow many weeks ago? ",
+    "monthly": "\nHow many months ago? ",
+    "annual": "\nHow many years ago? ",
+}
+PIVOT_TERM = """\nPlease select from the following options:
+1.  By week
+2.  By month
+3.  By year
+0.  Cancel
+\nEnter your selection: \
+"""
+PIVOT_PERIODS = {
+    "weekly": "\nHow many weeks? ",
+    "monthly": "\nHow many months? ",
+    "annual": "\nHow many years? ",
+}
+ASK_CSV = "\nSave as a CSV file? (y/n): "
+TERM_PERIODS = {"weekly": "week", "monthly": "month", "annual": "year"}
 OVERSPENT = "\033[91m\U000026a0\033[0m"
 OVERALL_PRINT = "_" * 50
 PRINT_LINE = "\033[90m_\033[0m" * 50
@@ -102,9 +127,11 @@ def set_budget_by_category():
 
     :return: None
     """
-    # Get category id number and budget term
-    c_id = cf.select_category("categories")
-    c = database_commands.get_category_from_id(c_id, "categories")
+    # Get category id number and budget term. A budget set on a
+    # category also covers its subcategories.
+    category = cat.select_category()
+    c_id = category.id_
+    c = category.description
     print()
     term = cf.get_term(NEW_TERM)
 
@@ -112,6 +139,7 @@ def set_budget_by_category():
     if term:
         new_amount = cf.get_amount()
         database_commands.enter_budget(c_id, new_amount, term)
+        budget_alerts.reset()
         cf.clear()
         print(f"\nBudget has been updated for {c} \U00002705\n")
 
@@ -159,6 +187,8 @@ def update_overall_budgets(term, amount):
     database_commands.enter_goal("budget", new_week_budg, "weekly")
     database_commands.enter_goal("budget", new_month_budg, "monthly")
 
+    budget_alerts.reset()
+
     # Update table with gross and net income amounts
     if new_net_inc >= 0:
         database_commands.enter_goal("net income", new_net_inc, "annual")
@@ -188,6 +218,7 @@ def get_existing_gross():
     return None
 
 
+@database_commands.cached
 def get_budgets():
     """This function gets a list of budgets from the budget table
 
@@ -266,6 +297,109 @@ def get_list_expenses_in_dates(term):
     return expenses_list
 
 
+def get_spending_by_category(term):
+    """This function gets the total spent in each category in the
+    current term.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: total spent with category id as keys
+    :rtype: dict
+    """
+    first_day = df.get_term_start(term)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    return get_spending_between(first_day, today)
+
+
+@database_commands.cached
+def get_spending_between(first_day, last_day):
+    """This function gets the total spent in each category, including
+    its subcategories, between two dates.
+
+    :param first_day: first date as YYYY-MM-DD
+    :param last_day: last date as YYYY-MM-DD
+    :return: total spent with category id as keys
+    :rtype: dict
+    """
+    if ledger_index.is_enabled():
+        totals = ledger_index.get_category_totals(
+            "expenses", first_day, last_day
+        )
+        return roll_up_totals(totals)
+
+    return database_commands.get_rollup_totals(first_day, last_day)
+
+
+def roll_up_totals(totals):
+    """This function adds the totals for each category to the totals
+    of all categories above it.
+
+    :param totals: total spent with category id as keys
+    :return: total including subcategories with category id as keys
+    :rtype: dict
+    """
+    rolled_up = {}
+
+    for ancestor_id, descendant_id in database_commands.get_category_paths():
+        if descendant_id in totals:
+            total = rolled_up.get(ancestor_id, 0) + totals[descendant_id]
+            rolled_up[ancestor_id] = round(total, 2)
+
+    return rolled_up
+
+
+def get_term_spending(term):
+    """This function gets the total spent in the current term.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: total spent
+    :rtype: float
+    """
+    first_day = df.get_term_start(term)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    return get_total_between(first_day, today)
+
+
+@database_commands.cached
+def get_total_between(first_day, last_day):
+    """This function gets the total spent between two dates.
+
+    :param first_day: first date as YYYY-MM-DD
+    :param last_day: last date as YYYY-MM-DD
+    :return: total spent
+    :rtype: float
+    """
+    if ledger_index.is_enabled():
+        return ledger_index.get_total_between("expenses", first_day, last_day)
+
+    return database_commands.get_total_spending(first_day, last_day)
+
+
+def get_progress(category, term, amount, total, projected=None):
+    """This function gets the progress in one budget formatted for
+    printing.
+
+    :param category: category description
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param amount: budget amount
+    :param total: total spent
+    :param projected: projected total at the end of the term
+        (default = None)
+    :return: (total, amount, category, term, remaining, projected)
+    :rtype: tuple of str
+    """
+    remain = calculations.difference(total, amount)
+
+    amount = cf.money_format(amount)
+    remain = cf.money_format(remain)
+    total = cf.money_format(total)
+    if projected is not None:
+        projected = cf.money_format(projected)
+
+    return (total, amount, category, term, remain, projected)
+
+
 def view_progress_by_term(term):
     """This function prints a budget progress by category in a
     specified term
@@ -274,34 +408,26 @@ def view_progress_by_term(term):
     :return: None
     """
     progress_list = []
-    # Get list of rows from expenses in date range
-    expenses_list = get_expenses_by_date(term)
+    # Get total spent in each category in term
+    totals = get_spending_by_category(term)
+    # Get projected total in each category at the end of term
+    projections = roll_up_totals(forecast.forecast(term))
     # Get rows from categories and budget tables joined together
     cat_budget = database_commands.get_joined_rows("categories")
 
     if cat_budget:
         for row in cat_budget:
-            expense_list = []
             # Select rows from category-budget table matching term
             if row[5] == term:
 
-                for expense in expenses_list:
-
-                    # Select rows matching category
-                    if expense[4] == row[0]:
-                        expense_list.append(float(expense[3]))
-
                 # Get amount, category, total and money remaining in budget
                 amount = float(row[4])
-                category = row[1]
-                total = calculations.total_spending(expense_list)
-                remain = calculations.difference(total, amount)
-
-                amount = cf.money_format(amount)
-                remain = cf.money_format(remain)
-                total = cf.money_format(total)
-
-                progress_list.append((total, amount, category, term, remain))
+                total = totals.get(row[0], 0)
+                projected = projections.get(row[0], total)
+                progress = get_progress(
+                    row[1], term, amount, total, projected
+                )
+                progress_list.append(progress)
 
     print_progress(progress_list)
 
@@ -315,38 +441,98 @@ def overall_progress(term):
     budget_goal = database_commands.get_goal("budget", term)
 
     if budget_goal:
-        expenses_list = get_expenses_by_date(term)
+        total = get_term_spending(term)
+        projected = forecast.forecast_total(term)
+        return print_overall_progress(budget_goal, total, term, projected)
+
+    print(PRINT_LINE)
+    return None
+
+
+def print_overall_progress(budget_goal, total, term, projected=None):
+    """This function prints progress in an overall budget goal
+
+    :param budget_goal: budget amount
+    :param total: total spending
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param projected: projected spending at the end of the term
+        (default = None)
+    :return: None
+    """
+    remain = calculations.difference(total, budget_goal)
+
+    budget_goal = cf.money_format(budget_goal)
+    remain = cf.money_format(remain)
+    total = cf.money_format(total)
+
+    print(OVERALL_PRINT)
+    return print_overall(budget_goal, total, remain, term, projected)
 
-        # Get list of expenses in term
-        expense_list = []
-        for expense in expenses_list:
-            expense_list.append(float(expense[3]))
 
-        total = calculations.total_spending(expense_list)
-        remain = calculations.difference(total, budget_goal)
+def view_past_progress(term, periods_ago):
+    """This function prints budget progress in a past week, month or
+    year against the budgets which were set at the time.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :param periods_ago: number of terms before the current one
+    :return: None
+    """
+    first_day, last_day = df.get_term_range(term, periods_ago)
+    totals = get_spending_between(first_day, last_day)
+    progress_list = []
 
-        budget_goal = cf.money_format(budget_goal)
-        remain = cf.money_format(remain)
-        total = cf.money_format(total)
+    for row in database_commands.get_row_list("categories"):
+        budget = database_commands.get_budget_as_of(row[0], last_day)
 
-        print(OVERALL_PRINT)
-        return print_overall(budget_goal, total, remain, term)
+        if budget and budget[1] == term:
+            total = totals.get(row[0], 0)
+            progress_list.append(get_progress(row[1], term, budget[0], total))
+
+    print(f"\n\033[1m{first_day} to {last_day}\033[0m")
+    print_progress(progress_list)
+
+    budget_goal = database_commands.get_goal_as_of("budget", term, last_day)
+
+    if budget_goal:
+        total = get_total_between(first_day, last_day)
+        return print_overall_progress(budget_goal, total, term)
 
     print(PRINT_LINE)
     return None
 
 
-def print_overall(budget_goal, total, remain, term):
+def get_periods_ago(term):
+    """This function gets from the user how many weeks, months or years
+    ago to view budget progress for.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: number of terms ago
+    :rtype: int
+    """
+    while True:
+        periods_ago = input(PERIODS_AGO[term]).strip()
+
+        if periods_ago.isdigit() and int(periods_ago) > 0:
+            return int(periods_ago)
+
+        print(INVALID_INPUT)
+
+
+def print_overall(budget_goal, total, remain, term, projected=None):
     """This function prints overall budget progress for a budget
 
     :param budget_goal: budget amount
     :param total: total spending
     :param remain: amount of money remaining in budget
     :param term: 'weekly', 'monthly' or 'annual'
+    :param projected: projected spending at the end of the term
+        (default = None)
     :return: None
     """
     print(f"\n\033[1mTOTAL {term.upper()} GOAL\033[0m")
     print(f"Spent {total} of {term} budget of {budget_goal}.")
+    if projected is not None:
+        print_projection(cf.money_format(projected), term)
 
     if remain[1] != "-":
         print(f"\033[92m\U00002714\033[0m {remain} remaining.")
@@ -358,6 +544,19 @@ def print_overall(budget_goal, total, remain, term):
     sleep(0.5)
 
 
+def print_projection(projected, term):
+    """This function prints the spending projected by the end of a term
+
+    :param projected: projected spending formatted as money
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: None
+    """
+    print(
+        f"On course to spend {projected} by the end of the "
+        f"{TERM_PERIODS[term]}."
+    )
+
+
 def print_progress(progress_list):
     """This function prints budget progress for each progress in a list
 
@@ -370,6 +569,8 @@ def print_progress(progress_list):
         for item in progress_list:
             print(f"\n\033[1m{item[2].upper()}\033[0m")
             print(f"Spent {item[0]} of {item[3]} budget of {item[1]}.")
+            if item[5] is not None:
+                print_projection(item[5], item[3])
 
             if item[4][1] != "-":
                 print(f"\033[92m\U00002714\033[0m {item[4]} remaining.")
@@ -384,6 +585,31 @@ def print_progress(progress_list):
         sleep(0.5)
 
 
+def view_pivot(term):
+    """This function prints spending by category in each of the last
+    few weeks, months or years, and saves it as a CSV file if the user
+    chooses.
+
+    :param term: 'weekly', 'monthly' or 'annual'
+    :return: None
+    """
+    while True:
+        number = input(PIVOT_PERIODS[term]).strip()
+        if number.isdigit() and int(number) > 0:
+            break
+        print(INVALID_INPUT)
+
+    cf.clear()
+    report = pivot.make_pivot(term, int(number))
+    pivot.print_pivot(report)
+
+    if report.rows and input(ASK_CSV).strip().lower() == "y":
+        today = datetime.date.today().strftime("%Y-%m-%d")
+        path = f"spending_{term}_{today}.csv"
+        report.write_csv(path)
+        print(f"\nSaved as {path} \U00002705")
+
+
 def view_budgets():
     """This function prints all budgets
 
@@ -441,6 +667,29 @@ def budget_menu():
             overall_progress(term)
             print()
 
+        # ****** View Past Budget Progress ******
+        elif menu == "5":
+            cf.clear()
+            print(SELECT_5)
+            term = cf.get_term(W_M_Y)
+
+            if term:
+                periods_ago = get_periods_ago(term)
+                cf.clear()
+                view_past_progress(term, periods_ago)
+            print()
+
+        # ****** View Spending by Period ******
+        elif menu == "6":
+            cf.clear()
+            print(SELECT_6)
+            term = cf.get_term(PIVOT_TERM)
+
+            if term:
+                view_pivot(term)
+                cf.finish_viewing()
+            cf.clear()
+
         # ****** Return to main menu ******
         elif menu == "0":
             cf.clear()
@@ -8,6 +8,7 @@ from database import database_commands as dc
 CATEGORIES = "categories"
 UPDATE_CATEGORY = """UPDATE categories SET category = ? WHERE id = ?"""
 ENTER_DESCRIPTION = "\nEnter new category description: "
+SELECT_PARENT = "\nSelect the category to add a subcategory to:"
 SEL_ = f"{cf.SEL_}"
 END_ = f"{cf.END_}"
 INSERT_CATEGORY = """INSERT INTO categories(category) VALUES(?)"""
@@ -17,6 +18,7 @@ CATEGORIES_MENU = f"""{SELECT_4}
 \n1.  View categories
 2.  Edit category
 3.  Add category
+4.  Add subcategory
 0.  Cancel
 \nEnter your selection: \
 """
@@ -40,13 +42,19 @@ class Category:
         enters new category into categories table
     budget_id:
         foreign key to join with primary key in budget table
+    parent_id:
+        primary key of parent category or None
+    depth:
+        number of categories above this one
     """
 
-    def __init__(self, id_, description, budget_id):
+    def __init__(self, id_, description, budget_id, parent_id=None, depth=0):
         """Constructs attributes for a category."""
         self.id_ = id_
         self.description = description
         self.budget_id = budget_id
+        self.parent_id = parent_id
+        self.depth = depth
 
     def __str__(self):
         """Constructs a string in readable format."""
@@ -67,7 +75,7 @@ class Category:
         :param self: Category object
         :return: None
         """
-        dc.insert_data(INSERT_CATEGORY, (self.description,))
+        self.id_ = dc.add_category(self.description, self.parent_id)
 
     def update_category(self, description_update):
         """This method updates category in categories table with a new
@@ -82,20 +90,39 @@ class Category:
 
 def get_categories():
     """This function gets a list of all categories in the database as
-    objects.
+    objects, with each category followed by its subcategories.
 
     :return: list of Category objects
     :rtype: list of obj
     """
     category_list = []
     rows = dc.get_row_list(CATEGORIES)
+    parents = dc.get_category_parents()
+    children = {}
 
     for row in rows:
-        category_list.append(Category(*row))
+        children.setdefault(parents.get(row[0]), []).append(row)
+
+    add_branch(category_list, children, None, 0)
 
     return category_list
 
 
+def add_branch(category_list, children, parent_id, depth):
+    """This function appends the subcategories of a category to a list
+    of Category objects, each followed by its own subcategories.
+
+    :param category_list: list of Category objects
+    :param children: rows of subcategories with parent id as keys
+    :param parent_id: primary key of parent or None for top level
+    :param depth: number of categories above the subcategories
+    :return: None
+    """
+    for row in children.get(parent_id, []):
+        category_list.append(Category(*row, parent_id, depth))
+        add_branch(category_list, children, row[0], depth + 1)
+
+
 def print_categories():
     """This function prints a list of categories.
 
@@ -105,10 +132,11 @@ def print_categories():
     print("\n\U0001f9fe \033[1mCategories: \033[0m\n")
 
     for i, category in enumerate(category_list):
+        description = "   " * category.depth + category.description
         if i + 1 < 10:
-            print(f"{i+1}.  {category.description}")
+            print(f"{i+1}.  {description}")
         else:
-            print(f"{i+1}. {category.description}")
+            print(f"{i+1}. {description}")
 
 
 def get_category_description():
@@ -159,7 +187,7 @@ def category_selection_check(category_select, number_of_categories):
         if 1 <= category_select <= number_of_categories:
             return True
         return False
-    except TypeError:
+    except (TypeError, ValueError):
         return False
 
 
@@ -194,6 +222,24 @@ def add_category():
     cf.finish_viewing()
 
 
+def add_subcategory():
+    """This function adds a new subcategory to a category selected by
+    the user.
+
+    :return: None
+    """
+    print(SELECT_PARENT)
+    parent = select_category()
+    category = Category(None, get_category_description(), None, parent.id_)
+    category.insert_category()
+    cf.clear()
+
+    print_categories()
+    sleep(0.6)
+    print(f"\nSubcategory of {parent} added \U00002705")
+    cf.finish_viewing()
+
+
 def categories_menu():
     """This function presents the user with options to manage expense
     categories and calls relevant functions according to user selection
@@ -219,6 +265,11 @@ def categories_menu():
         elif cat_menu == "3":
             add_category()
 
+        # ****** Add subcategory ******
+        elif cat_menu == "4":
+            cf.clear()
+            add_subcategory()
+
         # ****** Return to main menu ******
         elif cat_menu == "0":
             break
@@ -1,11 +1,243 @@
 """This module gets all arguments to create a graph showing progress
 for a financial goal."""
 
+import datetime
 from functions import date_functions as df
-from database import database_commands as dc
-from maths import calculations as calc, graphs
+from database import database_commands as dc, ledger_index
+from functions import common_functions as cf
+from maths import calculations as calc, forecast, graphs, simulation
 from maths.calculations import difference as diff
 
+WEEKS_IN_YEAR = 52
+GOALS = ("gross income", "net income", "budget")
+
+
+class GoalProgress:
+    """This class represents the weekly income and spending this year
+    from which progress towards every financial goal is calculated.
+
+    Attributes
+    ----------
+    dates_list : list of dates
+        first day of each week this year
+    income : list of floats
+        total income for each week
+    spending : list of floats
+        total spending for each week
+    income_averages : list of floats
+        average income so far for each week
+    spending_averages : list of floats
+        average spending so far for each week
+    goals : dict
+        annual goal amounts with goal descriptions as keys
+    projected_income : float
+        income projected by the end of the year
+    projected_spending : float
+        spending projected by the end of the year
+    simulation : Simulation
+        simulated years, or None until first used or with no history
+
+    Methods
+    ----------
+    get_gross_args:
+        returns arguments for gross income graph
+    get_budget_args:
+        returns arguments for budget graph
+    get_net_args:
+        returns arguments for net income graph
+    get_common_args:
+        returns arguments common to all graphs
+    get_projection:
+        returns line from average so far to projected average
+    get_simulation:
+        returns simulated income and spending to the end of the year
+    get_band:
+        returns range of simulated averages and chance of meeting goal
+    """
+
+    def __init__(self):
+        """Constructs weekly series for the current year."""
+        self.dates_list = df.get_date_of_first_day_each_week_this_year()
+        self.income = get_income_for_week(self.dates_list)
+        self.spending = get_spending_for_week(self.dates_list)
+        self.income_averages = get_average_so_far_for_each_week_in_year(
+            self.income
+        )
+        self.spending_averages = get_average_so_far_for_each_week_in_year(
+            self.spending
+        )
+        self.goals = get_annual_goals()
+        self.projected_income = forecast.forecast_total("annual", "income")
+        self.projected_spending = forecast.forecast_total("annual")
+        self.simulation = None
+
+    def get_gross_args(self):
+        """This method gets all arguments specific to the progress in
+        the annual gross income goal.
+
+        :param self: GoalProgress object
+        :return: target gross, total gross for each week, average gross
+        :rtype: float, list, list
+        """
+        gross_target = calc.get_week_from_year(self.goals.get("gross income"))
+        return gross_target, self.income, self.income_averages
+
+    def get_budget_args(self):
+        """This method gets the arguments specific to the progress in
+        the annual budget goal.
+
+        :param self: GoalProgress object
+        :return: weekly budget, total spent in each week, average spent
+        :rtype: float, list, list
+        """
+        budget_target = calc.get_week_from_year(self.goals.get("budget"))
+        return budget_target, self.spending, self.spending_averages
+
+    def get_net_args(self):
+        """This method gets all arguments specific to the progress in
+        the annual net income goal.
+
+        :param self: GoalProgress object
+        :return: target net, total net for each week, average net
+        :rtype: float, list, list
+        """
+        gross_target, gross_y_coordinates, gross_averages = (
+            self.get_gross_args()
+        )
+        budget_target, budget_y_coordinates, budget_averages = (
+            self.get_budget_args()
+        )
+        net_target = diff(budget_target, gross_target)
+
+        # Get net income for each week. Transfers between accounts are
+        # neither income nor spending so they leave net income unchanged.
+        y_coordinates = []
+        for i, y_coordinate in enumerate(gross_y_coordinates):
+            amount = diff(budget_y_coordinates[i], y_coordinate)
+            y_coordinates.append(amount)
+
+        # Get average income for year so far for each week
+        averages = []
+        for i, budget_average in enumerate(budget_averages):
+            average = diff(budget_average, gross_averages[i])
+            averages.append(average)
+
+        return net_target, y_coordinates, averages
+
+    def get_common_args(self):
+        """This method gets the arguments to create a graph showing
+        progress towards a financial goal which are common to all goals.
+
+        :param self: GoalProgress object
+        :return: year and week numbers
+        :rtype: str, list
+        """
+        year = self.dates_list[-1].strftime("%Y-%m-%d")[:4]
+
+        # Get list of integers for each date in dates_list
+        x_coordinates = get_x_coordinates(self.dates_list)
+        return year, x_coordinates
+
+    def get_projection(self, goal):
+        """This method gets a line from the average weekly amount so far
+        to the average projected at the end of the year.
+
+        :param self: GoalProgress object
+        :param goal: 'gross income', 'net income' or 'budget'
+        :return: week numbers and averages at each end of the line
+        :rtype: list, list
+        """
+        if goal == "gross income":
+            average = self.income_averages[-1]
+            projected = self.projected_income
+        elif goal == "budget":
+            average = self.spending_averages[-1]
+            projected = self.projected_spending
+        else:
+            average = diff(
+                self.spending_averages[-1], self.income_averages[-1]
+            )
+            projected = diff(self.projected_spending, self.projected_income)
+
+        x_coordinates = [len(self.dates_list), WEEKS_IN_YEAR]
+        y_coordinates = [average, round(projected / WEEKS_IN_YEAR, 2)]
+        return x_coordinates, y_coordinates
+
+    def get_simulation(self):
+        """This method simulates income and spending from this week to
+        the end of the year, the first time it is needed.
+
+        :param self: GoalProgress object
+        :return: simulation, or None if there are no past weeks
+        :rtype: Simulation or None
+        """
+        if self.simulation is None:
+            self.simulation = simulation.simulate(
+                (sum(self.income), sum(self.spending)),
+                len(self.dates_list),
+                max(WEEKS_IN_YEAR - len(self.dates_list), 0),
+                simulation.get_history(self.dates_list[-1]),
+            )
+
+        return self.simulation
+
+    def get_band(self, goal):
+        """This method gets the range of average weekly amounts in
+        simulated years to draw on a graph, with the chance of meeting
+        the goal.
+
+        :param self: GoalProgress object
+        :param goal: 'gross income', 'net income' or 'budget'
+        :return: week numbers, lower and upper averages, and chance or
+            None if no goal is set, or None if there are no past weeks
+        :rtype: tuple or None
+        """
+        simulated = self.get_simulation()
+        if simulated is None:
+            return None
+
+        chance = None
+        if self.goals.get(goal):
+            chance = simulated.get_chance(goal, self.goals[goal])
+
+        return (*simulated.get_band(goal), chance)
+
+
+def get_goal_progress():
+    """This function gets the GoalProgress object for today. It is only
+    recomputed when the database changes or on a new day.
+
+    :return: GoalProgress object
+    :rtype: obj
+    """
+    return get_progress_on(datetime.date.today())
+
+
+@dc.cached
+def get_progress_on(today):
+    """This function gets the GoalProgress object for a day.
+
+    :param today: today's date, so progress is recomputed each day
+    :return: GoalProgress object
+    :rtype: obj
+    """
+    return GoalProgress()
+
+
+def get_annual_goals():
+    """This function gets the annual goal amounts from the goals table.
+
+    :return: goal amounts with goal descriptions as keys
+    :rtype: dict
+    """
+    goals = {}
+
+    for row in dc.get_row_list("goals"):
+        if row[3] == "annual":
+            goals[row[1]] = row[2]
+
+    return goals
+
 
 def get_gross_args():
     """This function gets all arguments specific to the progress in the
@@ -14,20 +246,7 @@ def get_gross_args():
     :return: target gross, total gross for each week, average gross
     :rtype: float, list, list
     """
-    dates_list = df.get_date_of_first_day_each_week_this_year()
-    y_coordinates = get_income_for_week(dates_list)
-    averages = get_average_so_far_for_each_week_in_year(y_coordinates)
-
-    # Get annual goal amount
-    goals_list = dc.get_row_list("goals")
-    annual_amount = None
-    for row in goals_list:
-        if row[1] == "gross income":
-            annual_amount = row[2]
-
-    gross_target = calc.get_week_from_year(annual_amount)
-
-    return gross_target, y_coordinates, averages
+    return get_goal_progress().get_gross_args()
 
 
 def get_budget_args():
@@ -37,21 +256,7 @@ def get_budget_args():
     :return: weekly budget, total spent in each week, average spent
     :rtype: float, list, list
     """
-    dates_list = df.get_date_of_first_day_each_week_this_year()
-    y_coordinates = get_spending_for_week(dates_list)
-    averages = get_average_so_far_for_each_week_in_year(y_coordinates)
-
-    # Get annual budget amount
-    goals_list = dc.get_row_list("goals")
-    annual_amount = None
-
-    for row in goals_list:
-        if row[1] == "budget" and row[3] == "annual":
-            annual_amount = row[2]
-
-    budget_target = calc.get_week_from_year(annual_amount)
-
-    return budget_target, y_coordinates, averages
+    return get_goal_progress().get_budget_args()
 
 
 def get_net_args():
@@ -61,39 +266,17 @@ def get_net_args():
     :return: target net, total net for each week, average net
     :rtype: float, list, list
     """
-    gross_target, gross_y_coordinates, gross_averages = get_gross_args()
-    budget_target, budget_y_coordinates, budget_averages = get_budget_args()
-    net_target = diff(budget_target, gross_target)
-
-    # Get net income for each week
-    y_coordinates = []
-    for i, y_coordinate in enumerate(gross_y_coordinates):
-        amount = diff(budget_y_coordinates[i], y_coordinate)
-        y_coordinates.append(amount)
-
-    # Get average income for year so far for each week
-    averages = []
-    for i, budget_average in enumerate(budget_averages):
-        average = diff(budget_average, gross_averages[i])
-        averages.append(average)
-
-    return net_target, y_coordinates, averages
+    return get_goal_progress().get_net_args()
 
 
 def get_common_args():
     """This function gets the arguments to create a graph showing
     progress towards a financial goal which are common to all goals.
 
-    :param goal: 'net income', 'gross income' or 'budget'
-    :return: None
+    :return: year and week numbers
+    :rtype: str, list
     """
-    dates_list = df.get_date_of_first_day_each_week_this_year()
-    year = dates_list[-1]
-    year = year.strftime("%Y-%m-%d")[:4]
-
-    # Get list of integers for each date in dates_list
-    x_coordinates = get_x_coordinates(dates_list)
-    return year, x_coordinates
+    return get_goal_progress().get_common_args()
 
 
 def get_x_coordinates(dates_list):
@@ -116,8 +299,15 @@ def create_gross_income_graph():
 
     :return: None
     """
+    progress = get_goal_progress()
     labels = get_labels("gross income")
-    graphs.make_plot(get_common_args(), get_gross_args(), labels)
+    graphs.make_plot(
+        progress.get_common_args(),
+        progress.get_gross_args(),
+        labels,
+        progress.get_projection("gross income"),
+        progress.get_band("gross income"),
+    )
 
 
 def create_net_income_graph():
@@ -126,8 +316,15 @@ def create_net_income_graph():
 
     :return: None
     """
+    progress = get_goal_progress()
     labels = get_labels("net income")
-    graphs.make_plot(get_common_args(), get_net_args(), labels)
+    graphs.make_plot(
+        progress.get_common_args(),
+        progress.get_net_args(),
+        labels,
+        progress.get_projection("net income"),
+        progress.get_band("net income"),
+    )
 
 
 def create_budget_graph():
@@ -136,22 +333,57 @@ def create_budget_graph():
 
     :return: None
     """
+    progress = get_goal_progress()
     labels = get_labels("budget")
-    graphs.make_plot(get_common_args(), get_budget_args(), labels)
+    graphs.make_plot(
+        progress.get_common_args(),
+        progress.get_budget_args(),
+        labels,
+        progress.get_projection("budget"),
+        progress.get_band("budget"),
+    )
 
 
-def get_amount_from_rows(row_list):
-    """This function takes in a list of rows from expenses or income
-    tables and returns a list of their amounts
+def print_goal_chances():
+    """This function prints the chance of meeting each annual goal and
+    the range of year-end totals in simulated years.
 
-    :param row_list: list of rows from table
-    :return: list of amounts
-    :rtype: list of floats
+    :return: None
     """
-    amounts = []
-    for row in row_list:
-        amounts.append(float(row[3]))
-    return amounts
+    progress = get_goal_progress()
+    simulated = progress.get_simulation()
+
+    if simulated is None:
+        print(cf.NO_RESULTS)
+        return
+
+    low, high = simulation.BAND
+    print()
+    print(
+        "Goal".ljust(13)
+        + "Target".rjust(12)
+        + "Median".rjust(12)
+        + f"{low}th to {high}th percentile".rjust(28)
+        + "Chance".rjust(8)
+    )
+    print("_" * 73)
+
+    for goal in GOALS:
+        target = progress.goals.get(goal)
+        bottom, median, top = simulated.get_range(goal)
+        target_text, chance = "-", "-"
+        if target:
+            target_text = cf.money_format(target)
+            chance = f"{simulated.get_chance(goal, target):.0%}"
+        print(
+            goal.capitalize().ljust(13)
+            + target_text.rjust(12)
+            + cf.money_format(median).rjust(12)
+            + f"{cf.money_format(bottom)} to {cf.money_format(top)}".rjust(
+                28
+            )
+            + chance.rjust(8)
+        )
 
 
 def get_spending_for_week(dates_list):
@@ -162,16 +394,11 @@ def get_spending_for_week(dates_list):
     :return: list of total spend for each week
     :rtype: list of floats
     """
-    spending = []
+    if ledger_index.is_enabled():
+        return get_indexed_weekly_totals(dates_list, "expenses")
 
-    for date in dates_list:
-        dates_in_week = df.all_dates_in_week(date)
-        spending_wk = dc.get_expenses_by_date(dates_in_week)
-        amounts = get_amount_from_rows(spending_wk)
-        total = calc.total_spending(amounts)
-        spending.append(total)
-
-    return spending
+    rows = get_rows_for_weeks(dates_list, "expenses")
+    return get_weekly_totals(dates_list, rows)
 
 
 def get_income_for_week(dates_list):
@@ -182,16 +409,72 @@ def get_income_for_week(dates_list):
     :return: list of total income for each week
     :rtype: list of floats
     """
-    income = []
+    if ledger_index.is_enabled():
+        return get_indexed_weekly_totals(dates_list, "income")
+
+    rows = get_rows_for_weeks(dates_list, "income")
+    return get_weekly_totals(dates_list, rows)
+
+
+def get_rows_for_weeks(dates_list, table):
+    """This function gets the date and amount of every row in a table
+    from the first week in a list of weeks up until today.
+
+    :param dates_list: list of dates of start of each week
+    :param table: 'expenses' or 'income'
+    :return: date and amount of each row
+    :rtype: list of tuples
+    """
+    first_day = dates_list[0].strftime("%Y-%m-%d")
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    return dc.get_amounts_between(table, first_day, today)
+
+
+def get_weekly_totals(dates_list, rows):
+    """This function adds up the amounts in a list of rows for each
+    week in a list of weeks.
+
+    :param dates_list: list of dates of start of each week
+    :param rows: list of (date, amount) rows
+    :return: total amount for each week
+    :rtype: list of floats
+    """
+    amounts = [[] for _ in dates_list]
+
+    for date, amount in rows:
+        day = datetime.date.fromisoformat(str(date)[:10])
+        week = (day - dates_list[0]).days // 7
+        if 0 <= week < len(dates_list):
+            amounts[week].append(float(amount))
+
+    totals = []
+    for week_amounts in amounts:
+        totals.append(calc.total_spending(week_amounts))
+
+    return totals
+
+
+def get_indexed_weekly_totals(dates_list, table):
+    """This function gets the total amount for each week in a list of
+    weeks from the ledger index.
+
+    :param dates_list: list of dates of start of each week
+    :param table: 'expenses' or 'income'
+    :return: total amount for each week
+    :rtype: list of floats
+    """
+    today = datetime.date.today()
+    totals = []
 
     for date in dates_list:
-        dates_in_week = df.all_dates_in_week(date)
-        incomes_over_week = dc.get_income_by_date(dates_in_week)
-        amounts = get_amount_from_rows(incomes_over_week)
-        total = calc.total_spending(amounts)
-        income.append(total)
+        last_day = min(date + datetime.timedelta(days=6), today)
+        total = ledger_index.get_total_between(
+            table, date.strftime("%Y-%m-%d"), last_day.strftime("%Y-%m-%d")
+        )
+        totals.append(total)
 
-    return income
+    return totals
 
 
 def get_average_so_far_for_each_week_in_year(amount_list):
@@ -203,10 +486,11 @@ def get_average_so_far_for_each_week_in_year(amount_list):
     :rtype: list
     """
     average_list = []
+    total = 0
 
-    for i, _ in enumerate(amount_list):
-        number = calc.get_mean(amount_list[: i + 1])
-        number = round(number, 2)
+    for i, amount in enumerate(amount_list):
+        total += amount
+        number = round(total / (i + 1), 2)
         average_list.append(number)
 
     return average_list
@@ -1,14 +1,16 @@
 """This module contains the expenses menu. It gets user choice to add
 expense, view expenses by category; over a selected term, manage
-categories or return to main menu. It also contains all relevant
+categories, search expenses, view unusual expenses, view spending
+statistics or return to main menu. It also contains all relevant
 functions to get the required returns for each selection.
 """
 
 from time import sleep
 import datetime
 from database import database_commands as dc
-from functions import common_functions as cf
-from menu import categories as cat
+from functions import common_functions as cf, anomalies, budget_alerts, search
+from maths import distributions
+from menu import accounts, categories as cat
 
 COLUMNS = f"""{"\033[1m_\033[0m" * 70}\033[1m\n\nDate\t\tExpense\t\t\t\
 Amount\t\tCategory\033[0m\n{"\033[1m_\033[0m" * 70}\
@@ -23,6 +25,9 @@ EXPENSES_MENU = f"""{MENU_TITLE}
 2.  View expenses
 3.  View expenses by category
 4.  Manage categories
+5.  Search expenses
+6.  View unusual expenses
+7.  View spending statistics
 0.  Return to main menu
 \nEnter your selection: \
 """
@@ -30,6 +35,21 @@ SEL_ = f"{cf.SEL_}"
 SELECT_1 = f"{SEL_}Add Expense{END_}"
 SELECT_2 = f"{SEL_}View expenses{END_}"
 SELECT_3 = f"{SEL_}View expenses by category{END_}"
+SELECT_5 = f"{SEL_}Search expenses{END_}"
+SELECT_6 = f"{SEL_}Unusual expenses{END_}"
+SELECT_7 = f"{SEL_}Spending statistics{END_}"
+ASK_ALL_CATEGORIES = "\nInclude all categories? (y/n): "
+ASK_MONTHS = "\nHow many months? "
+ENTER_SEARCH = """\nEnter words to search for. End a word with * to match
+the start of words, or put words in double quotes to match a phrase: """
+ADD_FILTERS = "\nFilter by date, amount or category? (y/n): "
+FILTER_CATEGORY = "\nFilter by category? (y/n): "
+ENTER_MIN = "\nEnter minimum amount (or press enter for none): "
+ENTER_MAX = "\nEnter maximum amount (or press enter for none): "
+NEXT_PAGE = """\nEnter 'n' for next page, 'p' for previous page,
+or anything else to return: """
+ASK_SPLIT = "\nSplit across categories? (y/n): "
+ENTER_SPLIT = "\nEnter amount in this category (or press enter for {}): "
 SEARCH_MORE_EXPENSES = """\nEnter 'r' to return to main menu,
 or anything else to continue viewing expenses: """
 TABLE = "expenses"
@@ -55,6 +75,10 @@ class Expense:
         amount the expense cost
     category : str
         category of expense
+    splits : list of tuples or None
+        (category id, amount) for each category if split
+    account : int
+        primary key of account expense was paid from
 
     Methods
     ----------
@@ -64,12 +88,22 @@ class Expense:
         enters new expense into expenses table
     """
 
-    def __init__(self, date, expense, amount, category):
+    def __init__(
+        self,
+        date,
+        expense,
+        amount,
+        category,
+        splits=None,
+        account=dc.DEFAULT_ACCOUNT,
+    ):
         """Constructs attributes for an expense."""
         self.date = date
         self.expense = expense
         self.amount = amount
         self.category = category
+        self.splits = splits
+        self.account = account
 
     def __str__(self):
         """Constructs a string in readable format."""
@@ -101,12 +135,26 @@ class Expense:
         return (self.date, self.expense, self.amount, self.category)
 
     def insert_expense(self):
-        """This method enters a new expense into the 'expenses' table.
+        """This method enters a new expense into the 'expenses' table
+        and prints a warning if it takes spending near or over a budget
+        or is unusually large for its category.
 
         :param self: Expense object
         :return: None
         """
-        dc.insert_data(dc.INSERT_EXPENSE, self.get_all_att())
+        if self.splits:
+            expense_id = dc.insert_split_expense(
+                self.get_all_att()[:3], self.splits, self.account
+            )
+            budget_alerts.print_split_alerts(self.date, self.splits)
+            anomalies.print_alerts(expense_id)
+            return
+
+        expense_id = dc.insert_data(
+            dc.INSERT_EXPENSE_ACCOUNT, (*self.get_all_att(), self.account)
+        )
+        budget_alerts.print_alerts(self.date, self.amount, self.category)
+        anomalies.print_alerts(expense_id)
 
 
 def get_expense_description():
@@ -133,15 +181,65 @@ def get_expense():
     today = datetime.date.today()
     new_expense = get_expense_description()
     new_amount = cf.get_amount()
-    category = cat.select_category()
-    print(type(category))
-    print(category)
 
-    exp_obj = Expense(today, new_expense, new_amount, category.id_)
+    # An expense of £0 has nothing to split
+    split = float(new_amount) > 0 and input(ASK_SPLIT).strip().lower() == "y"
+
+    if split:
+        splits = get_splits(new_amount)
+        # An expense in only one category doesn't need splitting
+        if len(splits) > 1:
+            account_id = accounts.get_account_id()
+            return Expense(
+                today, new_expense, new_amount, None, splits, account_id
+            )
+        category_id = splits[0][0]
+    else:
+        category_id = cat.select_category().id_
+
+    account_id = accounts.get_account_id()
+    exp_obj = Expense(
+        today, new_expense, new_amount, category_id, account=account_id
+    )
 
     return exp_obj
 
 
+def get_splits(amount):
+    """This function gets the categories an expense is split across and
+    the amount in each, until the whole amount has been split.
+
+    :param amount: amount of expense
+    :return: (category id, amount) for each category
+    :rtype: list of tuples
+    """
+    splits = []
+    # Pence avoid rounding errors when taking each split away
+    remaining = round(float(amount) * 100)
+
+    while remaining > 0:
+        print(f"\nLeft to split: {cf.money_format(remaining / 100)}")
+        category_id = cat.select_category().id_
+
+        while True:
+            split = input(
+                ENTER_SPLIT.format(cf.money_format(remaining / 100))
+            ).strip()
+            if split == "":
+                pence = remaining
+                break
+            if cf.amount_check(split):
+                pence = round(float(split) * 100)
+                if 0 < pence <= remaining:
+                    break
+            print(cf.INVALID_INPUT)
+
+        splits.append((category_id, pence / 100))
+        remaining -= pence
+
+    return splits
+
+
 def get_object(row):
     """This function gets an Expense object from a row from the
     expenses table.
@@ -169,32 +267,29 @@ def print_row_list(list_of_rows):
         print(cf.NO_RESULTS)
 
 
-def expenses_by_date():
+def expenses_by_date(category_ids=None):
     """This function gets rows from expenses table in a selected date
     range
 
+    :param category_ids: category ids to include or None for all
     :return: rows from expenses table
     :rtype: list of tuples
     """
     date_range = cf.select_date_range()
-    rows = cf.get_rows_from_dates(date_range, TABLE)
+    rows = cf.get_rows_from_dates(date_range, TABLE, category_ids)
 
     return rows
 
 
 def view_expenses_by_category():
     """This function prints a list of expenses in a selected category
+    or one of its subcategories
 
     :return: None
     """
     category_choice = cat.select_category()
-    expense_rows = expenses_by_date()
-    expenses_in_category = []
-
-    # If expense matches category selection, append to new list
-    for expense in expense_rows:
-        if expense[4] == category_choice.id_:
-            expenses_in_category.append(expense)
+    category_ids = dc.get_descendants(category_choice.id_)
+    expenses_in_category = expenses_by_date(category_ids)
 
     cf.clear()
     print_row_list(expenses_in_category)
@@ -208,8 +303,10 @@ def add_expense():
     :return: None
     """
     new_expense = get_expense()
-    new_expense.insert_expense()
     cf.clear()
+    new_expense.insert_expense()
+    if new_expense.splits:
+        new_expense.category = "Split"
 
     print(COLUMNS)
     print(new_expense)
@@ -228,6 +325,90 @@ def view_expenses():
     cf.finish_viewing()
 
 
+def get_search_filters():
+    """This function gets the date range, amounts and category to
+    filter a search by from the user.
+
+    :return: values with keys 'first_day', 'last_day', 'min_amount',
+        'max_amount' and 'category_id', or None
+    :rtype: dict
+    """
+    filters = dict.fromkeys(
+        ("first_day", "last_day", "min_amount", "max_amount", "category_id")
+    )
+
+    if input(ADD_FILTERS).strip().lower() != "y":
+        return filters
+
+    filters["first_day"] = cf.get_first_day(cf.select_date_range())
+    filters["min_amount"] = cf.get_optional_amount(ENTER_MIN)
+    filters["max_amount"] = cf.get_optional_amount(ENTER_MAX)
+
+    if input(FILTER_CATEGORY).strip().lower() == "y":
+        filters["category_id"] = cat.select_category().id_
+
+    return filters
+
+
+def search_expenses():
+    """This function prints the expenses matching a search a page at a
+    time, best matches first.
+
+    :return: None
+    """
+    text = input(ENTER_SEARCH).strip()
+    filters = get_search_filters()
+    page = 0
+
+    while True:
+        rows, more = search.search(text, filters, page)
+        cf.clear()
+        print_row_list(rows)
+
+        selection = input(NEXT_PAGE).strip().lower()
+        if selection == "n" and more:
+            page += 1
+        elif selection == "p" and page:
+            page -= 1
+        elif selection not in ("n", "p"):
+            break
+
+
+def view_anomalies():
+    """This function prints the most recent expenses which were unusually
+    large for their category.
+
+    :return: None
+    """
+    anomalies.print_anomalies()
+    cf.finish_viewing()
+
+
+def view_statistics():
+    """This function prints the median, percentiles and histogram of
+    expenses in all categories or a selected category over the last few
+    months.
+
+    :return: None
+    """
+    category_ids = None
+    if input(ASK_ALL_CATEGORIES).strip().lower() != "y":
+        category_choice = cat.select_category()
+        category_ids = dc.get_descendants(category_choice.id_)
+
+    while True:
+        number = input(ASK_MONTHS).strip()
+        if number.isdigit() and int(number) > 0:
+            break
+        print(cf.INVALID_INPUT)
+
+    cf.clear()
+    distributions.print_distribution(
+        *distributions.get_months(int(number)), category_ids
+    )
+    cf.finish_viewing()
+
+
 def expense_menu():
     """This function manages the user selection from the expense menu
     calls the relevant functions according to the menu selection
@@ -262,6 +443,24 @@ def expense_menu():
             cf.clear()
             cat.categories_menu()
 
+        # ****** Search expenses ******
+        elif menu == "5":
+            cf.clear()
+            print(SELECT_5)
+            search_expenses()
+
+        # ****** View unusual expenses ******
+        elif menu == "6":
+            cf.clear()
+            print(SELECT_6)
+            view_anomalies()
+
+        # ****** View spending statistics ******
+        elif menu == "7":
+            cf.clear()
+            print(SELECT_7)
+            view_statistics()
+
         # ****** Return to main menu ******
         elif menu == "0":
             cf.clear()
@@ -1,8 +1,9 @@
 """This module contains the goals menu. It gets user choice to set
 financial goals; by net or gross income, weekly, monthly or annually,
 view progress towards financial goals; for gross income, net income or
-budget and cancel; return to main menu. It also contains all relevant
-functions to get the required returns for each selection.
+budget, or the chance of meeting them, and cancel; return to main
+menu. It also contains all relevant functions to get the required
+returns for each selection.
 """
 
 from functions import common_functions as cf, date_functions as df
@@ -38,6 +39,7 @@ PROGRESS_MENU = """\U0001f945 View progress for:
 \n1.  Gross Income
 2.  Net Income
 3.  Budget
+4.  Chance of meeting goals
 0.  Cancel
 \nEnter you selection: \
 """
@@ -160,6 +162,10 @@ def view_progress():
             cg.create_net_income_graph()
         elif menu_sel == "3":
             cg.create_budget_graph()
+        elif menu_sel == "4":
+            cg.print_goal_chances()
+            cf.finish_viewing()
+            cf.clear()
         elif menu_sel == "0":
             break
         else:
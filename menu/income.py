@@ -9,7 +9,7 @@ from time import sleep
 import datetime
 from functions import common_functions as cf
 from database import database_commands as dc
-from menu import sources as src
+from menu import accounts, sources as src
 
 COLUMNS_INCOME = f"""{"\033[1m_\033[0m" * 60}\033[1m\n\nDate\t\tSource\t\t\t\
 Amount\n{"\033[1m_\033[0m" * 60}\
@@ -53,6 +53,8 @@ class Income:
         description of income source
     amount : float
         amount of income
+    account : int
+        primary key of account income was paid into
 
     Methods
     ----------
@@ -64,11 +66,12 @@ class Income:
 
     table = "income"
 
-    def __init__(self, date, source, amount):
+    def __init__(self, date, source, amount, account=dc.DEFAULT_ACCOUNT):
         """Constructs attributes for an income."""
         self.date = date
         self.source = source
         self.amount = amount
+        self.account = account
 
     def __str__(self):
         """Constructs a string in readable format."""
@@ -98,7 +101,9 @@ class Income:
         :param self: Income object
         :return: None
         """
-        dc.insert_data(dc.INSERT_INCOME, self.get_all_att())
+        dc.insert_data(
+            dc.INSERT_INCOME_ACCOUNT, (*self.get_all_att(), self.account)
+        )
 
 
 def get_income():
@@ -110,8 +115,9 @@ def get_income():
     today = datetime.date.today()
     category = src.select_source()
     new_amount = cf.get_amount()
+    account_id = accounts.get_account_id()
 
-    inc_object = Income(today, category.id_, new_amount)
+    inc_object = Income(today, category.id_, new_amount, account_id)
 
     return inc_object
 
@@ -142,15 +148,16 @@ def print_row_list(list_of_rows):
         print(cf.NO_RESULTS)
 
 
-def income_by_date():
+def income_by_date(source_ids=None):
     """This function selects rows from the income table matching a
     specified date range
 
+    :param source_ids: source ids to include or None for all
     :return: list of rows from income table
     :rtype: list of tuples
     """
     date_range = cf.select_date_range()
-    rows = cf.get_rows_from_dates(date_range, TABLE)
+    rows = cf.get_rows_from_dates(date_range, TABLE, source_ids)
 
     return rows
 
@@ -162,13 +169,7 @@ def income_by_source():
     :return: None
     """
     source = src.select_source()
-    income_rows = income_by_date()
-    income_from_source = []
-
-    # If income matches source selection, append to new list
-    for income in income_rows:
-        if income[2] == int(source.id_):
-            income_from_source.append(income)
+    income_from_source = income_by_date({int(source.id_)})
 
     cf.clear()
     print_row_list(income_from_source)
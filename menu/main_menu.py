@@ -1,5 +1,6 @@
 """This module is the main menu. It gets the user choice for expenses,
-income, budget, financial goals or to exit the programme.
+income, budget, financial goals, statements, recurring payments,
+accounts or to exit the programme.
 
 References
 ----------
@@ -8,9 +9,11 @@ https://stackoverflow.com/questions/71675811/how-do-i-make-a-delay-in-the-printi
 """
 
 from time import sleep
-from database import database_commands as dc
-from menu import expenses, income, budget, goals
-from functions import common_functions as cf
+from database import database_commands as dc, ledger_index
+from menu import expenses, income, budget, goals, statements, recurring
+from menu import accounts
+from functions import common_functions as cf, anomalies, budget_alerts
+from functions import recurring as rp
 
 INVALID_INPUT = "\nYou entered an invalid input.  Please try again."
 MAIN_MENU = """\U0001f3e0 \033[1m\033[96m============ \033[0m\033[1m\
@@ -20,9 +23,14 @@ MAIN MENU\033[36m ============\033[0m
 2.  Income
 3.  Budget
 4.  Financial Goals
+5.  Statements
+6.  Recurring payments
+7.  Accounts
 0.  Quit
 \nEnter your selection: \
 """
+# Keep the ledger in memory so views don't need to read the database
+USE_LEDGER_INDEX = True
 WELCOME = "Welcome to the Expenses and Budget Tracker App! \U0001f4b0"
 
 
@@ -34,6 +42,16 @@ def main_menu():
     """
     dc.create_tables()
 
+    # Enter recurring payments due since the programme was last run
+    rp.catch_up()
+
+    if USE_LEDGER_INDEX:
+        ledger_index.load_index()
+
+    budget_alerts.load_counters()
+    # Check expenses entered since the programme was last run
+    anomalies.update()
+
     display_message(WELCOME)
 
     # ********* Menu Selection *********
@@ -61,6 +79,21 @@ def main_menu():
             cf.clear()
             goals.goals_menu()
 
+        # ****** Statements ******
+        elif menu == "5":
+            cf.clear()
+            statements.statements_menu()
+
+        # ****** Recurring payments ******
+        elif menu == "6":
+            cf.clear()
+            recurring.recurring_menu()
+
+        # ****** Accounts ******
+        elif menu == "7":
+            cf.clear()
+            accounts.accounts_menu()
+
         # ****** Exit ******
         elif menu == "0":
             cf.clear()
@@ -0,0 +1,252 @@
+"""This module contains the recurring payments menu. It gets user choice
+to view, add or delete expenses and income which repeat on a schedule,
+or return to main menu.
+"""
+
+from time import sleep
+import datetime
+from database import database_commands as dc
+from functions import common_functions as cf, budget_alerts
+from functions import recurring as rp
+from menu import categories as cat, sources as src
+
+SEL = "\033[36m\033[1m -------- \033[0m\033[1m"
+END = "\033[36m\033[1m --------\033[0m"
+MENU_TITLE = f"\U0001f501{SEL}RECURRING PAYMENTS{END}"
+RECURRING_MENU = f"""{MENU_TITLE}
+\nPlease choose from the following options:
+\n1.  View recurring payments
+2.  Add recurring expense
+3.  Add recurring income
+4.  Delete recurring payment
+0.  Return to main menu
+\nEnter your selection: \
+"""
+SEL_ = f"{cf.SEL_}"
+END_ = f"{cf.END_}"
+SELECT_1 = f"{SEL_}View Recurring Payments{END_}"
+SELECT_2 = f"{SEL_}Add Recurring Expense{END_}"
+SELECT_3 = f"{SEL_}Add Recurring Income{END_}"
+SELECT_4 = f"{SEL_}Delete Recurring Payment{END_}"
+FREQUENCY_MENU = """\nHow often is it paid?
+\n1.  Every week
+2.  Every month
+3.  Every year
+4.  Every number of days
+\nEnter your selection: \
+"""
+ENTER_INTERVAL = "\nEnter number of {} between payments (default 1): "
+ENTER_START = "\nEnter date of first payment as YYYY-MM-DD (default today): "
+ENTER_END = "\nEnter date of last payment as YYYY-MM-DD (or press enter for \
+none): "
+UNITS = {
+    rp.WEEKLY: "weeks",
+    rp.MONTHLY: "months",
+    rp.YEARLY: "years",
+    rp.DAYS: "days",
+}
+
+
+def get_description():
+    """This function gets a description of a recurring expense.
+
+    :return: expense description
+    :rtype: str
+    """
+    while True:
+        description = input("\nEnter expense description: ").strip()
+
+        if cf.description_check(description):
+            return description
+
+        print(cf.INVALID_INPUT)
+
+
+def get_date(string, default):
+    """This function gets a date from the user which may be left blank.
+
+    :param string: input prompt
+    :param default: date returned if left blank
+    :return: date as YYYY-MM-DD or default
+    :rtype: str or None
+    """
+    while True:
+        date = input(string).strip()
+
+        if date == "":
+            return default
+        try:
+            return datetime.date.fromisoformat(date).strftime("%Y-%m-%d")
+        except ValueError:
+            print(cf.INVALID_INPUT)
+
+
+def get_interval(frequency):
+    """This function gets the number of weeks, months, years or days
+    between payments.
+
+    :param frequency: 'weekly', 'monthly', 'yearly' or 'days'
+    :return: interval
+    :rtype: int
+    """
+    while True:
+        interval = input(ENTER_INTERVAL.format(UNITS[frequency])).strip()
+
+        if interval == "" and frequency != rp.DAYS:
+            return 1
+        if interval.isdigit() and int(interval) > 0:
+            return int(interval)
+
+        print(cf.INVALID_INPUT)
+
+
+def get_schedule():
+    """This function gets how often a payment repeats and when it starts
+    and ends.
+
+    :return: frequency, interval, start date and end date or None
+    :rtype: tuple
+    """
+    frequency_dict = {
+        "1": rp.WEEKLY,
+        "2": rp.MONTHLY,
+        "3": rp.YEARLY,
+        "4": rp.DAYS,
+    }
+
+    selection = input(FREQUENCY_MENU).strip().replace(".", "")
+    while selection not in frequency_dict:
+        print(cf.INVALID_INPUT)
+        selection = input(FREQUENCY_MENU).strip().replace(".", "")
+
+    frequency = frequency_dict[selection]
+    interval = get_interval(frequency)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    start_date = get_date(ENTER_START, today)
+
+    end_date = get_date(ENTER_END, None)
+    while end_date is not None and end_date < start_date:
+        print(cf.INVALID_INPUT)
+        end_date = get_date(ENTER_END, None)
+
+    return frequency, interval, start_date, end_date
+
+
+def add_recurring(kind):
+    """This function gets a new recurring expense or income from the
+    user and enters every payment already due.
+
+    :param kind: 'expenses' or 'income'
+    :return: None
+    """
+    if kind == "expenses":
+        description = get_description()
+        amount = cf.get_amount()
+        category_id = cat.select_category().id_
+    else:
+        source = src.select_source()
+        description = source.description
+        amount = cf.get_amount()
+        category_id = source.id_
+
+    schedule = get_schedule()
+    entered = rp.add_recurring(
+        kind, description, amount, category_id, schedule
+    )
+    budget_alerts.reset()
+
+    cf.clear()
+    print("\nRecurring payment has been added \U00002705")
+    if entered:
+        print(f"\n{entered} payments already due have been entered.")
+    cf.finish_viewing()
+
+
+def print_recurring(items):
+    """This function prints a numbered list of recurring payments.
+
+    :param items: rows from recurring table
+    :return: None
+    """
+    if not items:
+        print("\nNo recurring payments found.")
+        return
+
+    print("\n\U0001f501 \033[1mRecurring payments: \033[0m\n")
+
+    for i, item in enumerate(items):
+        frequency, interval = item[5], item[6]
+        unit = UNITS[frequency]
+        every = f"every {interval} {unit}" if interval > 1 else frequency
+        amount = cf.money_format(item[3])
+        line = f"{i + 1}.  {item[2]}, {amount} {every}, next {item[10]}"
+        if item[8]:
+            line += f", until {item[8]}"
+        print(line)
+
+
+def delete_recurring():
+    """This function deletes a recurring payment selected by the user.
+    Payments already entered are kept.
+
+    :return: None
+    """
+    items = dc.get_recurring()
+    print_recurring(items)
+
+    if items:
+        selection = input("\nEnter selection (or 0 to cancel): ").strip()
+
+        if cat.category_selection_check(selection, len(items)):
+            item_id = items[int(selection) - 1][0]
+            dc.insert_data(dc.DELETE_RECURRING, (item_id,))
+            print("\nRecurring payment has been deleted \U00002705")
+        elif selection != "0":
+            print(cf.INVALID_INPUT)
+
+    sleep(0.6)
+
+
+def recurring_menu():
+    """This function gets user selection for the recurring payments
+    menu and calls relevant functions according to user choice
+
+    :return: None
+    """
+    while True:
+        cf.clear()
+        menu = input(RECURRING_MENU).strip().replace(".", "")
+
+        # ****** View recurring payments ******
+        if menu == "1":
+            cf.clear()
+            print(SELECT_1)
+            print_recurring(dc.get_recurring())
+            cf.finish_viewing()
+
+        # ****** Add recurring expense ******
+        elif menu == "2":
+            cf.clear()
+            print(SELECT_2)
+            add_recurring("expenses")
+
+        # ****** Add recurring income ******
+        elif menu == "3":
+            cf.clear()
+            print(SELECT_3)
+            add_recurring("income")
+
+        # ****** Delete recurring payment ******
+        elif menu == "4":
+            cf.clear()
+            print(SELECT_4)
+            delete_recurring()
+
+        # ****** Return to main menu ******
+        elif menu == "0":
+            cf.clear()
+            break
+
+        else:
+            cf.clear()
+            print(cf.INVALID_INPUT)
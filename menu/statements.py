@@ -0,0 +1,371 @@
+"""This module contains the statements menu. It gets user choice to
+import expenses from a bank statement, manage the rules used to
+categorise imported expenses, remove duplicate expenses and income,
+reconcile a statement with the expenses and income entered or return to
+main menu.
+"""
+
+from time import sleep
+from functions import common_functions as cf, categoriser as ct
+from functions import budget_alerts
+from functions import statements as st, reconcile as rc
+from database import database_commands as dc, dedup
+from menu import categories as cat
+
+SEL = "\033[36m\033[1m -------- \033[0m\033[1m"
+END = "\033[36m\033[1m --------\033[0m"
+MENU_TITLE = f"\U0001f4c4{SEL}STATEMENTS{END}"
+STATEMENTS_MENU = f"""{MENU_TITLE}
+\nPlease choose from the following options:
+\n1.  Import expenses from statement
+2.  Manage categorisation rules
+3.  Remove duplicate expenses and income
+4.  Reconcile statement
+0.  Return to main menu
+\nEnter your selection: \
+"""
+SEL_ = f"{cf.SEL_}"
+END_ = f"{cf.END_}"
+SELECT_1 = f"{SEL_}Import Expenses{END_}"
+SELECT_2 = f"{SEL_}Manage Categorisation Rules{END_}"
+SELECT_3 = f"{SEL_}Remove Duplicates{END_}"
+SELECT_4 = f"{SEL_}Reconcile Statement{END_}"
+RULES_MENU = f"""{SELECT_2}
+\nPlease choose from the following options:
+\n1.  View rules
+2.  Add rule
+3.  Delete rule
+0.  Cancel
+\nEnter your selection: \
+"""
+KIND_MENU = """\nCategorise expenses whose description:
+\n1.  Contains some text
+2.  Starts with some text
+3.  Matches a regular expression
+4.  Any description, by amount only
+0.  Cancel
+\nEnter your selection: \
+"""
+ENTER_PATH = "\nEnter path to statement CSV file: "
+ENTER_PATTERN = "\nEnter text to match: "
+ENTER_MIN = "\nEnter minimum amount (or press enter for none): "
+ENTER_MAX = "\nEnter maximum amount (or press enter for none): "
+UNMATCHED = "\nThese expenses matched no rule and were not imported:\n"
+SKIPPED = "\nThese expenses were already entered and were skipped:\n"
+MISSING = "\nOn the statement but not entered:\n"
+EXTRA = "\nEntered but not on the statement:\n"
+CONFIRM_DELETE = "\nDelete {} duplicate rows from {}? (y/n): "
+# Longest description accepted for an expense
+MAX_DESCRIPTION = 22
+PRINT_LINE = "\033[90m_\033[0m" * 60
+
+
+def get_categoriser():
+    """This function compiles the categorisation rules and the
+    categories of past expenses into one matcher.
+
+    :return: Categoriser object
+    :rtype: obj
+    """
+    merchants = ct.get_merchants(dc.get_merchant_counts())
+    return ct.Categoriser(dc.get_rules(), merchants)
+
+
+def import_expenses():
+    """This function imports the payments in a statement as expenses,
+    categorised by the categorisation rules, and reports those which
+    could not be categorised.
+
+    :return: None
+    """
+    path = input(ENTER_PATH).strip()
+
+    try:
+        payments = st.get_payments(st.read_statement(path))
+    except OSError:
+        print(f"\nCould not read {path}.")
+        sleep(0.6)
+        return
+
+    payments = [
+        (date, description[:MAX_DESCRIPTION], amount)
+        for date, description, amount in payments
+    ]
+    categorised, uncategorised = get_categoriser().classify_many(payments)
+    inserted, duplicates = dedup.insert_new_rows("expenses", categorised)
+    # Imported expenses aren't checked one by one, so the running totals
+    # of budget alerts are loaded again with them
+    if inserted:
+        budget_alerts.reset()
+
+    cf.clear()
+    print(f"\n{len(inserted)} expenses have been imported \U00002705")
+
+    if duplicates:
+        print(SKIPPED)
+        print_payments(duplicates)
+
+    if uncategorised:
+        print(UNMATCHED)
+        print_payments(uncategorised)
+        print("\nAdd rules for these expenses and import the statement again.")
+
+    cf.finish_viewing()
+
+
+def print_payments(payments):
+    """This function prints a list of payments from a statement.
+
+    :param payments: list of (date, description, amount, ...)
+    :return: None
+    """
+    for payment in payments:
+        date, description, amount = payment[:3]
+        print(f"{date}\t{description:<24}{cf.money_format(amount)}")
+    print(PRINT_LINE)
+
+
+def remove_duplicates():
+    """This function shows the user the expenses and income which have
+    been entered more than once and deletes the copies if the user
+    confirms.
+
+    :return: None
+    """
+    for table in ("expenses", "income"):
+        duplicates = dedup.find_duplicates(table)
+        copies = sum(count for _, count in duplicates)
+
+        if not duplicates:
+            print(f"\nNo duplicate {table} found.")
+            continue
+
+        print(f"\n\033[1mDuplicate {table}:\033[0m\n")
+        for row, count in duplicates:
+            amount = cf.money_format(row[3])
+            print(f"{row[1]}\t{str(row[2]):<24}{amount}\t+{count}")
+
+        confirm = input(CONFIRM_DELETE.format(copies, table)).strip().lower()
+        if confirm == "y":
+            dedup.remove_duplicates(table)
+            budget_alerts.reset()
+            print(f"\nDuplicate {table} have been deleted \U00002705")
+
+    cf.finish_viewing()
+
+
+def reconcile_statement():
+    """This function reconciles a statement with the expenses and income
+    entered and prints the lines and rows which don't match.
+
+    :return: None
+    """
+    path = input(ENTER_PATH).strip()
+
+    try:
+        result = rc.reconcile(path)
+    except OSError:
+        print(f"\nCould not read {path}.")
+        sleep(0.6)
+        return
+
+    cf.clear()
+    if result.first_day is None:
+        print("\nNo payments found in statement.")
+        cf.finish_viewing()
+        return
+
+    print(f"\nStatement from {result.first_day} to {result.last_day}")
+    print(f"\n{len(result.matched)} payments matched")
+
+    if result.missing:
+        print(MISSING)
+        print_payments(result.missing)
+
+    if result.extra:
+        print(EXTRA)
+        print_payments([row[1:] for row in result.extra])
+
+    if result.is_balanced():
+        print("\nStatement is reconciled \U00002705")
+
+    cf.finish_viewing()
+
+
+def get_pattern(kind):
+    """This function gets the text a rule matches from the user.
+
+    :param kind: 'contains', 'starts with' or 'regex'
+    :return: text to match
+    :rtype: str
+    """
+    while True:
+        pattern = input(ENTER_PATTERN).strip()
+
+        if kind == ct.REGEX and pattern and ct.is_valid_regex(pattern):
+            return pattern
+        if kind != ct.REGEX and ct.normalise(pattern):
+            return pattern
+
+        print(cf.INVALID_INPUT)
+
+
+def add_rule():
+    """This function gets a new categorisation rule from the user and
+    enters it into the category_rules table.
+
+    :return: None
+    """
+    kind_dict = {
+        "1": ct.CONTAINS,
+        "2": ct.STARTS_WITH,
+        "3": ct.REGEX,
+        "4": ct.AMOUNT,
+    }
+
+    while True:
+        selection = input(KIND_MENU).strip().replace(".", "")
+        if selection in kind_dict or selection == "0":
+            break
+        print(cf.INVALID_INPUT)
+
+    if selection == "0":
+        return
+
+    kind = kind_dict[selection]
+    pattern = None
+    if kind != ct.AMOUNT:
+        pattern = get_pattern(kind)
+
+    min_amount = cf.get_optional_amount(ENTER_MIN)
+    max_amount = cf.get_optional_amount(ENTER_MAX)
+    category = cat.select_category()
+
+    rule = (kind, pattern, category.id_, min_amount, max_amount)
+    dc.insert_data(dc.INSERT_RULE, rule)
+    cf.clear()
+    print("\nRule has been added \U00002705")
+    sleep(0.6)
+
+
+def print_rules(rules):
+    """This function prints a numbered list of categorisation rules.
+
+    :param rules: rows from category_rules table
+    :return: None
+    """
+    if not rules:
+        print("\nNo rules found.")
+        return
+
+    print("\n\U0001f9fe \033[1mRules: \033[0m\n")
+
+    for i, rule in enumerate(rules):
+        category = dc.get_category_from_id(rule[3], "categories")
+        description = rule[1]
+        if rule[2]:
+            description += f" '{rule[2]}'"
+        if rule[4] is not None:
+            description += f", from {cf.money_format(rule[4])}"
+        if rule[5] is not None:
+            description += f", up to {cf.money_format(rule[5])}"
+        print(f"{i + 1}.  {description} \U000027a1 {category}")
+
+
+def delete_rule():
+    """This function deletes a categorisation rule selected by the
+    user.
+
+    :return: None
+    """
+    rules = dc.get_rules()
+    print_rules(rules)
+
+    if rules:
+        selection = input("\nEnter selection (or 0 to cancel): ").strip()
+
+        if cat.category_selection_check(selection, len(rules)):
+            dc.insert_data(dc.DELETE_RULE, (rules[int(selection) - 1][0],))
+            print("\nRule has been deleted \U00002705")
+        elif selection != "0":
+            print(cf.INVALID_INPUT)
+
+    sleep(0.6)
+
+
+def rules_menu():
+    """This function presents the user with options to manage the
+    categorisation rules and calls relevant functions according to user
+    selection
+
+    :return: None
+    """
+    while True:
+        cf.clear()
+        menu = input(RULES_MENU).strip().replace(".", "")
+
+        # ****** View rules ******
+        if menu == "1":
+            cf.clear()
+            print_rules(dc.get_rules())
+            cf.finish_viewing()
+
+        # ****** Add rule ******
+        elif menu == "2":
+            cf.clear()
+            add_rule()
+
+        # ****** Delete rule ******
+        elif menu == "3":
+            cf.clear()
+            delete_rule()
+
+        # ****** Return to statements menu ******
+        elif menu == "0":
+            break
+
+        else:
+            print(cf.INVALID_INPUT)
+
+
+def statements_menu():
+    """This function gets user selection for the statements menu and
+    calls relevant functions according to user choice
+
+    :return: None
+    """
+    while True:
+        cf.clear()
+        menu = input(STATEMENTS_MENU).strip().replace(".", "")
+
+        # ****** Import expenses ******
+        if menu == "1":
+            cf.clear()
+            print(SELECT_1)
+            import_expenses()
+
+        # ****** Manage categorisation rules ******
+        elif menu == "2":
+            cf.clear()
+            rules_menu()
+
+        # ****** Remove duplicates ******
+        elif menu == "3":
+            cf.clear()
+            print(SELECT_3)
+            remove_duplicates()
+
+        # ****** Reconcile statement ******
+        elif menu == "4":
+            cf.clear()
+            print(SELECT_4)
+            reconcile_statement()
+
+        # ****** Return to main menu ******
+        elif menu == "0":
+            cf.clear()
+            break
+
+        else:
+            cf.clear()
+            print(cf.INVALID_INPUT)